@@ -7,7 +7,7 @@ import {
   getISTDate, formatDate, calculatePrice, minutesToReadable, 
   getActivityIcon, getAvatarUrl, filterToCurrentMonth, calculateStreak 
 } from '../../shared/utils.js';
-import { loadHallOfFame, loadMonthlyLeaderboard as loadMonthlyLB } from '../../shared/leaderboard.js';
+import { loadHallOfFame, loadMonthlyLeaderboard as loadMonthlyLB, fetchLeaderboardEntries } from '../../shared/leaderboard.js';
 
 // ==================== FIREBASE INIT ====================
 
@@ -879,17 +879,14 @@ async function loadWeeklyLeaderboard(loggedUserName) {
     const weekNum = Math.ceil((((now - startOfYear) / 86400000) + startOfYear.getDay() + 1) / 7);
     const weekKey = `${now.getFullYear()}-W${weekNum.toString().padStart(2, '0')}`;
 
-    // Use pre-computed weekly leaderboard from Firebase
-    const weeklySnap = await secondDb.ref(`${FB_PATHS.LEADERBOARDS}/weekly/${weekKey}`).once("value");
+    // Use pre-computed weekly leaderboard from Firebase (top page is enough for top 10)
+    const dataArray = await fetchLeaderboardEntries(`${FB_PATHS.LEADERBOARDS}/weekly/${weekKey}`, { firstPageOnly: true });
     
-    if (!weeklySnap.exists()) {
+    if (dataArray.length === 0) {
       container.innerHTML = `<p class="text-gray-500 text-center">No activity this week yet!</p>`;
       return;
     }
 
-    const weeklyData = weeklySnap.val();
-    // Handle both array format (new) and object format (legacy)
-    const dataArray = Array.isArray(weeklyData) ? weeklyData.filter(x => x) : Object.values(weeklyData);
     const sorted = dataArray
       .filter(s => s && s.sessions_count > 0)
       .sort((a, b) => (b.total_minutes || 0) - (a.total_minutes || 0))
@@ -945,16 +942,13 @@ async function loadSeasonLeaderboard(loggedUserName) {
     const now = new Date();
     const monthKey = `${now.getFullYear()}-${String(now.getMonth() + 1).padStart(2, '0')}`;
 
-    const monthlySnap = await secondDb.ref(`${FB_PATHS.LEADERBOARDS}/monthly/${monthKey}`).once("value");
+    const dataArray = await fetchLeaderboardEntries(`${FB_PATHS.LEADERBOARDS}/monthly/${monthKey}`, { firstPageOnly: true });
     
-    if (!monthlySnap.exists()) {
+    if (dataArray.length === 0) {
       container.innerHTML = `<p class="text-gray-500 text-center">No activity this season yet!</p>`;
       return;
     }
 
-    const monthlyData = monthlySnap.val();
-    // Handle both array format (new) and object format (legacy)
-    const dataArray = Array.isArray(monthlyData) ? monthlyData.filter(x => x) : Object.values(monthlyData);
     const sorted = dataArray
       .filter(s => s && s.sessions_count > 0)
       .sort((a, b) => (b.total_minutes || 0) - (a.total_minutes || 0));
@@ -1035,16 +1029,13 @@ async function loadUserSeasonStats(username) {
     // downloading ALL members' history! This was a major bandwidth killer.
     // Old code downloaded history for EVERY member to calculate rank.
     const monthKey = `${now.getFullYear()}-${String(now.getMonth() + 1).padStart(2, '0')}`;
-    const monthlySnap = await secondDb.ref(`${FB_PATHS.LEADERBOARDS}/monthly/${monthKey}`).once("value");
-    const monthlyData = monthlySnap.val();
+    const dataArray = await fetchLeaderboardEntries(`${FB_PATHS.LEADERBOARDS}/monthly/${monthKey}`);
     
     let userRank = "-";
     let totalMinutes = 0;
     let totalSessions = 0;
     
-    if (monthlyData) {
-      // Handle both array and object formats
-      const dataArray = Array.isArray(monthlyData) ? monthlyData.filter(x => x) : Object.values(monthlyData);
+    if (dataArray.length > 0) {
       const sorted = dataArray.sort((a, b) => (b.total_minutes || 0) - (a.total_minutes || 0));
       const userIndex = sorted.findIndex(s => s.username?.toLowerCase() === username?.toLowerCase());
       
@@ -0,0 +1,149 @@
+"""
+OceanZ Gaming Cafe - Adaptive Upload Batcher
+
+Groups keyed Firebase writes into batches sized by serialized bytes instead of
+a fixed item count. The byte target adapts AIMD-style:
+- Fast successful batch  -> target grows by a fixed step (additive increase)
+- Slow batch or failure  -> target is cut by a factor (multiplicative decrease)
+
+Failing batches are bisected, so one bad record only costs log2(n) extra
+requests instead of falling back to one request per item. A send that
+raises UploadInterrupted (connection down, not a bad batch) stops the
+upload instead, without bisecting or shrinking the target.
+"""
+
+import json
+import time
+from collections import deque
+
+
+class UploadInterrupted(Exception):
+    """Raised by send() when the connection is down rather than the batch bad."""
+
+
+def payload_size(value):
+    """Serialized JSON size of a value in bytes (as sent to Firebase)."""
+    return len(json.dumps(value, separators=(",", ":"), default=str).encode("utf-8"))
+
+
+class AdaptiveBatcher:
+    """
+    Byte-sized batch uploader with AIMD target adjustment.
+
+    The target survives between uploads, so a long-running service keeps
+    what it learned about the connection from one sync to the next.
+    """
+
+    def __init__(self, target_bytes=128 * 1024, min_bytes=8 * 1024, max_bytes=4 * 1024 * 1024,
+                 increase_bytes=32 * 1024, decrease_factor=0.5, target_latency=2.0):
+        self.target_bytes = target_bytes
+        self.min_bytes = min_bytes
+        self.max_bytes = max_bytes
+        self.increase_bytes = increase_bytes
+        self.decrease_factor = decrease_factor
+        self.target_latency = target_latency  # Seconds; slower batches shrink the target
+
+    def _increase(self):
+        self.target_bytes = min(self.max_bytes, self.target_bytes + self.increase_bytes)
+
+    def _decrease(self):
+        self.target_bytes = max(self.min_bytes, int(self.target_bytes * self.decrease_factor))
+
+    def _next_batch(self, pending, sizes):
+        """Take keys from the front of pending until the byte target is reached."""
+        batch = [pending.popleft()]
+        batch_bytes = sizes[batch[0]]
+        while pending and batch_bytes + sizes[pending[0]] <= self.target_bytes:
+            key = pending.popleft()
+            batch.append(key)
+            batch_bytes += sizes[key]
+        return batch, batch_bytes
+
+    def upload(self, items, send, label="items", max_consecutive_failures=None):
+        """
+        Upload {key: value} through send(batch_dict).
+
+        send must raise on failure. Returns a metrics dict:
+        batches, items, bytes, failed (list of keys), avg/max batch size,
+        throughput and the final byte target.
+
+        With max_consecutive_failures set, the upload stops early (looks like
+        the connection is down) and the untried keys are reported as unsent.
+        """
+        sizes = {key: payload_size(value) for key, value in items.items()}
+        pending = deque(items.keys())
+        # Groups that failed and were split; retried before fresh keys
+        split_queue = deque()
+
+        metrics = {
+            "batches": 0,
+            "items": 0,
+            "bytes": 0,
+            "retries": 0,
+            "failed": [],
+            "max_batch_items": 0,
+            "max_batch_bytes": 0,
+            "aborted": False,
+            "unsent": [],
+        }
+        consecutive_failures = 0
+        started = time.time()
+
+        while split_queue or pending:
+            if split_queue:
+                batch = split_queue.popleft()
+                batch_bytes = sum(sizes[k] for k in batch)
+            else:
+                batch, batch_bytes = self._next_batch(pending, sizes)
+
+            sent_at = time.time()
+            try:
+                send({key: items[key] for key in batch})
+            except UploadInterrupted as e:
+                metrics["aborted"] = True
+                metrics["unsent"] = batch + [k for group in split_queue for k in group] + list(pending)
+                print(f"   [WARN] Stopping {label} upload: {str(e)[:80]}")
+                break
+            except Exception as e:
+                self._decrease()
+                metrics["retries"] += 1
+                consecutive_failures += 1
+                if max_consecutive_failures and consecutive_failures >= max_consecutive_failures:
+                    metrics["aborted"] = True
+                    metrics["unsent"] = batch + [k for group in split_queue for k in group] + list(pending)
+                    print(f"   [WARN] Stopping {label} upload after {consecutive_failures} failures: {str(e)[:80]}")
+                    break
+                if len(batch) == 1:
+                    metrics["failed"].append(batch[0])
+                    print(f"   [ERROR] Failed {batch[0]}: {str(e)[:80]}")
+                else:
+                    # Bisect: retry each half before moving on
+                    mid = len(batch) // 2
+                    split_queue.extendleft([batch[mid:], batch[:mid]])
+                continue
+
+            consecutive_failures = 0
+            latency = time.time() - sent_at
+            if latency <= self.target_latency:
+                self._increase()
+            else:
+                self._decrease()
+
+            metrics["batches"] += 1
+            metrics["items"] += len(batch)
+            metrics["bytes"] += batch_bytes
+            metrics["max_batch_items"] = max(metrics["max_batch_items"], len(batch))
+            metrics["max_batch_bytes"] = max(metrics["max_batch_bytes"], batch_bytes)
+
+        elapsed = time.time() - started
+        batches = metrics["batches"] or 1
+        metrics["avg_batch_items"] = round(metrics["items"] / batches, 1)
+        metrics["avg_batch_bytes"] = int(metrics["bytes"] / batches)
+        metrics["elapsed_seconds"] = round(elapsed, 2)
+        metrics["throughput_kbps"] = round(metrics["bytes"] / 1024 / elapsed, 1) if elapsed > 0 else 0
+        metrics["target_bytes"] = self.target_bytes
+
+        print(f"   [BATCH] {metrics['items']} {label} in {metrics['batches']} batches "
+              f"(avg {metrics['avg_batch_items']} / {metrics['avg_batch_bytes'] // 1024} KB, "
+              f"{metrics['throughput_kbps']} KB/s, next target {self.target_bytes // 1024} KB)")
+        return metrics
@@ -24,6 +24,11 @@ IPLOG_BASE_PATH = r"C:\Users\decrypter\Downloads\iplogs\iplogs"
 FIREBASE_DB_URL = "https://oceanz-fdb-4401f-default-rtdb.asia-southeast1.firebasedatabase.app"
 FDB_FIREBASE_DB_URL = FIREBASE_DB_URL  # Alias for sync service
 
+# Optional direct REST transport for sync writes (see rtdb_rest.py):
+# keep-alive connection pool, cached OAuth token, concurrent PATCH requests
+USE_REST_TRANSPORT = False
+REST_POOL_SIZE = 4              # Pooled keep-alive connections / concurrent PATCHes
+
 # Firebase Data Paths (must match JS config.js)
 class FB_PATHS:
     """Firebase Realtime Database paths - keep in sync with shared/config.js"""
@@ -53,7 +58,7 @@ class FB_PATHS:
     SYNC_CONTROL = "sync-control"               # /sync-control/
     SYNC_REQUEST = "sync-control/request"       # Write timestamp to trigger sync
     SYNC_STATUS = "sync-control/status"         # idle, syncing, completed, error
-    SYNC_PROGRESS = "sync-control/progress"     # Array of progress messages
+    SYNC_PROGRESS = "sync-control/progress"     # Progress messages keyed by push keys
     SYNC_LAST = "sync-control/last_sync"        # Last sync info
     SYNC_HEARTBEAT = "sync-control/service_heartbeat"  # Service health check
     
@@ -0,0 +1,329 @@
+"""
+OceanZ Gaming Cafe - Pluggable Realtime Database Backends
+
+The sync code talks to the database through a small backend interface
+(reference/get/set/update/delete/listen) instead of the global
+firebase_admin.db, so it can run offline and be measured:
+
+- FirebaseBackend   - real Firebase (firebase_admin; writes optionally via
+                      the keep-alive REST transport)
+- MemoryBackend     - in-memory tree with Firebase write semantics
+- RecordingBackend  - wraps another backend and counts requests and bytes
+                      per path
+
+Usage:
+    backend = RecordingBackend(MemoryBackend())
+    run_fdb_sync(backend=backend)
+    backend.print_report()
+"""
+
+import json
+import threading
+from collections import defaultdict
+
+
+def _split(path):
+    return [p for p in str(path or "").split("/") if p]
+
+
+def _join(parts):
+    return "/".join(parts)
+
+
+def _payload_bytes(value):
+    if value is None:
+        return 0
+    return len(json.dumps(value, separators=(",", ":"), default=str).encode("utf-8"))
+
+
+class DatabaseEvent:
+    """Listener event, shaped like firebase_admin.db.Event."""
+
+    def __init__(self, event_type, path, data):
+        self.event_type = event_type
+        self.path = path
+        self.data = data
+
+
+class BackendReference:
+    """Path handle mirroring the parts of firebase_admin.db.Reference we use."""
+
+    def __init__(self, backend, path):
+        self.backend = backend
+        self.path = _join(_split(path))
+
+    def child(self, path):
+        return BackendReference(self.backend, _join(_split(self.path) + _split(path)))
+
+    def get(self):
+        return self.backend.get(self.path)
+
+    def set(self, value):
+        self.backend.set(self.path, value)
+
+    def update(self, values):
+        self.backend.update(self.path, values)
+
+    def delete(self):
+        self.backend.delete(self.path)
+
+    def listen(self, callback):
+        return self.backend.listen(self.path, callback)
+
+
+class DatabaseBackend:
+    """Interface every backend implements. update() accepts multi-path keys."""
+
+    def reference(self, path="/"):
+        return BackendReference(self, path)
+
+    def get(self, path):
+        raise NotImplementedError
+
+    def set(self, path, value):
+        raise NotImplementedError
+
+    def update(self, path, values):
+        raise NotImplementedError
+
+    def delete(self, path):
+        raise NotImplementedError
+
+    def listen(self, path, callback):
+        """Call callback(DatabaseEvent) on changes; returns a handle with close()."""
+        raise NotImplementedError
+
+
+# ==================== FIREBASE ====================
+
+class FirebaseBackend(DatabaseBackend):
+    """
+    Real Firebase via firebase_admin (must already be initialized).
+    With a rest_transport, writes use the keep-alive REST pool instead.
+    """
+
+    def __init__(self, rest_transport=None):
+        from firebase_admin import db
+        self._db = db
+        self.rest_transport = rest_transport
+
+    def get(self, path):
+        return self._db.reference(path or "/").get()
+
+    def set(self, path, value):
+        if self.rest_transport is not None:
+            self.rest_transport.set(path, value)
+        else:
+            self._db.reference(path or "/").set(value)
+
+    def update(self, path, values):
+        if self.rest_transport is not None:
+            self.rest_transport.update(values, path=path)
+        else:
+            self._db.reference(path or "/").update(values)
+
+    def delete(self, path):
+        if self.rest_transport is not None:
+            self.rest_transport.delete(path)
+        else:
+            self._db.reference(path or "/").delete()
+
+    def listen(self, path, callback):
+        return self._db.reference(path or "/").listen(callback)
+
+
+# ==================== IN-MEMORY ====================
+
+def _normalize(value):
+    """Store lists as index-keyed dicts and drop empty/None nodes, like Firebase."""
+    if isinstance(value, list):
+        value = {str(i): v for i, v in enumerate(value)}
+    if isinstance(value, dict):
+        result = {}
+        for k, v in value.items():
+            v = _normalize(v)
+            if v is not None:
+                result[str(k)] = v
+        return result or None
+    return value
+
+
+def _firebase_shape(value):
+    """Return dicts with mostly-sequential integer keys as lists, like Firebase."""
+    if not isinstance(value, dict):
+        return value
+    shaped = {k: _firebase_shape(v) for k, v in value.items()}
+    if shaped and all(k.isdigit() for k in shaped):
+        top = max(int(k) for k in shaped)
+        if len(shaped) * 2 > top:
+            return [shaped.get(str(i)) for i in range(top + 1)]
+    return shaped
+
+
+class _Listener:
+    def __init__(self, backend, path, callback):
+        self.backend = backend
+        self.path = path
+        self.callback = callback
+
+    def close(self):
+        self.backend._listeners = [l for l in self.backend._listeners if l is not self]
+
+
+class MemoryBackend(DatabaseBackend):
+    """In-memory database tree with Firebase set/update/delete semantics."""
+
+    def __init__(self, data=None):
+        self.tree = _normalize(data) or {}
+        self._lock = threading.RLock()
+        self._listeners = []
+
+    def _write(self, parts, value):
+        value = _normalize(value)
+        if not parts:
+            self.tree = value or {}
+            return
+        node = self.tree
+        trail = []
+        for part in parts[:-1]:
+            if not isinstance(node.get(part), dict):
+                node[part] = {}
+            trail.append((node, part))
+            node = node[part]
+        if value is None:
+            node.pop(parts[-1], None)
+            # Prune parents left empty, as Firebase does
+            for parent, key in reversed(trail):
+                if parent[key]:
+                    break
+                del parent[key]
+        else:
+            node[parts[-1]] = value
+
+    def _notify(self, changed_paths):
+        for listener in list(self._listeners):
+            lp = _split(listener.path)
+            for changed in changed_paths:
+                if changed[:len(lp)] == lp or lp[:len(changed)] == changed:
+                    listener.callback(DatabaseEvent("put", "/", self.get(listener.path)))
+                    break
+
+    def get(self, path):
+        with self._lock:
+            node = self.tree
+            for part in _split(path):
+                if not isinstance(node, dict) or part not in node:
+                    return None
+                node = node[part]
+            return _firebase_shape(node) if node != {} else None
+
+    def set(self, path, value):
+        with self._lock:
+            self._write(_split(path), value)
+        self._notify([_split(path)])
+
+    def update(self, path, values):
+        base = _split(path)
+        changed = []
+        with self._lock:
+            for key, value in values.items():
+                parts = base + _split(key)
+                self._write(parts, value)
+                changed.append(parts)
+        self._notify(changed)
+
+    def delete(self, path):
+        self.set(path, None)
+
+    def listen(self, path, callback):
+        listener = _Listener(self, _join(_split(path)), callback)
+        self._listeners.append(listener)
+        callback(DatabaseEvent("put", "/", self.get(path)))
+        return listener
+
+
+# ==================== RECORDING ====================
+
+class RecordingBackend(DatabaseBackend):
+    """
+    Wraps another backend and counts requests and bytes per path.
+
+    Multi-path updates count as one request, with bytes attributed to
+    each written path.
+    """
+
+    def __init__(self, inner):
+        self.inner = inner
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.requests = defaultdict(int)            # op -> count
+            self.by_path = defaultdict(lambda: defaultdict(int))  # path -> {op, bytes_out, bytes_in}
+
+    def _record(self, op, path, bytes_out=0, bytes_in=0, count_request=True):
+        with self._lock:
+            if count_request:
+                self.requests[op] += 1
+            stats = self.by_path[_join(_split(path)) or "/"]
+            stats[op] += 1
+            stats["bytes_out"] += bytes_out
+            stats["bytes_in"] += bytes_in
+
+    def get(self, path):
+        value = self.inner.get(path)
+        self._record("get", path, bytes_in=_payload_bytes(value))
+        return value
+
+    def set(self, path, value):
+        self.inner.set(path, value)
+        self._record("set", path, bytes_out=_payload_bytes(value))
+
+    def update(self, path, values):
+        self.inner.update(path, values)
+        with self._lock:
+            self.requests["update"] += 1
+        for key, value in values.items():
+            self._record("update", _join(_split(path) + _split(key)),
+                         bytes_out=_payload_bytes(value), count_request=False)
+
+    def delete(self, path):
+        self.inner.delete(path)
+        self._record("delete", path)
+
+    def listen(self, path, callback):
+        self._record("listen", path)
+
+        def counting_callback(event):
+            self._record("event", path, bytes_in=_payload_bytes(event.data), count_request=False)
+            callback(event)
+
+        return self.inner.listen(path, counting_callback)
+
+    @property
+    def total_requests(self):
+        return sum(self.requests.values())
+
+    @property
+    def total_bytes_out(self):
+        return sum(s["bytes_out"] for s in self.by_path.values())
+
+    def summary(self, depth=1):
+        """Aggregate per-path stats to the first `depth` path segments."""
+        grouped = defaultdict(lambda: defaultdict(int))
+        with self._lock:
+            for path, stats in self.by_path.items():
+                key = _join(_split(path)[:depth]) or "/"
+                for name, count in stats.items():
+                    grouped[key][name] += count
+        return {k: dict(v) for k, v in grouped.items()}
+
+    def print_report(self, depth=1):
+        print(f"[DB] {self.total_requests} requests "
+              f"({', '.join(f'{op}: {n}' for op, n in sorted(self.requests.items()))}), "
+              f"{self.total_bytes_out / 1024:.1f} KB written")
+        for path, stats in sorted(self.summary(depth).items(), key=lambda x: -x[1].get("bytes_out", 0)):
+            ops = ", ".join(f"{op}: {n}" for op, n in sorted(stats.items()) if not op.startswith("bytes"))
+            print(f"   /{path:<30} {stats.get('bytes_out', 0) / 1024:>9.1f} KB out  "
+                  f"{stats.get('bytes_in', 0) / 1024:>9.1f} KB in  ({ops})")
@@ -0,0 +1,290 @@
+#!/usr/bin/env python3
+"""
+OceanZ Gaming Cafe - PanCafe messages.msg Reader
+
+messages.msg is an RTF log written by the PanCafe server. This module turns
+it into plain-text lines in a single streaming pass:
+- One tokenizer regex walks each raw line (control words, escapes, groups,
+  text runs); no whole-file substitution passes or copies
+- Header destinations ({\\fonttbl}, {\\colortbl}, {\\*...}) are skipped
+- Raw lines that cannot contain a wanted message (no marker text and no
+  group braces) are skipped with str.find before tokenizing or running
+  any regex
+
+Usage:
+    python messages_log.py --bench [MB]    # Compare with the old regex cascade
+"""
+
+import re
+import sys
+import time
+
+# Cheap substring markers checked before any message regex runs
+MSG_MARKERS = {
+    'guest_session_start': "Session started",
+    'guest_session_end': "Session closed",
+    'server_started': "Server started",
+}
+
+MSG_PATTERNS = {
+    'guest_session_start': re.compile(
+        r'(\d{2}:\d{2}:\d{2})->\s*([^:]+):\s*Session started \(Time Limited\)\s*\((\d+)\s*min\)'
+    ),
+    'guest_session_end': re.compile(
+        r'(\d{2}:\d{2}:\d{2})->\s*([^:]+):\s*Session closed\.\s*\[\s*Usage:\s*Rs\.\s*([\d.]+)\s*,\s*Total:\s*Rs\.\s*([\d.]+)\s*\]\*\s*Pre-Paid'
+    ),
+    'server_started': re.compile(
+        r'(\d{2}:\d{2}:\d{2})->\s*Server started\.\.\.\s*\((\d{2})\.(\d{2})\.(\d{4})\)'
+    ),
+}
+
+# Groups whose content is never visible text
+SKIP_DESTINATIONS = {"fonttbl", "colortbl", "stylesheet", "info", "pict", "header", "footer"}
+
+_RTF_TOKEN = re.compile(
+    r"\\([a-zA-Z]+)(-?\d+)? ?"     # 1, 2: control word + parameter
+    r"|\\'([0-9a-fA-F]{2})"        # 3: hex-escaped byte
+    r"|\\(.)"                      # 4: control symbol (\\ \{ \} \~ \*)
+    r"|([{}])"                     # 5: group open/close
+    r"|([^\\{}]+)",                # 6: text run
+    re.DOTALL
+)
+
+
+class RtfLineReader:
+    """
+    Incremental RTF to plain-text converter. feed() text in any chunk sizes;
+    completed lines are returned as they end (\\par, \\line or a raw newline).
+    """
+
+    def __init__(self, markers=None):
+        self.markers = tuple(markers or ())
+        self._needles = self.markers + ("{", "}")
+        self.codepage = "cp1252"
+        self.depth = 0
+        self.skip_depth = None    # Depth of the destination group being skipped
+        self.group_start = False  # Just after "{": a destination word may follow
+        self.unicode_skip = 1     # \ucN: fallback chars after each \uN
+        self.pending_skip = 0
+        self._carry = ""
+        self._text = []
+
+    def feed(self, chunk):
+        """Consume a chunk and return the plain-text lines it completed."""
+        data = self._carry + chunk
+        cut = data.rfind("\n") + 1
+        self._carry = data[cut:]
+        lines = []
+        if not cut:
+            return lines
+        block = data[:cut]
+        if not self.markers:
+            for raw in block.split("\n")[:-1]:
+                self._feed_line(raw, lines)
+            return lines
+
+        # Prefix filter: only raw lines holding a marker or a group brace can
+        # produce a wanted line or change group state; find them with str.find
+        starts = set()
+        for needle in self._needles:
+            i = block.find(needle)
+            while i != -1:
+                starts.add(block.rfind("\n", 0, i) + 1)
+                i = block.find(needle, block.find("\n", i))
+        for start in sorted(starts):
+            self._feed_line(block[start:block.find("\n", start)], lines)
+        return lines
+
+    def close(self):
+        """Flush the last (unterminated) line."""
+        lines = []
+        if self._carry:
+            self._feed_line(self._carry, lines)
+            self._carry = ""
+        return lines
+
+    def _emit(self, lines):
+        line = "".join(self._text).strip()
+        self._text = []
+        if line:
+            lines.append(line)
+
+    def _feed_line(self, raw, lines):
+        text = self._text
+        for m in _RTF_TOKEN.finditer(raw):
+            kind = m.lastindex
+            if kind == 6:
+                if self.skip_depth is None:
+                    run = m.group(6)
+                    if self.pending_skip:
+                        drop = min(self.pending_skip, len(run))
+                        self.pending_skip -= drop
+                        run = run[drop:]
+                    text.append(run.replace("\r", ""))
+                self.group_start = False
+            elif kind in (1, 2):
+                word = m.group(1)
+                if self.group_start and word in SKIP_DESTINATIONS and self.skip_depth is None:
+                    self.skip_depth = self.depth
+                self.group_start = False
+                if self.skip_depth is not None:
+                    continue
+                if word in ("par", "line"):
+                    self._emit(lines)
+                elif word == "tab":
+                    text.append("\t")
+                elif word == "ansicpg" and m.group(2):
+                    self.codepage = f"cp{m.group(2)}"
+                elif word == "uc" and m.group(2):
+                    self.unicode_skip = int(m.group(2))
+                elif word == "u" and m.group(2):
+                    text.append(chr(int(m.group(2)) % 65536))
+                    self.pending_skip = self.unicode_skip
+            elif kind == 3:
+                self.group_start = False
+                if self.skip_depth is not None:
+                    continue
+                if self.pending_skip:
+                    self.pending_skip -= 1
+                    continue
+                text.append(bytes.fromhex(m.group(3)).decode(self.codepage, errors="ignore"))
+            elif kind == 4:
+                symbol = m.group(4)
+                if symbol == "*" and self.group_start and self.skip_depth is None:
+                    self.skip_depth = self.depth
+                self.group_start = False
+                if self.skip_depth is not None:
+                    continue
+                if symbol in "\\{}":
+                    text.append(symbol)
+                elif symbol == "~":
+                    text.append(" ")
+                elif symbol in "\r\n":
+                    self._emit(lines)
+            elif m.group(5) == "{":
+                self.depth += 1
+                self.group_start = True
+            else:
+                if self.skip_depth is not None and self.depth <= self.skip_depth:
+                    self.skip_depth = None
+                self.depth = max(0, self.depth - 1)
+                self.group_start = False
+        # A raw newline ends the line as well (matches how the log is written)
+        self._emit(lines)
+
+
+def iter_rtf_lines(chunks, markers=None):
+    """
+    Yield plain-text lines from an iterable of RTF text chunks.
+    With markers, only lines containing one of them are guaranteed to be kept.
+    """
+    reader = RtfLineReader(markers)
+    for chunk in chunks:
+        yield from reader.feed(chunk)
+    yield from reader.close()
+
+
+def match_message(line):
+    """Return (kind, match) for a known message line, else (None, None)."""
+    for kind, marker in MSG_MARKERS.items():
+        if marker in line:
+            match = MSG_PATTERNS[kind].search(line)
+            if match:
+                return kind, match
+    return None, None
+
+
+# ==================== BENCHMARK ====================
+
+def legacy_clean_rtf(content):
+    """The previous whole-file regex cascade, kept for benchmarking."""
+    content = content.replace('\\par\n', '\n').replace('\\par', '\n')
+    content = re.sub(r'\{\\rtf1[^}]*\}', '', content)
+    content = re.sub(r'\{\\fonttbl[^}]*\}', '', content)
+    content = re.sub(r'\{\\colortbl[^}]*\}', '', content)
+    content = re.sub(r'\\cf\d+\s*', '', content)
+    content = re.sub(r'\\viewkind\d+', '', content)
+    content = re.sub(r'\\uc\d+', '', content)
+    content = re.sub(r'\\pard', '', content)
+    content = re.sub(r'\\f\d+', '', content)
+    content = re.sub(r'\\fs\d+', '', content)
+    content = re.sub(r'\\[a-z]+\d*\s*', '', content)
+    content = content.replace('{', '').replace('}', '')
+    content = re.sub(r'\n\s*\n', '\n', content)
+    lines = [line.strip() for line in content.split('\n')]
+    return '\n'.join(lines).strip()
+
+
+def synthetic_messages(target_mb):
+    """Build a messages.msg-like RTF log of roughly target_mb megabytes."""
+    header = ("{\\rtf1\\ansi\\ansicpg1254\\deff0{\\fonttbl{\\f0\\fnil\\fcharset162 Tahoma;}}\r\n"
+              "{\\colortbl ;\\red0\\green0\\blue255;\\red255\\green0\\blue0;}\r\n"
+              "\\viewkind4\\uc1\\pard\\cf1\\f0\\fs17 ")
+    filler = [
+        "{t}-> CT-ROOM-{n}: Member login: PLAYER{n}",
+        "{t}-> CT-ROOM-{n}: Message sent to client",
+        "{t}-> Admin: Cafeteria order #{n} completed",
+        "{t}-> T-ROOM-{n}: Member logout: PLAYER{n}",
+    ]
+    parts = [header]
+    size = len(header)
+    i = 0
+    day = 1
+    while size < target_mb * 1024 * 1024:
+        t = f"{10 + i % 12:02d}:{i % 60:02d}:{(i * 7) % 60:02d}"
+        n = i % 20
+        if i % 500 == 0:
+            line = f"{t}-> Server started... ({day % 28 + 1:02d}.10.2026)"
+            day += 1
+        elif i % 10 == 1:
+            line = f"{t}-> CT-ROOM-{n}: Session started (Time Limited) (60 min)"
+        elif i % 10 == 6:
+            line = f"{t}-> CT-ROOM-{n}: Session closed. [ Usage: Rs. 50.00 , Total: Rs. 50.00 ]* Pre-Paid"
+        else:
+            line = filler[i % len(filler)].format(t=t, n=n)
+        chunk = f"\\cf{1 + i % 2} {line}\\par\r\n"
+        parts.append(chunk)
+        size += len(chunk)
+        i += 1
+    parts.append("}\r\n")
+    return "".join(parts)
+
+
+def run_benchmark(target_mb=20):
+    content = synthetic_messages(target_mb)
+    print(f"[BENCH] Synthetic messages.msg: {len(content) / 1024 / 1024:.1f} MB")
+
+    started = time.perf_counter()
+    legacy = []
+    for line in legacy_clean_rtf(content).split('\n'):
+        line = line.strip()
+        if not line:
+            continue
+        for kind in ('server_started', 'guest_session_start', 'guest_session_end'):
+            match = MSG_PATTERNS[kind].search(line)
+            if match:
+                legacy.append((kind, match.groups()))
+                break
+    legacy_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    chunk_size = 1024 * 1024
+    chunks = (content[i:i + chunk_size] for i in range(0, len(content), chunk_size))
+    streamed = []
+    for line in iter_rtf_lines(chunks, MSG_MARKERS.values()):
+        kind, match = match_message(line)
+        if match:
+            streamed.append((kind, match.groups()))
+    streamed_seconds = time.perf_counter() - started
+
+    assert streamed == legacy, "streaming parser disagrees with the regex cascade"
+    print(f"[BENCH] {len(streamed)} messages matched by both parsers")
+    print(f"[BENCH] regex cascade: {legacy_seconds:.2f}s   streaming: {streamed_seconds:.2f}s   "
+          f"({legacy_seconds / streamed_seconds:.1f}x faster)")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "--bench":
+        run_benchmark(float(sys.argv[2]) if len(sys.argv) > 2 else 20)
+    else:
+        print(__doc__)
@@ -12,23 +12,32 @@ No dependencies on other scripts - everything is inline.
 """
 
 import os
-import re
 import sys
 import math
 import shutil
-import fdb
 import json
+import queue
 import hashlib
-import firebase_admin
+import threading
+import contextvars
+from contextlib import contextmanager
 from datetime import datetime, date, time, timedelta
 from collections import defaultdict
-from firebase_admin import credentials, db
+
+from adaptive_batcher import AdaptiveBatcher, UploadInterrupted
+from write_journal import WriteJournal
+from rtdb_rest import RtdbRestTransport, service_account_token_provider
+from db_backend import FirebaseBackend
+from write_queue import PriorityWriteQueue, QueuedBackend
+from messages_log import MSG_MARKERS, iter_rtf_lines, match_message
+from rank_index import RankIndex
+from progress_log import ProgressLog
 
 # Import shared config
 from config import (
     SOURCE_FDB_PATH, WORKING_FDB_PATH, FIREBASE_CRED_PATH, FIREBASE_DB_URL,
-    FB_PATHS, FIREBIRD_USER, FIREBIRD_PASSWORD,
-    ALL_TERMINALS, SESSION_RETENTION_DAYS,
+    FB_PATHS, FIREBIRD_USER, FIREBIRD_PASSWORD, USE_REST_TRANSPORT, REST_POOL_SIZE,
+    ALL_TERMINALS, SESSION_RETENTION_DAYS, MEMBER_FIELDS,
     normalize_terminal_name, get_short_terminal_name
 )
 
@@ -37,6 +46,20 @@ MESSAGES_FILE = os.path.join(os.path.dirname(SOURCE_FDB_PATH), "messages.msg")
 
 # Local state files
 LOCAL_SYNC_FILE = os.path.join(os.path.dirname(__file__), ".sync_state.json")
+WRITE_JOURNAL_FILE = os.path.join(os.path.dirname(__file__), ".write_journal.jsonl")
+
+# The change probe and the terminal sync share their own snapshot copy, so
+# they can run while a full sync still has WORKING_FDB_PATH open
+PROBE_FDB_PATH = os.path.splitext(WORKING_FDB_PATH)[0] + "_probe.FDB"
+
+# Resources shared by jobs the sync service runs concurrently
+RESOURCE_LOCKS = {
+    "fdb_snapshot": threading.Lock(),        # WORKING_FDB_PATH
+    "probe_snapshot": threading.Lock(),      # PROBE_FDB_PATH
+    "terminal_status": threading.Lock(),     # /terminal-status + legacy /status
+    "messages_state": threading.Lock(),      # MESSAGES_STATE_FILE
+    "write_journal": threading.Lock(),       # WRITE_JOURNAL replay (one lane at a time)
+}
 
 # ==================== UTILITIES ====================
 
@@ -115,6 +138,9 @@ def remove_none_values(data):
 RECENT_HISTORY_COUNT = 20   # Embed last 20 history entries in member profile
 RECENT_SESSIONS_COUNT = 10  # Embed last 10 sessions in member profile
 
+# Member uploads are batched by bytes; target persists across syncs in the service
+MEMBER_UPLOAD_BATCHER = AdaptiveBatcher()
+
 
 def calculate_streak(history_entries):
     """Calculate current activity streak in days from history entries."""
@@ -342,32 +368,230 @@ def build_optimized_member_data(member, history_entries, sessions, ranks):
 
 # ==================== FIREBASE INIT ====================
 
+# Default database backend (see db_backend.py) - real Firebase unless
+# use_backend() selects a MemoryBackend / RecordingBackend. A sync run binds
+# its own backend to RUN_BACKEND for its thread (using_backend), so lanes
+# running concurrently cannot switch each other's backend. Always wrapped in
+# a QueuedBackend, so writes go through WRITE_QUEUE.
+BACKEND = None
+RUN_BACKEND = contextvars.ContextVar("RUN_BACKEND", default=None)
+
+# Write classes, most urgent first: (name, max concurrent writes)
+WRITE_CLASSES = [
+    ("control", 2),         # Sync status, heartbeat, progress, request handling
+    ("live", 2),            # Terminal status (Floor Monitor)
+    ("transactions", 2),    # New history, sessions, revenue
+    ("bulk", 2),            # Member profiles, leaderboards, legacy arrays
+]
+WRITE_CLASS_PATHS = {
+    FB_PATHS.SYNC_CONTROL: "control",
+    FB_PATHS.SYNC_META: "control",
+    FB_PATHS.TERMINAL_STATUS: "live",
+    FB_PATHS.LEGACY_STATUS: "live",
+    FB_PATHS.HISTORY: "transactions",
+    FB_PATHS.HISTORY_BY_DATE: "transactions",
+    FB_PATHS.SESSIONS: "transactions",
+    FB_PATHS.SESSIONS_BY_MEMBER: "transactions",
+    FB_PATHS.GUEST_SESSIONS: "transactions",
+    FB_PATHS.CASH_REGISTER: "transactions",
+    FB_PATHS.DAILY_REVENUE: "transactions",
+    FB_PATHS.DAILY_SUMMARY: "transactions",
+    FB_PATHS.MONTHLY_SUMMARY: "transactions",
+}
+WRITE_MAX_WAIT = 5.0        # Seconds before a waiting write is admitted regardless of class
+
+# Shared by every backend this process uses (sync service included)
+WRITE_QUEUE = PriorityWriteQueue(WRITE_CLASSES, max_in_flight=REST_POOL_SIZE, max_wait=WRITE_MAX_WAIT)
+
+
 def init_firebase():
     """Initialize Firebase connection."""
+    # Imported here so MemoryBackend runs and tooling work without firebase_admin
+    import firebase_admin
+    from firebase_admin import credentials, db
     if not firebase_admin._apps:
         cred = credentials.Certificate(FIREBASE_CRED_PATH)
         firebase_admin.initialize_app(cred, {"databaseURL": FIREBASE_DB_URL})
     return db
 
 
+def create_firebase_backend():
+    """Real Firebase backend; writes use the REST transport when enabled."""
+    init_firebase()
+    rest_transport = None
+    if USE_REST_TRANSPORT:
+        rest_transport = RtdbRestTransport(
+            FIREBASE_DB_URL,
+            service_account_token_provider(FIREBASE_CRED_PATH),
+            pool_size=REST_POOL_SIZE
+        )
+        print(f"[INIT] Using keep-alive REST transport ({REST_POOL_SIZE} connections)")
+    return FirebaseBackend(rest_transport=rest_transport)
+
+
+def queued_backend(backend):
+    """Route a backend's writes through WRITE_QUEUE (no-op if already queued)."""
+    if isinstance(backend, QueuedBackend):
+        return backend
+    return QueuedBackend(backend, WRITE_QUEUE, WRITE_CLASS_PATHS, default_class="bulk")
+
+
+def use_backend(backend=None):
+    """
+    Set the default backend and return it (queued). Without an argument,
+    return the default, connecting to real Firebase if none was set.
+    """
+    global BACKEND
+    if backend is not None:
+        BACKEND = queued_backend(backend)
+    elif BACKEND is None:
+        BACKEND = queued_backend(create_firebase_backend())
+    return BACKEND
+
+
+def current_backend():
+    """Backend of the sync run on this thread, else the default."""
+    return RUN_BACKEND.get() or use_backend()
+
+
+@contextmanager
+def using_backend(backend=None):
+    """Send reads/writes made on this thread inside the block to backend (None = default)."""
+    token = RUN_BACKEND.set(use_backend() if backend is None else queued_backend(backend))
+    try:
+        yield RUN_BACKEND.get()
+    finally:
+        RUN_BACKEND.reset(token)
+
+
+# ==================== JOURNALED FIREBASE WRITES ====================
+# All data writes go through the write-ahead journal so nothing is lost
+# while the cafe's internet is down. Writes return True when acknowledged,
+# False when they were journaled for replay.
+
+def send_firebase_updates(updates):
+    """Root multi-path update through the calling run's backend."""
+    current_backend().update("/", updates)
+
+
+WRITE_JOURNAL = WriteJournal(WRITE_JOURNAL_FILE, send=send_firebase_updates)
+JOURNAL_REPLAY_BATCHER = AdaptiveBatcher(target_bytes=512 * 1024)
+
+
+def fb_set(path, value):
+    """Journaled equivalent of db.reference(path).set(value)."""
+    return WRITE_JOURNAL.write({path: value})
+
+
+def fb_update(path, values):
+    """Journaled equivalent of db.reference(path).update(values)."""
+    return WRITE_JOURNAL.write({f"{path}/{key}": value for key, value in values.items()})
+
+
+def fb_delete(path):
+    """Journaled equivalent of db.reference(path).delete()."""
+    return WRITE_JOURNAL.write({path: None})
+
+
+def replay_write_journal():
+    """
+    Send writes journaled during an outage, in large coalesced batches.
+    Skipped while another lane is replaying: it sends the same writes.
+    """
+    lock = RESOURCE_LOCKS["write_journal"]
+    if not lock.acquire(blocking=False):
+        return
+    try:
+        WRITE_JOURNAL.replay(JOURNAL_REPLAY_BATCHER)
+    except Exception as e:
+        print(f"[WARN] Journal replay failed: {e}")
+    finally:
+        lock.release()
+
+
+def checkpoint_sync_state(sync_state, **watermarks):
+    """
+    Record watermarks in the journal and persist the ones whose writes are
+    all acknowledged. Watermarks behind pending writes stay where they were.
+    """
+    for name, value in watermarks.items():
+        WRITE_JOURNAL.mark_watermark(name, value)
+    WRITE_JOURNAL.flush()
+    released = WRITE_JOURNAL.release_watermarks()
+    sync_state.update(released)
+    held = [name for name in watermarks if name not in released]
+    if held:
+        print(f"[JOURNAL] {WRITE_JOURNAL.pending_count} write(s) pending - holding back {', '.join(held)}")
+    save_local_sync_state(sync_state)
+
+
+# ==================== PROGRESS REPORTING ====================
+# Long-running steps report to /sync-control/progress ({push_key: {time,
+# message, level}}, see progress_log.py). The sync service registers its own
+# logger; standalone runs use a local ProgressLog.
+
+PROGRESS_REPORTER = None
+PROGRESS_FLUSH = None
+PROGRESS_LOG = None
+
+
+def set_progress_reporter(reporter, flush=None):
+    """
+    Route progress messages to reporter(message, level) (None = default);
+    flush(wait=False) publishes buffered messages at stage boundaries.
+    """
+    global PROGRESS_REPORTER, PROGRESS_FLUSH
+    PROGRESS_REPORTER = reporter
+    PROGRESS_FLUSH = flush
+
+
+def default_progress_log():
+    global PROGRESS_LOG
+    if PROGRESS_LOG is None:
+        # Sends from its own thread, so the backend is fixed here
+        backend = current_backend()
+        PROGRESS_LOG = ProgressLog(lambda updates: backend.update("/", updates), FB_PATHS.SYNC_PROGRESS,
+                                   load=lambda: backend.get(FB_PATHS.SYNC_PROGRESS))
+    return PROGRESS_LOG
+
+
+def report_progress(message, level="INFO"):
+    """Print a progress message and queue it for /sync-control/progress (never blocks)."""
+    if PROGRESS_REPORTER is not None:
+        PROGRESS_REPORTER(message, level)
+        return
+    print(f"   [{level}] {message}")
+    default_progress_log().append(message, level)
+
+
+def flush_progress(wait=False):
+    """Stage boundary: publish buffered progress messages now."""
+    if PROGRESS_REPORTER is not None:
+        if PROGRESS_FLUSH is not None:
+            PROGRESS_FLUSH(wait=wait)
+    elif PROGRESS_LOG is not None:
+        PROGRESS_LOG.flush(wait=wait)
+
+
 # ==================== FDB SYNC ====================
 
-def copy_fdb_file():
+def copy_fdb_file(working_path=WORKING_FDB_PATH):
     """Copy Firebird database to working location."""
-    os.makedirs(os.path.dirname(WORKING_FDB_PATH), exist_ok=True)
+    os.makedirs(os.path.dirname(working_path), exist_ok=True)
     try:
-        shutil.copy2(SOURCE_FDB_PATH, WORKING_FDB_PATH)
+        shutil.copy2(SOURCE_FDB_PATH, working_path)
         print("[OK] Copied DB file")
     except Exception as e:
         print(f"[ERROR] Failed to copy FDB file: {e}")
         raise
 
 
-def connect_to_firebird():
+def connect_to_firebird(working_path=WORKING_FDB_PATH):
     """Connect to Firebird database."""
+    import fdb
     try:
         conn = fdb.connect(
-            dsn=WORKING_FDB_PATH, 
+            dsn=working_path, 
             user=FIREBIRD_USER, 
             password=FIREBIRD_PASSWORD
         )
@@ -416,6 +640,71 @@ def fetch_new_history_records(cursor, last_id):
         return []
 
 
+# An ID gap larger than this switches history sync to chunked catch-up
+HISTORY_CATCHUP_THRESHOLD = 20000
+HISTORY_CATCHUP_CHUNK = 5000     # IDs per chunk
+
+
+def fetch_max_history_id(cursor):
+    cursor.execute("SELECT MAX(ID) FROM MEMBERSHISTORY")
+    return int(cursor.fetchone()[0] or 0)
+
+
+def run_history_catchup(cursor, sync_state, history_days, target_id, time_left=None):
+    """
+    Upload a large MEMBERSHISTORY backlog in fixed ID ranges.
+    
+    Only one chunk is in memory at a time and last_history_id is
+    checkpointed after every acknowledged chunk, so an interrupted
+    catch-up resumes where it stopped. Stops early (returning what was
+    done) if Firebase stops acknowledging writes, or once time_left()
+    (seconds left in the time budget) reaches 0.
+    
+    Returns (last_history_id, rows_uploaded).
+    """
+    start_id = last_id = sync_state.get("last_history_id", 0)
+    total_ids = max(1, target_id - start_id)
+    rows_done = 0
+    started = datetime.now()
+    report_progress(f"History catch-up: {target_id - start_id:,} IDs behind "
+                    f"(ID {start_id:,} -> {target_id:,}), {HISTORY_CATCHUP_CHUNK:,} per chunk")
+    
+    while last_id < target_id:
+        chunk_end = min(last_id + HISTORY_CATCHUP_CHUNK, target_id)
+        cursor.execute(f"""
+            SELECT * FROM MEMBERSHISTORY
+            WHERE ID > {last_id} AND ID <= {chunk_end}
+            ORDER BY ID ASC
+        """)
+        columns = [desc[0].strip() for desc in cursor.description]
+        records = [dict(zip(columns, [convert_value(v) for v in row])) for row in cursor.fetchall()]
+        if records:
+            process_and_upload_history(records, sync_state, history_days)
+        
+        checkpoint_sync_state(sync_state, last_history_id=chunk_end)
+        if sync_state.get("last_history_id") != chunk_end:
+            report_progress(f"History catch-up paused at ID {last_id:,}: uploads not acknowledged, "
+                            f"resuming next sync", "WARN")
+            return sync_state.get("last_history_id", last_id), rows_done
+        
+        last_id = chunk_end
+        rows_done += len(records)
+        elapsed = max((datetime.now() - started).total_seconds(), 0.001)
+        fraction = (last_id - start_id) / total_ids
+        eta = elapsed / fraction - elapsed if fraction else 0
+        report_progress(f"History catch-up: {fraction * 100:.0f}% (ID {last_id:,}/{target_id:,}), "
+                        f"{rows_done:,} rows, {rows_done / elapsed:,.0f} rows/s, ETA {timedelta(seconds=int(eta))}")
+        left = time_left() if time_left else None
+        if left is not None and left <= 0 and last_id < target_id:
+            report_progress(f"History catch-up paused at ID {last_id:,}: time budget used, "
+                            f"resuming next sync", "WARN")
+            return last_id, rows_done
+    
+    report_progress(f"History catch-up complete: {rows_done:,} rows in "
+                    f"{timedelta(seconds=int((datetime.now() - started).total_seconds()))}")
+    return last_id, rows_done
+
+
 def build_clean_history_record(record):
     """Normalize a MEMBERSHISTORY row for Firebase (/history + /history-by-date)."""
     username = record.get("MEMBERS_USERNAME") or record.get("USERNAME")
@@ -470,26 +759,25 @@ def upload_history_by_date(by_date):
     for date_str, records_dict in by_date.items():
         if not date_str or not records_dict:
             continue
-        try:
-            ref = db.reference(f"{FB_PATHS.HISTORY_BY_DATE}/{date_str}")
-            ref.update(records_dict)
-            uploaded += len(records_dict)
-        except Exception as e:
-            print(f"[WARN] Failed to upload history-by-date for {date_str}: {e}")
+        fb_update(f"{FB_PATHS.HISTORY_BY_DATE}/{date_str}", records_dict)
+        uploaded += len(records_dict)
     if uploaded:
         print(f"   [OK] Uploaded {uploaded} history-by-date records across {len(by_date)} day(s)")
     return uploaded
 
 
-def process_and_upload_history(records, sync_state):
-    """Process and upload only new history records."""
+def process_and_upload_history(records, sync_state, history_days=None):
+    """
+    Process and upload only new history records.
+    history_days: per-day checksum state to roll the new rows into.
+    """
     if not records:
         print("   No new history records to upload")
         return sync_state["last_history_id"]
     
     by_user = defaultdict(dict)
     by_date = defaultdict(dict)
-    daily_aggregates = defaultdict(lambda: defaultdict(lambda: {"count": 0, "amount": 0}))
+    daily_aggregates = defaultdict(list)  # date -> [(ID, username, charge)]
     max_id = sync_state["last_history_id"]
     
     for record in records:
@@ -505,43 +793,41 @@ def process_and_upload_history(records, sync_state):
             by_date[date_str][str(record_id)] = clean_record
 
         if date_str and clean_record["CHARGE"] > 0:
-            daily_aggregates[date_str][username]["count"] += 1
-            daily_aggregates[date_str][username]["amount"] += clean_record["CHARGE"]
+            daily_aggregates[date_str].append((record_id or 0, username, clean_record["CHARGE"]))
     
     uploaded = 0
     for username, records_dict in by_user.items():
-        try:
-            ref = db.reference(f"{FB_PATHS.HISTORY}/{username}")
-            ref.update(records_dict)
-            uploaded += len(records_dict)
-        except Exception as e:
-            print(f"[WARN] Failed to upload history for {username}: {e}")
+        fb_update(f"{FB_PATHS.HISTORY}/{username}", records_dict)
+        uploaded += len(records_dict)
     
     print(f"   [OK] Uploaded {uploaded} history records for {len(by_user)} users")
     upload_history_by_date(by_date)
+    if history_days is not None:
+        fold_history_records(history_days, records)
     
-    # Update daily aggregates
-    for date_str, user_data in daily_aggregates.items():
+    # Update daily aggregates. The summary remembers the last history ID it
+    # counted, so re-processing records after a held-back watermark is a no-op.
+    for date_str, charges in daily_aggregates.items():
         try:
-            ref = db.reference(f"daily-summary/{date_str}/by_member")
-            existing = ref.get() or {}
+            summary = current_backend().get(f"daily-summary/{date_str}") or {}
+            existing = summary.get("by_member") or {}
+            applied_id = summary.get("last_history_id", 0)
             
-            for username, stats in user_data.items():
-                if username in existing:
-                    existing[username]["count"] = existing[username].get("count", 0) + stats["count"]
-                    existing[username]["amount"] = existing[username].get("amount", 0) + stats["amount"]
-                else:
-                    existing[username] = stats
-            
-            ref.set(existing)
+            for record_id, username, charge in charges:
+                if record_id <= applied_id:
+                    continue
+                stats = existing.setdefault(username, {"count": 0, "amount": 0})
+                stats["count"] = stats.get("count", 0) + 1
+                stats["amount"] = stats.get("amount", 0) + charge
             
-            total_ref = db.reference(f"daily-summary/{date_str}")
             total_amount = sum(u["amount"] for u in existing.values())
             total_count = sum(u["count"] for u in existing.values())
-            total_ref.update({
+            fb_update(f"daily-summary/{date_str}", {
+                "by_member": existing,
                 "total_amount": total_amount,
                 "total_recharges": total_count,
                 "unique_members": len(existing),
+                "last_history_id": max(applied_id, max(c[0] for c in charges)),
                 "last_updated": datetime.now().isoformat()
             })
         except Exception as e:
@@ -553,33 +839,166 @@ def process_and_upload_history(records, sync_state):
     return max_id
 
 
-def backfill_history_by_date(cursor, days=2):
+# ==================== HISTORY-BY-DATE DIRTY DAYS ====================
+# Per-day checksums of MEMBERSHISTORY, kept locally:
+#   {"days": {"YYYY-MM-DD": {"checksum": [count, max_id, sum_id, sum_id_charge,
+#                                         sum_id_balance, sum_id_minutes],
+#                            "records": {record_id: record_hash}}}}
+# The checksum terms are ID-weighted, so they roll forward row by row in
+# Python and match the SQL aggregate of the same rows.
+
+HISTORY_DAYS_STATE_FILE = os.path.join(os.path.dirname(__file__), ".history_days_state.json")
+
+
+def load_history_days_state():
+    """Load per-day history checksums from local file."""
+    try:
+        if os.path.exists(HISTORY_DAYS_STATE_FILE):
+            with open(HISTORY_DAYS_STATE_FILE, "r") as f:
+                return json.load(f)
+    except Exception as e:
+        print(f"[WARN] Could not load history day state: {e}")
+    
+    return {"days": {}}
+
+
+def save_history_days_state(state):
+    """Save per-day history checksums to local file."""
+    try:
+        with open(HISTORY_DAYS_STATE_FILE, "w") as f:
+            json.dump(state, f)
+    except Exception as e:
+        print(f"[WARN] Could not save history day state: {e}")
+
+
+# Text columns are fingerprinted by trimmed length (Firebird has no hash
+# Python can reproduce), so a same-length rewrite of a note goes unseen.
+# SAAT is left out: it is stamped when the row is written and never edited.
+HISTORY_CHECKSUM_TEXT = ("NOTE", "DISCOUNTNOTE", "TERMINALNAME")
+
+
+def history_checksum_terms(record):
+    """Checksum terms one raw MEMBERSHISTORY row adds to its day."""
+    record_id = int(record.get("ID") or 0)
+    text_length = sum(len(str(record.get(col) or "").strip(" ")) for col in HISTORY_CHECKSUM_TEXT)
+    return [
+        1,
+        record_id,
+        record_id,
+        record_id * float(record.get("MIKTAR") or 0),
+        record_id * float(record.get("KALAN") or 0),
+        record_id * float(record.get("USINGMIN") or 0),
+        record_id * float(record.get("USINGSEC") or 0),
+        record_id * text_length,
+    ]
+
+
+def normalize_history_checksum(values):
+    return [round(float(v or 0), 2) for v in values]
+
+
+def fold_history_records(state, records):
+    """
+    Roll newly uploaded history rows into their days' checksums, so the
+    next backfill sees those days as clean. Only days already tracked are
+    updated, and rows at or below a day's max ID were counted before.
+    """
+    days = state.setdefault("days", {})
+    if not days:
+        return
+    for record in records:
+        # Skip untracked days before building anything (catch-up chunks are
+        # mostly older than the tracked range)
+        date_str = str(record.get("TARIH") or "").split("T")[0]
+        day = days.get(date_str)
+        if not day:
+            continue
+        terms = history_checksum_terms(record)
+        checksum = day["checksum"]
+        if len(checksum) != len(terms):
+            continue   # Stored before the checksum grew a term; re-read next run
+        if terms[1] <= checksum[1]:
+            continue
+        built = build_clean_history_record(record)
+        day["checksum"] = normalize_history_checksum(
+            [checksum[0] + 1, terms[1]] + [a + b for a, b in zip(checksum[2:], terms[2:])]
+        )
+        if built:
+            day["records"][str(terms[1])] = get_record_hash(built[3])
+
+
+def fetch_history_day_checksums(cursor, since):
+    """Per-day checksum of MEMBERSHISTORY since a date, in one aggregate query."""
+    cursor.execute(f"""
+        SELECT TARIH, COUNT(*), MAX(ID), SUM(ID),
+               SUM(ID * COALESCE(MIKTAR, 0)),
+               SUM(ID * COALESCE(KALAN, 0)),
+               SUM(ID * COALESCE(USINGMIN, 0)),
+               SUM(ID * COALESCE(USINGSEC, 0)),
+               SUM(ID * (CHAR_LENGTH(TRIM(COALESCE(NOTE, '')))
+                         + CHAR_LENGTH(TRIM(COALESCE(DISCOUNTNOTE, '')))
+                         + CHAR_LENGTH(TRIM(COALESCE(TERMINALNAME, '')))))
+        FROM MEMBERSHISTORY
+        WHERE TARIH >= '{since}'
+        GROUP BY TARIH
+    """)
+    checksums = {}
+    for row in cursor.fetchall():
+        date_str = str(convert_value(row[0]) or "").split("T")[0]
+        if date_str:
+            checksums[date_str] = normalize_history_checksum(row[1:])
+    return checksums
+
+
+def backfill_history_by_date(cursor, days=2, state=None):
     """
-    Rebuild /history-by-date for recent days from FDB.
+    Keep /history-by-date for recent days in step with FDB.
     Floor Monitor reads this path; older syncs only wrote /history/{user}.
+    
+    One aggregate query per run; only days whose checksum differs from the
+    stored one are re-read, and only records whose content changed (or that
+    disappeared) are written.
     """
     try:
+        if state is None:
+            state = load_history_days_state()
+        stored_days = state.setdefault("days", {})
         since = (datetime.now() - timedelta(days=max(1, days) - 1)).strftime("%Y-%m-%d")
-        cursor.execute(f"""
-            SELECT * FROM MEMBERSHISTORY
-            WHERE TARIH >= '{since}'
-            ORDER BY ID ASC
-        """)
-        columns = [desc[0].strip() for desc in cursor.description]
-        rows = cursor.fetchall()
-        by_date = defaultdict(dict)
-        for row in rows:
-            raw = dict(zip(columns, [convert_value(v) for v in row]))
-            built = build_clean_history_record(raw)
-            if not built:
-                continue
-            _username, date_str, record_id, clean_record = built
-            if not date_str:
+        
+        checksums = fetch_history_day_checksums(cursor, since)
+        dirty = sorted(
+            d for d in set(checksums) | {d for d in stored_days if d >= since}
+            if (stored_days.get(d) or {}).get("checksum") != checksums.get(d)
+        )
+        
+        changed = defaultdict(dict)
+        for date_str in dirty:
+            known = (stored_days.get(date_str) or {}).get("records", {})
+            if date_str not in checksums:
+                fb_delete(f"{FB_PATHS.HISTORY_BY_DATE}/{date_str}")
                 continue
-            by_date[date_str][str(record_id)] = clean_record
-
-        print(f"   [DATA] Backfilling history-by-date since {since} ({sum(len(v) for v in by_date.values())} rows)")
-        upload_history_by_date(by_date)
+            
+            cursor.execute("SELECT * FROM MEMBERSHISTORY WHERE TARIH = ? ORDER BY ID ASC", [date_str])
+            columns = [desc[0].strip() for desc in cursor.description]
+            current = {}
+            for row in cursor.fetchall():
+                built = build_clean_history_record(dict(zip(columns, [convert_value(v) for v in row])))
+                if not built:
+                    continue
+                record_id, clean_record = str(built[2]), built[3]
+                current[record_id] = get_record_hash(clean_record)
+                if known.get(record_id) != current[record_id]:
+                    changed[date_str][record_id] = clean_record
+            for record_id in set(known) - set(current):
+                changed[date_str][record_id] = None   # Deleted in FDB
+            stored_days[date_str] = {"checksum": checksums[date_str], "records": current}
+        
+        state["days"] = {d: v for d, v in stored_days.items() if d >= since and d in checksums}
+        
+        print(f"   [DATA] history-by-date: {len(dirty)} of {len(checksums)} day(s) changed, "
+              f"{sum(len(v) for v in changed.values())} records to write")
+        upload_history_by_date(changed)
+        save_history_days_state(state)
     except Exception as e:
         print(f"[WARN] history-by-date backfill failed: {e}")
 
@@ -596,105 +1015,34 @@ def fetch_all_members(cursor):
         return []
 
 
-def fetch_changed_members(cursor, since_datetime):
+def member_row_hash(member):
+    """Short hash of a member's MEMBER_FIELDS values."""
+    return get_record_hash([member.get(field) for field in MEMBER_FIELDS])
+
+
+def detect_changed_members(members, member_hashes):
     """
-    Fetch only members that have changed since a given datetime.
-    Uses LLOGDATE (last login date) and RECDATE (registration date) to identify changes.
+    Compare every member's row hash with the stored ones in one pass.
+    Returns (changed_members, new_hashes); new_hashes is {ID: hash}.
     """
-    try:
-        # Use date-only format for Firebird DATE fields
-        since_date = since_datetime.strftime("%Y-%m-%d")
-        cursor.execute(f"""
-            SELECT * FROM MEMBERS 
-            WHERE LLOGDATE >= '{since_date}' OR RECDATE >= '{since_date}'
-        """)
-        columns = [desc[0].strip() for desc in cursor.description]
-        rows = cursor.fetchall()
-        members = [dict(zip(columns, [convert_value(v) for v in row])) for row in rows]
-        return members
-    except Exception as e:
-        print(f"[ERROR] Failed to fetch changed members: {e}")
-        return []
+    new_hashes = {}
+    changed = []
+    for member in members:
+        if member.get("ID") is None:
+            continue
+        member_id = str(member["ID"])
+        row_hash = member_row_hash(member)
+        new_hashes[member_id] = row_hash
+        if member_hashes.get(member_id) != row_hash:
+            changed.append(member)
+    return changed, new_hashes
 
 
-def build_and_upload_optimized_members(members_array, cursor):
+def compute_rank_lookups(members_array, cursor):
     """
-    Build and upload optimized v2 member data structure.
-    
-    This creates the single-key lookup structure at /members/{username}
-    with embedded history, sessions, stats, ranks, and badges.
-    
-    ALL DATA IS FETCHED FROM LOCAL FDB - NO FIREBASE DOWNLOADS!
+    Rank members by sorting FDB data (fallback when no ranking indexes exist).
+    Returns (all_time, monthly, weekly) rank lookups by USERNAME and max_spent.
     """
-    print("\n[V2] Building optimized member data structure...")
-    print("   [INFO] Using LOCAL FDB data (no Firebase downloads)")
-    
-    # ========== FETCH ALL DATA FROM LOCAL FDB ==========
-    
-    # 1. Fetch history from FDB MEMBERSHISTORY table (last 30 days for embedding)
-    all_history = {}
-    try:
-        thirty_days_ago = (datetime.now() - timedelta(days=30)).strftime("%Y-%m-%d")
-        # Use SELECT * to get all columns, then map them in Python
-        cursor.execute(f"""
-            SELECT * FROM MEMBERSHISTORY 
-            WHERE TARIH >= '{thirty_days_ago}'
-            ORDER BY ID DESC
-        """)
-        columns = [desc[0].strip() for desc in cursor.description]
-        
-        for row in cursor.fetchall():
-            raw_record = dict(zip(columns, [convert_value(v) for v in row]))
-            username = (raw_record.get("MEMBERS_USERNAME") or "").upper()
-            if username:
-                # Map Turkish columns to English names
-                record = {
-                    "ID": raw_record.get("ID"),
-                    "DATE": raw_record.get("TARIH"),
-                    "TIME": raw_record.get("SAAT"),
-                    "CHARGE": raw_record.get("MIKTAR", 0),
-                    "BALANCE": raw_record.get("KALAN", 0),
-                    "NOTE": raw_record.get("NOTE"),
-                    "TERMINALNAME": raw_record.get("TERMINALNAME"),
-                    "USINGMIN": raw_record.get("USINGMIN", 0),
-                }
-                if username not in all_history:
-                    all_history[username] = []
-                all_history[username].append(record)
-        
-        print(f"   [DATA] Loaded history for {len(all_history)} users from FDB (last 30 days)")
-    except Exception as e:
-        print(f"   [WARN] Could not load history from FDB: {e}")
-        all_history = {}
-    
-    # 2. Fetch sessions from FDB SESSIONS table (last 7 days for embedding)
-    all_sessions_by_member = {}
-    try:
-        seven_days_ago = (datetime.now() - timedelta(days=7)).strftime("%Y-%m-%d")
-        cursor.execute(f"""
-            SELECT MEMBERID, ID, TERMINALNAME, STARTPOINT, ENDPOINT, 
-                   USINGMIN, TOTALPRICE
-            FROM SESSIONS 
-            WHERE MEMBERID > 0 AND STARTPOINT >= '{seven_days_ago}'
-            ORDER BY ID DESC
-        """)
-        columns = [desc[0].strip() for desc in cursor.description]
-        
-        for row in cursor.fetchall():
-            record = dict(zip(columns, [convert_value(v) for v in row]))
-            member_id = str(record.get("MEMBERID", 0))
-            if member_id != "0":
-                if member_id not in all_sessions_by_member:
-                    all_sessions_by_member[member_id] = []
-                all_sessions_by_member[member_id].append(record)
-        
-        print(f"   [DATA] Loaded sessions for {len(all_sessions_by_member)} members from FDB (last 7 days)")
-    except Exception as e:
-        print(f"   [WARN] Could not load sessions from FDB: {e}")
-        all_sessions_by_member = {}
-    
-    # ========== CALCULATE RANKS FROM LOCAL FDB DATA ==========
-    
     # Build member ID to username lookup
     member_id_to_username = {}
     for m in members_array:
@@ -780,101 +1128,235 @@ def build_and_upload_optimized_members(members_array, cursor):
     
     print(f"   [RANKS] All-time: {len(all_time_ranks)}, Monthly: {len(monthly_ranks)}, Weekly: {len(weekly_ranks)}")
     
-    # ========== BUILD OPTIMIZED DATA FOR EACH MEMBER ==========
+    return all_time_ranks.get, monthly_ranks.get, weekly_ranks.get, max_spent
+
+
+# Up to this many members, profiles are rebuilt from per-member IN (...)
+# fetches instead of full history/session scans
+TARGETED_MEMBER_FETCH_MAX = 200
+
+
+def build_and_upload_optimized_members(members_array, cursor, all_members=None):
+    """
+    Build and upload optimized v2 member data structure.
     
-    optimized_members = {}
-    processed = 0
+    This creates the single-key lookup structure at /members/{username}
+    with embedded history, sessions, stats, ranks, and badges.
     
-    for member in members_array:
-        username = member.get("USERNAME", "").upper()
-        if not username:
-            continue
-        
-        # Get history for this user (from local FDB data)
-        history_list = all_history.get(username, [])
-        
-        # Get sessions for this user (from local FDB data)
-        member_id = str(member.get("ID", 0))
-        sessions_list = all_sessions_by_member.get(member_id, [])
-        
-        # Build ranks dict (all calculated locally)
-        ranks = {
-            "all_time": all_time_ranks.get(username),
-            "monthly": monthly_ranks.get(username),
-            "weekly": weekly_ranks.get(username),
-            "max_spent": max_spent,
-        }
-        
-        # Build optimized member data
-        optimized_data = build_optimized_member_data(
-            member, 
-            history_list, 
-            sessions_list, 
-            ranks
-        )
-        
-        optimized_members[username] = optimized_data
-        processed += 1
+    ALL DATA IS FETCHED FROM LOCAL FDB - NO FIREBASE DOWNLOADS!
     
-    # Upload to Firebase at /members/{username}
-    if optimized_members:
-        try:
-            # Sanitize all data before upload to handle NaN, Infinity, etc.
-            sanitized_members = {}
-            skipped_count = 0
-            for username, data in optimized_members.items():
-                try:
-                    sanitized_members[username] = sanitize_for_firebase(data)
-                except Exception as e:
-                    print(f"   [WARN] Skipping {username} due to sanitization error: {e}")
-                    skipped_count += 1
-            
+    all_members: every MEMBERS row, ranked when no ranking indexes exist
+    (default: members_array). Needed when members_array is only the
+    changed subset, or ranks and max_spent would cover just that subset.
+    
+    Returns the set of usernames whose profiles were written (acknowledged
+    or journaled for replay); skipped or failed profiles are not in it.
+    """
+    print("\n[V2] Building optimized member data structure...")
+    print("   [INFO] Using LOCAL FDB data (no Firebase downloads)")
+    
+    # ========== FETCH ALL DATA FROM LOCAL FDB ==========
+    
+    # Few members changed: fetch only their rows with IN (...) lists instead
+    # of scanning history/sessions for everyone
+    targeted = len(members_array) <= TARGETED_MEMBER_FETCH_MAX
+    if targeted:
+        print(f"   [INFO] {len(members_array)} members - fetching only their history and sessions")
+    
+    # 1. Fetch history from FDB MEMBERSHISTORY table (last 30 days for embedding)
+    all_history = {}
+    try:
+        thirty_days_ago = (datetime.now() - timedelta(days=30)).strftime("%Y-%m-%d")
+        if targeted:
+            usernames = set()
+            for m in members_array:
+                if m.get("USERNAME"):
+                    usernames.update({m["USERNAME"], m["USERNAME"].upper()})
+            history_rows = fetch_rows_where_in(cursor, """
+                SELECT * FROM MEMBERSHISTORY
+                WHERE MEMBERS_USERNAME IN ({in_list}) AND TARIH >= ?
+            """, usernames, [thirty_days_ago])
+            history_rows.sort(key=lambda r: r.get("ID") or 0, reverse=True)
+        else:
+            # Use SELECT * to get all columns, then map them in Python
+            cursor.execute(f"""
+                SELECT * FROM MEMBERSHISTORY 
+                WHERE TARIH >= '{thirty_days_ago}'
+                ORDER BY ID DESC
+            """)
+            columns = [desc[0].strip() for desc in cursor.description]
+            history_rows = (dict(zip(columns, [convert_value(v) for v in row])) for row in cursor.fetchall())
+        
+        for raw_record in history_rows:
+            username = (raw_record.get("MEMBERS_USERNAME") or "").upper()
+            if username:
+                # Map Turkish columns to English names
+                record = {
+                    "ID": raw_record.get("ID"),
+                    "DATE": raw_record.get("TARIH"),
+                    "TIME": raw_record.get("SAAT"),
+                    "CHARGE": raw_record.get("MIKTAR", 0),
+                    "BALANCE": raw_record.get("KALAN", 0),
+                    "NOTE": raw_record.get("NOTE"),
+                    "TERMINALNAME": raw_record.get("TERMINALNAME"),
+                    "USINGMIN": raw_record.get("USINGMIN", 0),
+                }
+                if username not in all_history:
+                    all_history[username] = []
+                all_history[username].append(record)
+        
+        print(f"   [DATA] Loaded history for {len(all_history)} users from FDB (last 30 days)")
+    except Exception as e:
+        print(f"   [WARN] Could not load history from FDB: {e}")
+        all_history = {}
+    
+    # 2. Fetch sessions from FDB SESSIONS table (last 7 days for embedding)
+    all_sessions_by_member = {}
+    try:
+        seven_days_ago = (datetime.now() - timedelta(days=7)).strftime("%Y-%m-%d")
+        if targeted:
+            session_rows = fetch_rows_where_in(cursor, """
+                SELECT MEMBERID, ID, TERMINALNAME, STARTPOINT, ENDPOINT,
+                       USINGMIN, TOTALPRICE
+                FROM SESSIONS
+                WHERE MEMBERID IN ({in_list}) AND STARTPOINT >= ?
+            """, {int(m["ID"]) for m in members_array if m.get("ID")}, [seven_days_ago])
+            session_rows.sort(key=lambda r: r.get("ID") or 0, reverse=True)
+        else:
+            cursor.execute(f"""
+                SELECT MEMBERID, ID, TERMINALNAME, STARTPOINT, ENDPOINT, 
+                       USINGMIN, TOTALPRICE
+                FROM SESSIONS 
+                WHERE MEMBERID > 0 AND STARTPOINT >= '{seven_days_ago}'
+                ORDER BY ID DESC
+            """)
+            columns = [desc[0].strip() for desc in cursor.description]
+            session_rows = (dict(zip(columns, [convert_value(v) for v in row])) for row in cursor.fetchall())
+        
+        for record in session_rows:
+            member_id = str(record.get("MEMBERID", 0))
+            if member_id != "0":
+                if member_id not in all_sessions_by_member:
+                    all_sessions_by_member[member_id] = []
+                all_sessions_by_member[member_id].append(record)
+        
+        print(f"   [DATA] Loaded sessions for {len(all_sessions_by_member)} members from FDB (last 7 days)")
+    except Exception as e:
+        print(f"   [WARN] Could not load sessions from FDB: {e}")
+        all_sessions_by_member = {}
+    
+    # ========== RANKS ==========
+    # Reuse the ranking indexes from the leaderboard calculation (valid for
+    # any subset of members); compute from FDB only if they are missing
+    month_key, week_key = leaderboard_period_keys()
+    boards = ("all-time", f"monthly/{month_key}", f"weekly/{week_key}")
+    restore_rank_indexes(boards)
+    if all(board in RANK_INDEXES for board in boards) and LEADERBOARD_MAX_SPENT is not None:
+        all_time_rank, monthly_rank, weekly_rank = (RANK_INDEXES[board].rank for board in boards)
+        max_spent = LEADERBOARD_MAX_SPENT
+        print("   [RANKS] Using leaderboard ranking indexes")
+    else:
+        all_time_rank, monthly_rank, weekly_rank, max_spent = compute_rank_lookups(all_members or members_array, cursor)
+    
+    # ========== BUILD OPTIMIZED DATA FOR EACH MEMBER ==========
+    
+    optimized_members = {}
+    journaled = set()   # Usernames written to Firebase or the journal
+    
+    for member in members_array:
+        username = member.get("USERNAME", "").upper()
+        if not username:
+            continue
+        
+        # Get history for this user (from local FDB data)
+        history_list = all_history.get(username, [])
+        
+        # Get sessions for this user (from local FDB data)
+        member_id = str(member.get("ID", 0))
+        sessions_list = all_sessions_by_member.get(member_id, [])
+        
+        # Build ranks dict (all calculated locally)
+        ranks = {
+            "all_time": all_time_rank(username),
+            "monthly": monthly_rank(username),
+            "weekly": weekly_rank(username),
+            "max_spent": max_spent,
+        }
+        
+        # Build optimized member data
+        optimized_data = build_optimized_member_data(
+            member, 
+            history_list, 
+            sessions_list, 
+            ranks
+        )
+        
+        optimized_members[username] = optimized_data
+    
+    # Upload to Firebase at /members/{username}
+    if optimized_members:
+        try:
+            # Sanitize all data before upload to handle NaN, Infinity, etc.
+            sanitized_members = {}
+            skipped_count = 0
+            for username, data in optimized_members.items():
+                try:
+                    sanitized_members[username] = sanitize_for_firebase(data)
+                except Exception as e:
+                    print(f"   [WARN] Skipping {username} due to sanitization error: {e}")
+                    skipped_count += 1
+            
             if skipped_count > 0:
                 print(f"   [WARN] Skipped {skipped_count} members due to data issues")
             
-            # Upload in smaller batches for better reliability
-            batch_size = 25  # Reduced from 50 for better reliability
-            usernames = list(sanitized_members.keys())
-            total_batches = (len(usernames) + batch_size - 1) // batch_size
-            uploaded_count = 0
-            failed_count = 0
+            def send_member_batch(batch):
+                acknowledged = fb_update("members", batch)
+                journaled.update(batch)
+                if not acknowledged:
+                    # Journaled for replay: Firebase is unreachable, so stop
+                    # here rather than bisecting (and shrinking) healthy batches
+                    raise UploadInterrupted("Firebase unreachable - batch journaled for replay")
             
-            for batch_num, i in enumerate(range(0, len(usernames), batch_size), 1):
-                batch_usernames = usernames[i:i+batch_size]
-                batch = {u: sanitized_members[u] for u in batch_usernames}
-                
-                try:
-                    db.reference("members").update(batch)
-                    uploaded_count += len(batch)
-                    
-                    # Show progress for large uploads
-                    if total_batches > 2:
-                        print(f"      Batch {batch_num}/{total_batches}: {len(batch)} members uploaded")
-                        
-                except Exception as batch_err:
-                    # If batch fails, try uploading one by one
-                    print(f"   [WARN] Batch {batch_num} failed ({batch_err}), uploading individually...")
-                    
-                    for u in batch_usernames:
-                        try:
-                            db.reference(f"members/{u}").set(sanitized_members[u])
-                            uploaded_count += 1
-                        except Exception as single_err:
-                            failed_count += 1
-                            print(f"   [ERROR] Failed {u}: {str(single_err)[:80]}")
+            # Upload in byte-sized batches (target adapts to observed latency/errors)
+            metrics = MEMBER_UPLOAD_BATCHER.upload(
+                sanitized_members,
+                send_member_batch,
+                label="members"
+            )
+            failed_count = len(metrics["failed"])
             
             # Final summary
-            if failed_count > 0:
-                print(f"   [WARN] Uploaded {uploaded_count}, failed {failed_count} members")
+            unsent = [username for username in metrics["unsent"] if username not in journaled]
+            if metrics["aborted"]:
+                print(f"   [WARN] Uploaded {metrics['items']} members, {len(journaled) - metrics['items']} "
+                      f"journaled for replay, {len(unsent)} left for the next sync (offline)")
+            elif failed_count > 0:
+                print(f"   [WARN] Uploaded {metrics['items']}, failed {failed_count} members")
             else:
-                print(f"   [OK] Uploaded {uploaded_count} members to /members/{{username}}")
+                print(f"   [OK] Uploaded {metrics['items']} members to /members/{{username}}")
+            
+            try:
+                fb_set(f"{FB_PATHS.SYNC_META}/members-upload", {
+                    "last_sync": datetime.now().isoformat(),
+                    "members": metrics["items"],
+                    "failed": failed_count,
+                    "unsent": len(unsent),
+                    "batches": metrics["batches"],
+                    "avg_batch_items": metrics["avg_batch_items"],
+                    "avg_batch_bytes": metrics["avg_batch_bytes"],
+                    "max_batch_bytes": metrics["max_batch_bytes"],
+                    "throughput_kbps": metrics["throughput_kbps"],
+                    "target_bytes": metrics["target_bytes"],
+                })
+            except Exception as e:
+                print(f"   [WARN] Could not publish upload metrics: {e}")
                 
         except Exception as e:
             print(f"   [ERROR] Failed to upload optimized members: {e}")
             import traceback
             traceback.print_exc()
     
-    return processed
+    return journaled
 
 
 def fetch_recent_sessions(cursor, hours=2):
@@ -896,6 +1378,80 @@ def fetch_recent_sessions(cursor, hours=2):
         return []
 
 
+# Firebird caps IN (...) lists at 1500 values
+FDB_IN_CHUNK = 500
+
+
+def fetch_rows_where_in(cursor, query, values, params=()):
+    """
+    Run query once per chunk of values; query contains "{in_list}" where the
+    "?, ?, ..." placeholders go, and params are bound after the chunk.
+    """
+    values = sorted(set(values))
+    rows = []
+    for i in range(0, len(values), FDB_IN_CHUNK):
+        chunk = values[i:i + FDB_IN_CHUNK]
+        cursor.execute(query.format(in_list=", ".join("?" * len(chunk))), list(chunk) + list(params))
+        names = [desc[0].strip() for desc in cursor.description]
+        rows.extend(dict(zip(names, [convert_value(v) for v in row])) for row in cursor.fetchall())
+    return rows
+
+
+def fetch_rows_by_ids(cursor, table, ids, columns="*"):
+    """Fetch rows by ID in chunked IN (...) queries."""
+    return fetch_rows_where_in(cursor, f"SELECT {columns} FROM {table} WHERE ID IN ({{in_list}})",
+                               {int(i) for i in ids})
+
+
+def fetch_session_changes(cursor, sync_state):
+    """
+    Incremental SESSIONS fetch.
+    
+    - New rows: ID > last_session_id (watermark, survives any downtime)
+    - Tracked open sessions: cheap ID/ENDPOINT check, full row only once closed
+    
+    Returns (records_to_upload, new_last_session_id, new_open_session_ids).
+    First run falls back to the recent-window fetch to seed the state.
+    """
+    last_id = sync_state.get("last_session_id")
+    
+    if last_id is None:
+        print("[DATA] No session watermark yet - seeding from recent sessions")
+        records = fetch_recent_sessions(cursor, hours=2)
+        cursor.execute("SELECT MAX(ID) FROM SESSIONS")
+        max_id = int(cursor.fetchone()[0] or 0)
+        open_ids = sorted(r["ID"] for r in records if r.get("ENDPOINT") is None)
+        return records, max_id, open_ids
+    
+    open_ids = set(sync_state.get("open_session_ids", []))
+    
+    # 1. Newly inserted sessions
+    cursor.execute(f"SELECT * FROM SESSIONS WHERE ID > {int(last_id)} ORDER BY ID ASC")
+    columns = [desc[0].strip() for desc in cursor.description]
+    new_records = [dict(zip(columns, [convert_value(v) for v in row])) for row in cursor.fetchall()]
+    
+    # 2. Tracked open sessions - only ID + ENDPOINT until one closes
+    closed_ids = []
+    still_open = set()
+    if open_ids:
+        for row in fetch_rows_by_ids(cursor, "SESSIONS", open_ids, columns="ID, ENDPOINT"):
+            if row.get("ENDPOINT") is None:
+                still_open.add(row["ID"])
+            else:
+                closed_ids.append(row["ID"])
+    closed_records = fetch_rows_by_ids(cursor, "SESSIONS", closed_ids) if closed_ids else []
+    
+    new_max_id = int(last_id)
+    for record in new_records:
+        new_max_id = max(new_max_id, int(record.get("ID") or 0))
+        if record.get("ENDPOINT") is None:
+            still_open.add(record["ID"])
+    
+    print(f"[DATA] Sessions: {len(new_records)} new (after ID {last_id}), "
+          f"{len(closed_records)} closed, {len(still_open)} open")
+    return new_records + closed_records, new_max_id, sorted(still_open)
+
+
 def process_and_upload_sessions(records):
     """Upload recent sessions grouped by member."""
     by_member = defaultdict(dict)
@@ -918,98 +1474,96 @@ def process_and_upload_sessions(records):
             by_member[member_id][session_id] = clean_record
     
     for member_id, sessions in by_member.items():
-        try:
-            ref = db.reference(f"{FB_PATHS.SESSIONS_BY_MEMBER}/{member_id}")
-            ref.update(sessions)
-        except Exception as e:
-            print(f"[WARN] Failed to upload sessions for member {member_id}: {e}")
+        fb_update(f"{FB_PATHS.SESSIONS_BY_MEMBER}/{member_id}", sessions)
     
     if guest_sessions:
-        try:
-            db.reference(f"{FB_PATHS.SESSIONS_BY_MEMBER}/guest").update(guest_sessions)
-        except Exception:
-            pass
+        fb_update(f"{FB_PATHS.SESSIONS_BY_MEMBER}/guest", guest_sessions)
     
     total = sum(len(s) for s in by_member.values()) + len(guest_sessions)
     print(f"   [OK] Updated {total} sessions for {len(by_member)} members")
 
 
-def clean_rtf(content):
-    """Remove RTF formatting and extract plain text."""
-    content = content.replace('\\par\n', '\n').replace('\\par', '\n')
-    content = re.sub(r'\{\\rtf1[^}]*\}', '', content)
-    content = re.sub(r'\{\\fonttbl[^}]*\}', '', content)
-    content = re.sub(r'\{\\colortbl[^}]*\}', '', content)
-    content = re.sub(r'\\cf\d+\s*', '', content)
-    content = re.sub(r'\\viewkind\d+', '', content)
-    content = re.sub(r'\\uc\d+', '', content)
-    content = re.sub(r'\\pard', '', content)
-    content = re.sub(r'\\f\d+', '', content)
-    content = re.sub(r'\\fs\d+', '', content)
-    content = re.sub(r'\\[a-z]+\d*\s*', '', content)
-    content = content.replace('{', '').replace('}', '')
-    content = re.sub(r'\n\s*\n', '\n', content)
-    lines = [line.strip() for line in content.split('\n')]
-    return '\n'.join(lines).strip()
-
-
-MSG_PATTERNS = {
-    'guest_session_start': re.compile(
-        r'(\d{2}:\d{2}:\d{2})->\s*([^:]+):\s*Session started \(Time Limited\)\s*\((\d+)\s*min\)'
-    ),
-    'guest_session_end': re.compile(
-        r'(\d{2}:\d{2}:\d{2})->\s*([^:]+):\s*Session closed\.\s*\[\s*Usage:\s*Rs\.\s*([\d.]+)\s*,\s*Total:\s*Rs\.\s*([\d.]+)\s*\]\*\s*Pre-Paid'
-    ),
-    'server_started': re.compile(
-        r'(\d{2}:\d{2}:\d{2})->\s*Server started\.\.\.\s*\((\d{2})\.(\d{2})\.(\d{4})\)'
-    ),
-}
+# messages.msg is only ever appended to, so it is read from where the last
+# run stopped. Parser state survives between runs in a local file:
+#   offset / anchor       - bytes consumed, and a hash of the bytes just before
+#                           the offset (a rewritten or rotated file won't match)
+#   current_date          - date of the last "Server started" line
+#   active_guest_sessions - sessions started but not yet closed
+#   date_totals           - guest session count/revenue per date so far
 
+MESSAGES_STATE_FILE = os.path.join(os.path.dirname(__file__), ".messages_state.json")
+MESSAGES_ANCHOR_BYTES = 256
+MESSAGES_CHUNK_CHARS = 1024 * 1024
 
-def parse_messages_file():
-    """Parse messages.msg and extract guest sessions."""
-    if not os.path.exists(MESSAGES_FILE):
-        print(f"   [WARN] messages.msg not found at: {MESSAGES_FILE}")
-        return None
-    
+
+def new_messages_state():
+    return {
+        "offset": 0,
+        "anchor": None,
+        "current_date": None,
+        "active_guest_sessions": {},
+        "date_totals": {},
+    }
+
+
+def load_messages_state():
+    """Load the messages.msg tail position and parser state from local file."""
     try:
-        with open(MESSAGES_FILE, 'r', encoding='utf-8', errors='ignore') as f:
-            content = f.read()
+        if os.path.exists(MESSAGES_STATE_FILE):
+            with open(MESSAGES_STATE_FILE, "r") as f:
+                return json.load(f)
     except Exception as e:
-        print(f"   [ERROR] Failed to read messages.msg: {e}")
-        return None
-    
-    text = clean_rtf(content)
-    lines = text.split('\n')
+        print(f"[WARN] Could not load messages state: {e}")
     
-    current_date = None
+    return new_messages_state()
+
+
+def save_messages_state(state):
+    """Save the messages.msg tail position and parser state to local file."""
+    try:
+        with open(MESSAGES_STATE_FILE, "w") as f:
+            json.dump(state, f)
+    except Exception as e:
+        print(f"[WARN] Could not save messages state: {e}")
+
+
+def messages_anchor(f, offset):
+    """Hash of the bytes just before offset in an open binary file."""
+    start = max(0, offset - MESSAGES_ANCHOR_BYTES)
+    f.seek(start)
+    return hashlib.md5(f.read(offset - start)).hexdigest()
+
+
+def parse_message_lines(lines, state):
+    """
+    Run plain-text messages.msg lines through the parser, continuing from state.
+    Returns the guest sessions closed in these lines.
+    """
+    active_guest_sessions = state["active_guest_sessions"]
+    date_totals = state["date_totals"]
     guest_sessions = []
-    active_guest_sessions = {}
     
     for line in lines:
-        line = line.strip()
-        if not line:
+        kind, match = match_message(line)
+        if kind is None:
             continue
         
-        match = MSG_PATTERNS['server_started'].search(line)
-        if match:
+        if kind == 'server_started':
             time_str, day, month, year = match.groups()
-            current_date = f"{year}-{month}-{day}"
+            state["current_date"] = f"{year}-{month}-{day}"
             continue
         
-        match = MSG_PATTERNS['guest_session_start'].search(line)
-        if match:
+        if kind == 'guest_session_start':
             time_str, terminal, duration = match.groups()
             active_guest_sessions[terminal] = {
-                'date': current_date,
+                'date': state["current_date"],
                 'start_time': time_str,
                 'terminal': terminal,
                 'duration_minutes': int(duration)
             }
             continue
         
-        match = MSG_PATTERNS['guest_session_end'].search(line)
-        if match:
+        if kind == 'guest_session_end':
             time_str, terminal, usage, total = match.groups()
             session_data = active_guest_sessions.pop(terminal, {})
             
@@ -1018,7 +1572,7 @@ def parse_messages_file():
             
             session = {
                 'type': 'guest',
-                'date': current_date or session_data.get('date') or '',
+                'date': state["current_date"] or session_data.get('date') or '',
                 'terminal': normalized_terminal or '',
                 'terminal_short': short_terminal or '',
                 'end_time': time_str or '',
@@ -1032,14 +1586,76 @@ def parse_messages_file():
             if session_data.get('duration_minutes'):
                 session['duration_minutes'] = session_data.get('duration_minutes')
             
+            if session['date']:
+                totals = date_totals.setdefault(session['date'], {'count': 0, 'revenue': 0})
+                totals['count'] += 1
+                totals['revenue'] += session['total']
+            
             guest_sessions.append(session)
             continue
     
     return guest_sessions
 
 
-def upload_guest_sessions(guest_sessions):
-    """Upload parsed guest sessions to Firebase."""
+def parse_messages_file(state=None):
+    """
+    Parse messages.msg and extract guest sessions.
+    
+    With a state (see load_messages_state) only bytes appended since the
+    last call are read and only newly closed sessions are returned; state is
+    advanced in place. A file that shrank or whose bytes before the offset
+    changed (rotated/rewritten) is parsed again from the start.
+    """
+    if not os.path.exists(MESSAGES_FILE):
+        print(f"   [WARN] messages.msg not found at: {MESSAGES_FILE}")
+        return None
+    if state is None:
+        state = new_messages_state()
+    
+    try:
+        with open(MESSAGES_FILE, 'rb') as f:
+            size = os.fstat(f.fileno()).st_size
+            offset = state.get("offset", 0)
+            if offset and (size < offset or messages_anchor(f, offset) != state.get("anchor")):
+                print("   [INFO] messages.msg was rotated or truncated - re-reading from the start")
+                state.clear()
+                state.update(new_messages_state())
+                offset = 0
+            
+            f.seek(offset)
+            data = f.read()
+            # Only consume complete lines, and leave a trailing "}" line unread:
+            # RTF closes the file with it and new messages are written over it
+            end = data.rfind(b"\n") + 1
+            while end and data[data.rfind(b"\n", 0, end - 1) + 1:end].strip() in (b"}", b""):
+                end = data.rfind(b"\n", 0, end - 1) + 1
+            if end == 0:
+                return []
+            new_offset = offset + end
+            new_anchor = messages_anchor(f, new_offset)
+    except Exception as e:
+        print(f"   [ERROR] Failed to read messages.msg: {e}")
+        return None
+    
+    text = data[:end].decode('utf-8', errors='ignore')
+    chunks = (text[i:i + MESSAGES_CHUNK_CHARS] for i in range(0, len(text), MESSAGES_CHUNK_CHARS))
+    guest_sessions = parse_message_lines(iter_rtf_lines(chunks, MSG_MARKERS.values()), state)
+    # Offset and anchor move together, only once the new bytes are parsed
+    state["offset"] = new_offset
+    state["anchor"] = new_anchor
+    # Daily summaries only need recent dates
+    for date_str in sorted(state["date_totals"])[:-31]:
+        del state["date_totals"][date_str]
+    print(f"   [DATA] messages.msg: {end:,} new bytes, {len(guest_sessions)} guest sessions closed")
+    return guest_sessions
+
+
+def upload_guest_sessions(guest_sessions, date_totals=None):
+    """
+    Upload parsed guest sessions to Firebase.
+    date_totals: running {date: {count, revenue}} for the daily summary;
+    defaults to totals of guest_sessions alone.
+    """
     if not guest_sessions:
         print("   No guest sessions to upload")
         return
@@ -1056,18 +1672,20 @@ def upload_guest_sessions(guest_sessions):
                 key = f"{s['terminal_short']}_{s['end_time'].replace(':', '')}".replace(" ", "_")
                 keyed_sessions[key] = s
             
-            ref = db.reference(f"{FB_PATHS.GUEST_SESSIONS}/{date_str}")
-            ref.update(keyed_sessions)
+            fb_update(f"{FB_PATHS.GUEST_SESSIONS}/{date_str}", keyed_sessions)
         except Exception as e:
             print(f"   [WARN] Failed to upload guest sessions for {date_str}: {e}")
     
     for date_str, sessions in by_date.items():
         try:
-            total_revenue = sum(s['total'] for s in sessions)
-            total_count = len(sessions)
+            if date_totals and date_str in date_totals:
+                total_revenue = date_totals[date_str]['revenue']
+                total_count = date_totals[date_str]['count']
+            else:
+                total_revenue = sum(s['total'] for s in sessions)
+                total_count = len(sessions)
             
-            ref = db.reference(f"daily-summary/{date_str}")
-            ref.update({
+            fb_update(f"daily-summary/{date_str}", {
                 'guest_sessions': total_count,
                 'guest_revenue': total_revenue
             })
@@ -1218,24 +1836,47 @@ def process_and_upload_terminal_status(terminals):
     # Upload to Firebase
     try:
         # New path
-        db.reference(FB_PATHS.TERMINAL_STATUS).set(terminal_status)
+        fb_set(FB_PATHS.TERMINAL_STATUS, terminal_status)
         
-        # Legacy path (for backward compatibility)
-        for name, data in terminal_status.items():
-            safe_key = name.replace(" ", "_").replace("/", "_")
-            try:
-                db.reference(f"{FB_PATHS.LEGACY_STATUS}/{safe_key}").set(data)
-            except:
-                pass
+        # Legacy path (for backward compatibility) - one multi-path write
+        fb_update(FB_PATHS.LEGACY_STATUS, {
+            name.replace(" ", "_").replace("/", "_"): data
+            for name, data in terminal_status.items()
+        })
         
         print(f"   [OK] Updated {len(terminal_status)} terminals ({occupied_count} occupied)")
     except Exception as e:
         print(f"   [ERROR] Failed to upload terminal status: {e}")
 
 
+# Copy time of the snapshot behind the last published terminal status
+TERMINAL_STATUS_SNAPSHOT = None
+
+
+def sync_terminal_status(cursor, snapshot_time=None):
+    """
+    Read TERMINALS and publish it, unless status from a newer snapshot was
+    already published (a full sync's snapshot can be older than the one a
+    terminals-only run copied after it). Returns the terminals, or None
+    when skipped.
+    """
+    global TERMINAL_STATUS_SNAPSHOT
+    with RESOURCE_LOCKS["terminal_status"]:
+        if snapshot_time and TERMINAL_STATUS_SNAPSHOT and snapshot_time < TERMINAL_STATUS_SNAPSHOT:
+            return None
+        terminals = fetch_terminals_from_fdb(cursor)
+        process_and_upload_terminal_status(terminals)
+        if snapshot_time:
+            TERMINAL_STATUS_SNAPSHOT = snapshot_time
+    return terminals
+
+
 # ==================== KASAHAR (CASH REGISTER) SYNC ====================
 
-def fetch_kasahar_records(cursor, days=7):
+KASAHAR_WINDOW_DAYS = 7   # Days of revenue kept in sync (checksummed every run)
+
+
+def fetch_kasahar_records(cursor, days=KASAHAR_WINDOW_DAYS):
     """Fetch cash register transactions from the last N days."""
     try:
         cursor.execute(f"""
@@ -1253,6 +1894,107 @@ def fetch_kasahar_records(cursor, days=7):
         return []
 
 
+def kasahar_date_str(tarih):
+    """YYYY-MM-DD for a KASAHAR TARIH value (ISO string or date/datetime), else None."""
+    if isinstance(tarih, str):
+        try:
+            return datetime.fromisoformat(tarih).strftime("%Y-%m-%d")
+        except ValueError:
+            return None
+    if hasattr(tarih, "strftime"):
+        return tarih.strftime("%Y-%m-%d")
+    return None
+
+
+def fetch_kasahar_day_checksums(cursor, days=KASAHAR_WINDOW_DAYS):
+    """
+    Per-day fingerprint of the KASAHAR window in one aggregate query.
+    
+    Count, max ID and ID-weighted sums of the published columns: any
+    insert, delete or late edit of amount/type/payment changes the day's
+    checksum without transferring the rows. NOTE and ADMINNAME count by
+    trimmed length, so only a same-length rewrite slips through; the time
+    of day within TARIH is not covered (it is set once, at the till).
+    """
+    cursor.execute(f"""
+        SELECT CAST(TARIH AS DATE), COUNT(*), MAX(ID), SUM(ID),
+               SUM(COALESCE(PRICE, 0)),
+               SUM(ID * COALESCE(PRICE, 0)),
+               SUM(ID * (COALESCE(ISLEM, 0) * 16 + COALESCE(GELIRGIDER, 0) * 4 + COALESCE(PAYMENTTYPE, 0))),
+               SUM(ID * (CHAR_LENGTH(TRIM(COALESCE(NOTE, ''))) + CHAR_LENGTH(TRIM(COALESCE(ADMINNAME, '')))))
+        FROM KASAHAR
+        WHERE TARIH >= CURRENT_DATE - {days}
+        GROUP BY CAST(TARIH AS DATE)
+    """)
+    checksums = {}
+    for row in cursor.fetchall():
+        date_str = kasahar_date_str(convert_value(row[0]))
+        if date_str:
+            checksums[date_str] = ":".join(
+                str(round(float(v), 2)) if v is not None else "0" for v in row[1:]
+            )
+    return checksums
+
+
+def fetch_kasahar_rows_for_days(cursor, dates):
+    """Fetch every KASAHAR row for the given YYYY-MM-DD dates (one query)."""
+    dates = sorted(dates)
+    if not dates:
+        return []
+    ranges = []
+    params = []
+    for date_str in dates:
+        day = datetime.strptime(date_str, "%Y-%m-%d")
+        ranges.append("(TARIH >= ? AND TARIH < ?)")
+        params.extend([day, day + timedelta(days=1)])
+    cursor.execute(f"""
+        SELECT ID, ADMINNAME, ISLEM, GELIRGIDER, TARIH, PRICE, NOTE, PAYMENTTYPE
+        FROM KASAHAR
+        WHERE {" OR ".join(ranges)}
+        ORDER BY TARIH DESC
+    """, params)
+    columns = [desc[0].strip() for desc in cursor.description]
+    return [dict(zip(columns, [convert_value(v) for v in row])) for row in cursor.fetchall()]
+
+
+def fetch_kasahar_changes(cursor, sync_state, days=KASAHAR_WINDOW_DAYS):
+    """
+    Incremental KASAHAR fetch: only days whose data changed.
+    
+    A day is dirty when
+    - it contains a row with ID > last_kasahar_id (catches back-dated rows
+      outside the window), or
+    - its checksum differs from the stored one (inserts, deletes, late edits)
+    
+    Returns (records_for_dirty_days, dirty_dates, new_last_id, new_checksums).
+    """
+    last_id = sync_state.get("last_kasahar_id")
+    stored = sync_state.get("kasahar_day_checksums") or {}
+    window_start = (datetime.now() - timedelta(days=days)).strftime("%Y-%m-%d")
+    
+    checksums = fetch_kasahar_day_checksums(cursor, days)
+    dirty = {d for d, checksum in checksums.items() if stored.get(d) != checksum}
+    # Days inside the window that lost all their rows
+    dirty |= {d for d in stored if d >= window_start and d not in checksums}
+    
+    if last_id is None:
+        cursor.execute("SELECT MAX(ID) FROM KASAHAR")
+        new_last_id = int(cursor.fetchone()[0] or 0)
+    else:
+        new_last_id = int(last_id)
+        cursor.execute(f"SELECT ID, TARIH FROM KASAHAR WHERE ID > {int(last_id)}")
+        for row_id, tarih in cursor.fetchall():
+            new_last_id = max(new_last_id, int(row_id))
+            date_str = kasahar_date_str(convert_value(tarih))
+            if date_str:
+                dirty.add(date_str)
+    
+    records = fetch_kasahar_rows_for_days(cursor, dirty)
+    print(f"[DATA] Cash register: {len(dirty)} of {len(checksums)} day(s) changed, "
+          f"{len(records)} records re-read")
+    return records, sorted(dirty), new_last_id, checksums
+
+
 # KASAHAR field meanings:
 # ISLEM (Transaction Type): 1=Session, 2=Recharge, 3=Cafeteria, 4=Other
 # GELIRGIDER (Income/Expense): 0=Income, 1=Expense
@@ -1273,9 +2015,14 @@ PAYMENT_TYPES = {
 }
 
 
-def process_and_upload_kasahar(records):
-    """Process cash register records and compute daily summaries."""
-    if not records:
+def process_and_upload_kasahar(records, dates=None):
+    """
+    Process cash register records and compute daily summaries.
+    
+    dates: days being republished; any of them without records is removed
+    (every row of that day was deleted). Defaults to the days in records.
+    """
+    if not records and not dates:
         print("   No cash register records to process")
         return
     
@@ -1292,19 +2039,8 @@ def process_and_upload_kasahar(records):
     
     for record in records:
         tarih = record.get("TARIH")
-        if not tarih:
-            continue
-        
-        # Parse date
-        if isinstance(tarih, str):
-            try:
-                dt = datetime.fromisoformat(tarih)
-                date_str = dt.strftime("%Y-%m-%d")
-            except:
-                continue
-        elif hasattr(tarih, 'strftime'):
-            date_str = tarih.strftime("%Y-%m-%d")
-        else:
+        date_str = kasahar_date_str(tarih)
+        if not date_str:
             continue
         
         price = float(record.get("PRICE") or 0)
@@ -1357,20 +2093,27 @@ def process_and_upload_kasahar(records):
             # Remove None values
             summary = remove_none_values(summary)
             
-            db.reference(f"{FB_PATHS.DAILY_REVENUE}/{date_str}").set(summary)
+            fb_set(f"{FB_PATHS.DAILY_REVENUE}/{date_str}", summary)
             
             # Also upload transactions for recent days only (last 3 days)
             recent_cutoff = datetime.now() - timedelta(days=3)
             try:
                 trans_date = datetime.strptime(date_str, "%Y-%m-%d")
                 if trans_date >= recent_cutoff and data["transactions"]:
-                    db.reference(f"{FB_PATHS.CASH_REGISTER}/{date_str}").set(data["transactions"])
+                    fb_set(f"{FB_PATHS.CASH_REGISTER}/{date_str}", data["transactions"])
             except:
                 pass
             
         except Exception as e:
             print(f"   [WARN] Failed to upload daily revenue for {date_str}: {e}")
     
+    emptied = sorted(set(dates or []) - set(daily_data))
+    for date_str in emptied:
+        fb_delete(f"{FB_PATHS.DAILY_REVENUE}/{date_str}")
+        fb_delete(f"{FB_PATHS.CASH_REGISTER}/{date_str}")
+    if emptied:
+        print(f"   [OK] Removed revenue data for {len(emptied)} emptied day(s)")
+    
     # Compute totals for display
     total_income = sum(d["total_income"] for d in daily_data.values())
     total_transactions = sum(d["transaction_count"] for d in daily_data.values())
@@ -1379,6 +2122,360 @@ def process_and_upload_kasahar(records):
     print(f"   [DATA] Total: Rs.{total_income:,.0f} from {total_transactions} transactions")
 
 
+# ==================== LEADERBOARD PUBLISHING (PAGED + DELTA) ====================
+# Leaderboards are published as fixed-size pages plus a small meta node:
+#   /leaderboards/all-time/meta, /leaderboards/all-time/pages/{0..N}
+#   /leaderboards/monthly/{YYYY-MM}/meta, .../pages/{0..N}
+#   /leaderboards/weekly/{YYYY-Wxx}/meta, .../pages/{0..N}
+# The last published entries are kept locally so each sync only patches
+# the slots whose rank or values actually moved.
+
+LEADERBOARD_PAGE_SIZE = 50  # Entries per page (page 0 covers the top-10 views)
+LEADERBOARD_STATE_FILE = os.path.join(os.path.dirname(__file__), ".leaderboard_state.json")
+
+
+def load_leaderboard_state():
+    """Load the last published leaderboard entries from local file."""
+    try:
+        if os.path.exists(LEADERBOARD_STATE_FILE):
+            with open(LEADERBOARD_STATE_FILE, "r") as f:
+                return json.load(f)
+    except Exception as e:
+        print(f"[WARN] Could not load leaderboard state: {e}")
+    
+    return {"page_size": LEADERBOARD_PAGE_SIZE, "boards": {}}
+
+
+def save_leaderboard_state(state):
+    """Save the last published leaderboard entries to local file."""
+    try:
+        with open(LEADERBOARD_STATE_FILE, "w") as f:
+            json.dump(state, f)
+    except Exception as e:
+        print(f"[WARN] Could not save leaderboard state: {e}")
+
+
+def build_leaderboard_meta(entries, page_size=LEADERBOARD_PAGE_SIZE):
+    """Build the small meta node clients read before fetching pages."""
+    meta = {
+        "total_entries": len(entries),
+        "total_minutes": sum(int(e.get("total_minutes") or 0) for e in entries),
+        "page_size": page_size,
+        "page_count": (len(entries) + page_size - 1) // page_size,
+    }
+    if entries:
+        meta["top_username"] = entries[0].get("username") or ""
+        meta["top_minutes"] = int(entries[0].get("total_minutes") or 0)
+    return meta
+
+
+def diff_leaderboard(previous, current, page_size=LEADERBOARD_PAGE_SIZE, slots=None):
+    """
+    Compute a multi-path patch turning the previous pages into the current ones.
+    
+    slots: indexes of the only entries that may differ (besides a grown or
+    shrunk tail); None compares every entry.
+    
+    Returns {relative_path: value} where value None deletes the slot/page.
+    Only slots whose entry changed are included.
+    """
+    updates = {}
+    new_page_count = (len(current) + page_size - 1) // page_size
+    old_page_count = (len(previous) + page_size - 1) // page_size
+    
+    indexes = range(max(len(previous), len(current)))
+    if slots is not None:
+        tail = range(min(len(previous), len(current)), max(len(previous), len(current)))
+        indexes = sorted(set(slots).union(tail))
+    for idx in indexes:
+        page, slot = divmod(idx, page_size)
+        if idx >= len(current):
+            # Whole pages past the new end are dropped in one go below
+            if page < new_page_count:
+                updates[f"pages/{page}/{slot}"] = None
+        elif idx >= len(previous) or previous[idx] != current[idx]:
+            updates[f"pages/{page}/{slot}"] = current[idx]
+    
+    for page in range(new_page_count, old_page_count):
+        updates[f"pages/{page}"] = None
+    
+    old_meta = build_leaderboard_meta(previous, page_size)
+    new_meta = build_leaderboard_meta(current, page_size)
+    if updates or old_meta != new_meta:
+        new_meta["last_updated"] = datetime.now().isoformat()
+        updates["meta"] = new_meta
+    
+    return updates
+
+
+def publish_leaderboard(board_key, entries, lb_state, slots=None):
+    """
+    Publish a leaderboard as pages + meta under /leaderboards/{board_key}.
+    
+    First publish (or page size change) writes the full node; afterwards
+    only the changed slots are patched. slots: indexes of the only entries
+    that may have changed since the last publish (see diff_leaderboard).
+    Returns the number of entries written.
+    """
+    page_size = LEADERBOARD_PAGE_SIZE
+    base_path = f"{FB_PATHS.LEADERBOARDS}/{board_key}"
+    boards = lb_state.setdefault("boards", {})
+    previous = boards.get(board_key)
+    full = previous is None or lb_state.get("page_size") != page_size
+    if slots is None or full:
+        entries = [sanitize_for_firebase(e) for e in entries]
+    else:
+        for idx in slots:
+            entries[idx] = sanitize_for_firebase(entries[idx])
+    
+    if full:
+        pages = {
+            str(page): entries[start:start + page_size]
+            for page, start in enumerate(range(0, len(entries), page_size))
+        }
+        meta = build_leaderboard_meta(entries, page_size)
+        meta["last_updated"] = datetime.now().isoformat()
+        fb_set(base_path, {"meta": meta, "pages": pages} if pages else {"meta": meta})
+        boards[board_key] = entries
+        return len(entries)
+    
+    updates = diff_leaderboard(previous, entries, page_size, slots)
+    if updates:
+        fb_update(base_path, updates)
+    boards[board_key] = entries
+    return sum(1 for path in updates if path.count("/") == 2)
+
+
+def prune_leaderboard_state(lb_state, keep_keys):
+    """Forget published state for periods that are no longer being updated."""
+    for section in (lb_state.get("boards", {}), lb_state.get("rank_scores", {}), RANK_INDEXES, LEADERBOARD_INPUTS):
+        for key in list(section.keys()):
+            if key not in keep_keys:
+                del section[key]
+    lb_state["page_size"] = LEADERBOARD_PAGE_SIZE
+
+
+# Ranking indexes per board key (see rank_index.py). They stay in memory
+# while the sync service runs and are restored from the state file after a
+# restart, so a sync only applies the members whose minutes changed.
+RANK_INDEXES = {}
+RANK_SHIFTS = {}              # board key -> {USERNAME: new rank or None} from the last calculation
+LEADERBOARD_MAX_SPENT = None  # Highest member spend, for the big_spender badge
+# Board key -> {USERNAME: entry inputs} behind the entries last published by
+# this process, so a sync rebuilds only entries whose rank or inputs changed
+LEADERBOARD_INPUTS = {}
+
+
+def leaderboard_period_keys(now=None):
+    """(month_key, week_key) of the boards currently being updated."""
+    now = now or datetime.now()
+    return f"{now.year}-{now.month:02d}", f"{now.year}-W{now.isocalendar()[1]:02d}"
+
+
+def restore_rank_indexes(board_keys):
+    """Load ranking indexes (and max spend) saved by an earlier leaderboard run."""
+    global LEADERBOARD_MAX_SPENT
+    missing = [key for key in board_keys if key not in RANK_INDEXES]
+    if not missing and LEADERBOARD_MAX_SPENT is not None:
+        return
+    lb_state = load_leaderboard_state()
+    saved = lb_state.get("rank_scores", {})
+    for key in missing:
+        if key in saved:
+            RANK_INDEXES[key] = RankIndex(saved[key], reported=True)
+    if LEADERBOARD_MAX_SPENT is None:
+        LEADERBOARD_MAX_SPENT = lb_state.get("max_spent")
+
+
+def update_rank_index(board_key, scores, lb_state):
+    """
+    Bring a board's ranking index in line with {USERNAME: minutes} by point
+    updates; records which members' ranks shifted in RANK_SHIFTS.
+    """
+    index = RANK_INDEXES.get(board_key)
+    if index is None:
+        saved = lb_state.get("rank_scores", {}).get(board_key)
+        index = RankIndex(saved, reported=bool(saved))
+        RANK_INDEXES[board_key] = index
+    index.sync(scores)
+    RANK_SHIFTS[board_key] = index.shifted()
+    lb_state.setdefault("rank_scores", {})[board_key] = index.scores()
+    return index
+
+
+def publish_ranked_leaderboard(board_key, index, inputs, build_entry, lb_state):
+    """
+    Publish a board in the order of its ranking index, rebuilding only the
+    entries that can differ from the last publish: ranks that shifted
+    (RANK_SHIFTS) and members whose inputs changed.
+    
+    inputs: {USERNAME: tuple of everything the entry is built from besides
+    its rank}. build_entry(rank, username) builds one entry. The first
+    publish in this process builds every entry.
+    Returns the number of entries written.
+    """
+    previous = lb_state.get("boards", {}).get(board_key)
+    known = LEADERBOARD_INPUTS.pop(board_key, None)
+    size = len(index)
+    if known is None or previous is None or lb_state.get("page_size") != LEADERBOARD_PAGE_SIZE:
+        entries = [build_entry(rank, username) for rank, (username, _) in enumerate(index.top(size), 1)]
+        written = publish_leaderboard(board_key, entries, lb_state)
+        LEADERBOARD_INPUTS[board_key] = inputs
+        return written
+    
+    ranks = {rank for rank in RANK_SHIFTS.get(board_key, {}).values() if rank}
+    ranks.update(index.rank(username) for username, value in inputs.items()
+                 if username in index and known.get(username) != value)
+    ranks.update(range(len(previous) + 1, size + 1))
+    entries = previous[:size]
+    for rank in sorted(rank for rank in ranks if rank <= size):
+        username = index.slice(rank, rank)[0][0]
+        if rank <= len(entries):
+            entries[rank - 1] = build_entry(rank, username)
+        else:
+            entries.append(build_entry(rank, username))
+    written = publish_leaderboard(board_key, entries, lb_state,
+                                  slots=[rank - 1 for rank in ranks if rank <= size])
+    LEADERBOARD_INPUTS[board_key] = inputs
+    return written
+
+
+# ==================== LEADERBOARD PERIOD AGGREGATES ====================
+# Monthly/weekly member totals are kept as running aggregates in the
+# leaderboard state file instead of being rebuilt from SESSIONS every sync:
+#   "aggregates": {
+#       "last_session_id": N,                  # SESSIONS rows folded in so far
+#       "months": {"YYYY-MM":    {member_id: [minutes, sessions, spent]}},
+#       "weeks":  {"YYYY-MM-DD": {member_id: [minutes, sessions, spent]}},  # keyed by Monday
+#       "open":   {session_id: [member_id, minutes, spent, month, week]},   # provisional
+#       "last_full_check": ISO timestamp
+#   }
+# Open sessions are counted with their current values and corrected once
+# they close. Every LEADERBOARD_FULL_CHECK_HOURS the totals are rebuilt from
+# FDB and compared, so any drift (e.g. edited old sessions) is repaired.
+
+LEADERBOARD_FULL_CHECK_HOURS = 6
+AGGREGATE_SESSION_COLUMNS = "ID, MEMBERID, USINGMIN, TOTALPRICE, STARTPOINT, ENDPOINT"
+
+
+def session_periods(startpoint):
+    """(month_key, week_monday) for a session start, or None if unparseable."""
+    if isinstance(startpoint, str):
+        try:
+            startpoint = datetime.fromisoformat(startpoint)
+        except ValueError:
+            return None
+    if not hasattr(startpoint, "year"):
+        return None
+    monday = date(startpoint.year, startpoint.month, startpoint.day) - timedelta(days=startpoint.weekday())
+    return f"{startpoint.year}-{startpoint.month:02d}", monday.isoformat()
+
+
+def apply_session_contribution(aggregates, contribution, sign=1):
+    """Add (sign=1) or remove (sign=-1) one session's totals in its periods."""
+    member_id, minutes, spent, month, week = contribution
+    for bucket in (aggregates["months"].setdefault(month, {}), aggregates["weeks"].setdefault(week, {})):
+        totals = bucket.setdefault(member_id, [0, 0, 0])
+        totals[0] += sign * minutes
+        totals[1] += sign
+        totals[2] = round(totals[2] + sign * spent, 2)
+        if totals[1] <= 0:
+            del bucket[member_id]
+
+
+def session_contribution(row):
+    """Contribution of a SESSIONS row (AGGREGATE_SESSION_COLUMNS) or None."""
+    periods = session_periods(row.get("STARTPOINT"))
+    if not periods or not row.get("MEMBERID"):
+        return None
+    return [str(row["MEMBERID"]), int(row.get("USINGMIN") or 0), float(row.get("TOTALPRICE") or 0), *periods]
+
+
+def fold_sessions_into_aggregates(aggregates, rows):
+    """Fold SESSIONS rows in; open ones are remembered so they can be corrected."""
+    for row in rows:
+        session_id = str(row["ID"])
+        previous = aggregates["open"].pop(session_id, None)
+        if previous:
+            apply_session_contribution(aggregates, previous, -1)
+        contribution = session_contribution(row)
+        if contribution:
+            apply_session_contribution(aggregates, contribution)
+            if row.get("ENDPOINT") is None:
+                aggregates["open"][session_id] = contribution
+        aggregates["last_session_id"] = max(aggregates["last_session_id"], int(row["ID"]))
+
+
+def rebuild_period_aggregates(cursor, since):
+    """Recompute aggregates from scratch for sessions starting on/after since."""
+    cursor.execute("SELECT MAX(ID) FROM SESSIONS")
+    max_id = int(cursor.fetchone()[0] or 0)
+    cursor.execute(f"""
+        SELECT {AGGREGATE_SESSION_COLUMNS}
+        FROM SESSIONS
+        WHERE MEMBERID > 0 AND STARTPOINT >= '{since.strftime("%Y-%m-%d")}' AND ID <= {max_id}
+    """)
+    columns = [desc[0].strip() for desc in cursor.description]
+    aggregates = {"last_session_id": 0, "months": {}, "weeks": {}, "open": {}}
+    fold_sessions_into_aggregates(
+        aggregates, [dict(zip(columns, [convert_value(v) for v in row])) for row in cursor.fetchall()]
+    )
+    aggregates["last_session_id"] = max_id
+    aggregates["last_full_check"] = datetime.now().isoformat()
+    return aggregates
+
+
+def refresh_period_aggregates(cursor, lb_state, month_key, week_monday):
+    """
+    Bring the running monthly/weekly aggregates up to date.
+    
+    Normally reads only SESSIONS rows past the stored ID watermark plus the
+    open sessions being tracked. Returns (month_totals, week_totals) for the
+    current periods as {member_id: [minutes, sessions, spent]}.
+    """
+    aggregates = lb_state.get("aggregates")
+    now = datetime.now()
+    since = min(datetime.strptime(f"{month_key}-01", "%Y-%m-%d"),
+                datetime.strptime(week_monday, "%Y-%m-%d"))
+    
+    if not aggregates:
+        print("   [DATA] Building monthly/weekly aggregates from SESSIONS")
+        aggregates = rebuild_period_aggregates(cursor, since)
+    else:
+        cursor.execute(f"""
+            SELECT {AGGREGATE_SESSION_COLUMNS}
+            FROM SESSIONS
+            WHERE ID > {int(aggregates["last_session_id"])} AND MEMBERID > 0
+            ORDER BY ID ASC
+        """)
+        columns = [desc[0].strip() for desc in cursor.description]
+        new_rows = [dict(zip(columns, [convert_value(v) for v in row])) for row in cursor.fetchall()]
+        open_rows = fetch_rows_by_ids(cursor, "SESSIONS", aggregates["open"].keys(),
+                                      columns=AGGREGATE_SESSION_COLUMNS) if aggregates["open"] else []
+        fold_sessions_into_aggregates(aggregates, open_rows + new_rows)
+        print(f"   [DATA] Aggregates: {len(new_rows)} new sessions, "
+              f"{len(open_rows)} open re-checked (watermark ID {aggregates['last_session_id']})")
+        
+        last_check = aggregates.get("last_full_check")
+        if not last_check or now - datetime.fromisoformat(last_check) >= timedelta(hours=LEADERBOARD_FULL_CHECK_HOURS):
+            rebuilt = rebuild_period_aggregates(cursor, since)
+            drifted = [
+                key for kind, key in (("months", month_key), ("weeks", week_monday))
+                if rebuilt[kind].get(key, {}) != aggregates[kind].get(key, {})
+            ]
+            if drifted:
+                print(f"   [WARN] Leaderboard aggregates drifted for {', '.join(drifted)} - using full recompute")
+            else:
+                print("   [OK] Full recompute check: aggregates match")
+            aggregates = rebuilt
+    
+    # Rollover: periods before the current ones are no longer published
+    aggregates["months"] = {k: v for k, v in aggregates["months"].items() if k >= month_key}
+    aggregates["weeks"] = {k: v for k, v in aggregates["weeks"].items() if k >= week_monday}
+    lb_state["aggregates"] = aggregates
+    return aggregates["months"].get(month_key, {}), aggregates["weeks"].get(week_monday, {})
+
+
 # ==================== LEADERBOARD CALCULATION ====================
 
 def calculate_leaderboards_from_fdb(members, cursor):
@@ -1411,7 +2508,8 @@ def calculate_leaderboards_from_fdb(members, cursor):
                 raw = dict(zip(columns, [convert_value(v) for v in row]))
                 username = (raw.get("MEMBERS_USERNAME") or "").upper()
                 if username:
-                    record = {"ID": raw.get("ID"), "DATE": raw.get("TARIH")}
+                    record = {"ID": raw.get("ID"), "DATE": raw.get("TARIH"),
+                              "USINGMIN": raw.get("USINGMIN"), "CHARGE": raw.get("MIKTAR")}
                     if username not in all_history:
                         all_history[username] = []
                     all_history[username].append(record)
@@ -1420,44 +2518,56 @@ def calculate_leaderboards_from_fdb(members, cursor):
         except Exception as e:
             print(f"   [WARN] Could not load history from FDB: {e}")
         
-        # All-time leaderboard (from members TOTALACTMINUTE)
-        all_time = []
-        members_with_minutes = [m for m in members if m.get("TOTALACTMINUTE", 0) > 0]
-        print(f"   [DATA] Found {len(members_with_minutes)} members with TOTALACTMINUTE > 0")
+        global LEADERBOARD_MAX_SPENT
+        lb_state = load_leaderboard_state()
         
-        # Show top 5 for debugging
-        if members_with_minutes:
-            top_debug = sorted(members_with_minutes, key=lambda m: m.get("TOTALACTMINUTE", 0), reverse=True)[:5]
-            for td in top_debug:
-                print(f"      - {td.get('USERNAME')}: {td.get('TOTALACTMINUTE')} minutes")
+        # All-time leaderboard (from members TOTALACTMINUTE), ordered by the ranking index
+        members_by_username = {
+            (m.get("USERNAME") or "").upper(): m for m in members if m.get("USERNAME")
+        }
+        all_time_index = update_rank_index("all-time", {
+            username: int(m.get("TOTALACTMINUTE") or 0) for username, m in members_by_username.items()
+        }, lb_state)
+        print(f"   [DATA] Found {len(all_time_index)} members with TOTALACTMINUTE > 0 "
+              f"({len(RANK_SHIFTS['all-time'])} rank changes)")
         
-        sorted_members = sorted(
-            members_with_minutes,
-            key=lambda m: m.get("TOTALACTMINUTE", 0),
-            reverse=True
-        )  # All members with activity
+        # Show top 5 for debugging
+        for username, minutes in all_time_index.top(5):
+            print(f"      - {username}: {minutes} minutes")
         
-        # Calculate max spending for badge comparison
-        max_spent = 0
-        for m in sorted_members:
+        def member_spent(m):
             total_loaded = float(m.get("TOTALBAKIYE") or 0)
             current = float(m.get("BAKIYE") or m.get("BALANCE") or 0)
-            spent = total_loaded - current if total_loaded > current else 0
-            if spent > max_spent:
-                max_spent = spent
+            return total_loaded - current if total_loaded > current else 0
         
-        for i, m in enumerate(sorted_members):
+        # Calculate max spending for badge comparison
+        spent_by_username = {
+            username: member_spent(m) for username, m in members_by_username.items() if username in all_time_index
+        }
+        max_spent = max(spent_by_username.values(), default=0)
+        LEADERBOARD_MAX_SPENT = lb_state["max_spent"] = max_spent
+        
+        # Everything an entry is built from besides its rank (streaks count
+        # from today, so the day is part of it)
+        today = datetime.now().strftime("%Y-%m-%d")
+        all_time_inputs = {}
+        for username, spent in spent_by_username.items():
+            m = members_by_username[username]
+            user_history = all_history.get(username, [])
+            all_time_inputs[username] = (
+                int(m.get("TOTALACTMINUTE") or 0), round(spent, 2), m.get("DISPLAY_NAME") or m.get("USERNAME"),
+                m.get("RECDATE"), m.get("ID"), user_history[0].get("ID") if user_history else None,
+                len(user_history), today, max_spent > 0 and spent >= max_spent * 0.9,
+            )
+        
+        def all_time_entry(rank, username):
+            m = members_by_username[username]
             # Use DISPLAY_NAME for original case, fallback to USERNAME
             display_name = m.get("DISPLAY_NAME") or m.get("USERNAME") or ""
-            username = (m.get("USERNAME") or "").upper()
-            
-            # Calculate total_spent for this member
-            total_loaded = float(m.get("TOTALBAKIYE") or 0)
-            current = float(m.get("BAKIYE") or m.get("BALANCE") or 0)
-            spent = total_loaded - current if total_loaded > current else 0
+            spent = spent_by_username[username]
             
             entry = {
-                "rank": i + 1,
+                "rank": rank,
                 "username": display_name,
                 "total_minutes": int(m.get("TOTALACTMINUTE") or 0),
                 "total_hours": round((m.get("TOTALACTMINUTE") or 0) / 60, 1),
@@ -1485,11 +2595,11 @@ def calculate_leaderboards_from_fdb(members, cursor):
             
             # Pre-compute badges for frontend
             badges = {}
-            if i == 0:
+            if rank == 1:
                 badges["champion"] = True
-            elif i == 1:
+            elif rank == 2:
                 badges["runner_up"] = True
-            elif i == 2:
+            elif rank == 3:
                 badges["third_place"] = True
             
             total_minutes = m.get("TOTALACTMINUTE", 0)
@@ -1502,74 +2612,53 @@ def calculate_leaderboards_from_fdb(members, cursor):
             
             if badges:
                 entry["badges"] = badges
-            
-            all_time.append(entry)
+            return entry
         
-        db.reference(f"{FB_PATHS.LEADERBOARDS}/all-time").set(all_time)
-        print(f"[OK] Updated all-time leaderboard ({len(all_time)} entries with badges)")
+        changed = publish_ranked_leaderboard("all-time", all_time_index, all_time_inputs, all_time_entry, lb_state)
+        print(f"[OK] Updated all-time leaderboard ({len(all_time_index)} entries, {changed} patched)")
         
-        # Build member ID to display name lookup (preserve original case)
-        member_id_to_display_name = {}
+        # Build member ID to username lookup; display names keep original case
+        member_id_to_username = {}
+        display_names = {}
         for m in members:
             member_id = m.get("ID")
             display_name = m.get("DISPLAY_NAME") or m.get("USERNAME") or ""
             if member_id and display_name:
-                member_id_to_display_name[member_id] = display_name
+                username = (m.get("USERNAME") or display_name).upper()
+                member_id_to_username[member_id] = username
+                display_names[username] = display_name
         
-        # Fetch sessions from FDB for monthly/weekly calculation using existing cursor
+        # Monthly/weekly periods
         now = datetime.now()
         month_start = datetime(now.year, now.month, 1)
-        month_key = f"{now.year}-{now.month:02d}"
-        
         day_of_week = now.weekday()
         week_start = now - timedelta(days=day_of_week)
         week_start = datetime(week_start.year, week_start.month, week_start.day)
-        week_num = now.isocalendar()[1]
-        week_key = f"{now.year}-W{week_num:02d}"
+        month_key, week_key = leaderboard_period_keys(now)
         
         monthly_stats = defaultdict(lambda: {"minutes": 0, "sessions": 0, "spent": 0})
         weekly_stats = defaultdict(lambda: {"minutes": 0, "sessions": 0})
         
-        # Query sessions from FDB using the passed cursor
-        month_start_str = month_start.strftime("%Y-%m-%d")
-        
+        # Running aggregates: only sessions past the watermark are read
         try:
-            query = f"""
-                SELECT MEMBERID, USINGMIN, TOTALPRICE, STARTPOINT 
-                FROM SESSIONS 
-                WHERE MEMBERID > 0 AND STARTPOINT >= '{month_start_str}'
-            """
-            cursor.execute(query)
+            month_totals, week_totals = refresh_period_aggregates(
+                cursor, lb_state, month_key, week_start.strftime("%Y-%m-%d")
+            )
             
-            for row in cursor.fetchall():
-                member_id = row[0]
-                usingmin = int(row[1] or 0)
-                totalprice = float(row[2] or 0)
-                startpoint = row[3]
-                
-                username = member_id_to_display_name.get(member_id)
+            for member_id, (minutes, sessions, spent) in month_totals.items():
+                username = member_id_to_username.get(int(member_id))
                 if not username:
                     continue
-                
-                # Add to monthly stats
-                monthly_stats[username]["sessions"] += 1
-                monthly_stats[username]["minutes"] += usingmin
-                monthly_stats[username]["spent"] += totalprice
-                
-                # Check if also in current week
-                if isinstance(startpoint, str):
-                    try:
-                        session_dt = datetime.fromisoformat(startpoint)
-                    except:
-                        continue
-                elif hasattr(startpoint, 'year'):
-                    session_dt = startpoint
-                else:
+                monthly_stats[username]["sessions"] += sessions
+                monthly_stats[username]["minutes"] += minutes
+                monthly_stats[username]["spent"] += spent
+            
+            for member_id, (minutes, sessions, _spent) in week_totals.items():
+                username = member_id_to_username.get(int(member_id))
+                if not username:
                     continue
-                
-                if session_dt >= week_start:
-                    weekly_stats[username]["sessions"] += 1
-                    weekly_stats[username]["minutes"] += usingmin
+                weekly_stats[username]["sessions"] += sessions
+                weekly_stats[username]["minutes"] += minutes
             
             print(f"[OK] Calculated monthly/weekly stats from FDB SESSIONS")
             
@@ -1577,11 +2666,7 @@ def calculate_leaderboards_from_fdb(members, cursor):
             print(f"[WARN] Could not query SESSIONS, using history data: {e}")
             # Fallback to history data
             for username, records in all_history.items():
-                if not isinstance(records, dict):
-                    continue
-                for record_id, record in records.items():
-                    if not isinstance(record, dict):
-                        continue
+                for record in records:
                     record_date = record.get("DATE", "")
                     if not record_date:
                         continue
@@ -1601,51 +2686,61 @@ def calculate_leaderboards_from_fdb(members, cursor):
                     except:
                         pass
         
-        # Build monthly leaderboard - sorted array by minutes (highest first)
-        monthly_list = []
-        for username, stats in monthly_stats.items():
-            if stats["sessions"] > 0:
-                monthly_list.append({
-                    "username": username,
-                    "total_minutes": int(stats["minutes"]),
-                    "sessions_count": int(stats["sessions"]),
-                    "total_spent": round(stats["spent"], 2),
-                    "total_hours": round(stats["minutes"] / 60, 1)
-                })
-        
-        # Sort by minutes descending and add rank
-        monthly_list.sort(key=lambda x: x["total_minutes"], reverse=True)
-        for i, entry in enumerate(monthly_list):
-            entry["rank"] = i + 1
+        # Build monthly leaderboard - ranked by minutes (highest first)
+        monthly_index = update_rank_index(f"monthly/{month_key}", {
+            username: int(stats["minutes"]) for username, stats in monthly_stats.items()
+        }, lb_state)
+        def monthly_entry(rank, username):
+            stats = monthly_stats[username]
+            return {
+                "username": display_names.get(username, username),
+                "total_minutes": int(stats["minutes"]),
+                "sessions_count": int(stats["sessions"]),
+                "total_spent": round(stats["spent"], 2),
+                "total_hours": round(stats["minutes"] / 60, 1),
+                "rank": rank
+            }
         
-        if monthly_list:
-            db.reference(f"{FB_PATHS.LEADERBOARDS}/monthly/{month_key}").set(monthly_list)
-            print(f"[OK] Updated monthly leaderboard ({len(monthly_list)} entries)")
+        if len(monthly_index):
+            monthly_inputs = {
+                username: (int(stats["minutes"]), int(stats["sessions"]), round(stats["spent"], 2),
+                           display_names.get(username, username))
+                for username, stats in monthly_stats.items()
+            }
+            changed = publish_ranked_leaderboard(f"monthly/{month_key}", monthly_index, monthly_inputs,
+                                                 monthly_entry, lb_state)
+            print(f"[OK] Updated monthly leaderboard ({len(monthly_index)} entries, {changed} patched)")
         else:
             print(f"[WARN] No activity data for {month_key}")
         
-        # Build weekly leaderboard - sorted array by minutes (highest first)
-        weekly_list = []
-        for username, stats in weekly_stats.items():
-            if stats["sessions"] > 0:
-                weekly_list.append({
-                    "username": username,
-                    "total_minutes": int(stats["minutes"]),
-                    "sessions_count": int(stats["sessions"]),
-                    "total_hours": round(stats["minutes"] / 60, 1)
-                })
+        # Build weekly leaderboard - ranked by minutes (highest first)
+        weekly_index = update_rank_index(f"weekly/{week_key}", {
+            username: int(stats["minutes"]) for username, stats in weekly_stats.items()
+        }, lb_state)
+        def weekly_entry(rank, username):
+            stats = weekly_stats[username]
+            return {
+                "username": display_names.get(username, username),
+                "total_minutes": int(stats["minutes"]),
+                "sessions_count": int(stats["sessions"]),
+                "total_hours": round(stats["minutes"] / 60, 1),
+                "rank": rank
+            }
         
-        # Sort by minutes descending and add rank
-        weekly_list.sort(key=lambda x: x["total_minutes"], reverse=True)
-        for i, entry in enumerate(weekly_list):
-            entry["rank"] = i + 1
+        if len(weekly_index):
+            weekly_inputs = {
+                username: (int(stats["minutes"]), int(stats["sessions"]), display_names.get(username, username))
+                for username, stats in weekly_stats.items()
+            }
+            changed = publish_ranked_leaderboard(f"weekly/{week_key}", weekly_index, weekly_inputs,
+                                                 weekly_entry, lb_state)
+            print(f"[OK] Updated weekly leaderboard ({len(weekly_index)} entries, {changed} patched)")
         
-        if weekly_list:
-            db.reference(f"{FB_PATHS.LEADERBOARDS}/weekly/{week_key}").set(weekly_list)
-            print(f"[OK] Updated weekly leaderboard ({len(weekly_list)} entries)")
+        prune_leaderboard_state(lb_state, {"all-time", f"monthly/{month_key}", f"weekly/{week_key}"})
+        save_leaderboard_state(lb_state)
         
         # Update sync metadata
-        db.reference(f"{FB_PATHS.SYNC_META}/leaderboard").update({
+        fb_update(f"{FB_PATHS.SYNC_META}/leaderboard", {
             "last_sync": datetime.now().isoformat(),
             "status": "ok",
             "method": "firebase_calculation"
@@ -1655,182 +2750,727 @@ def calculate_leaderboards_from_fdb(members, cursor):
         
     except Exception as e:
         print(f"[ERROR] Failed to calculate leaderboards: {e}")
+        # What was published is uncertain: rebuild every board next time
+        LEADERBOARD_INPUTS.clear()
         import traceback
         traceback.print_exc()
         return False
 
 
-# ==================== MAIN ====================
+# ==================== CHANGE PROBE ====================
+# Lets the sync service sync when data changes instead of on fixed timers.
+# Stat-ing the source file is nearly free and is done every few seconds;
+# the database is only copied and probed once the file has changed.
+
+def source_fdb_signature():
+    """(size, mtime) of the live database file - changes whenever PanCafe writes."""
+    stat = os.stat(SOURCE_FDB_PATH)
+    return [stat.st_size, stat.st_mtime_ns]
+
 
-def run_terminals_sync():
+# Snapshot path -> source signature its copy was taken at
+SNAPSHOT_SIGNATURES = {}
+
+
+def refresh_snapshot(working_path):
     """
-    Quick terminal status sync only.
-    Called frequently (every 2 minutes) for real-time PC status.
+    Copy the database to working_path, unless the copy already there was
+    taken since the source last changed. Call with the snapshot's lock held.
+    Returns the time the snapshot is known to match the source.
+    """
+    checked = datetime.now()
+    signature = source_fdb_signature()
+    if SNAPSHOT_SIGNATURES.get(working_path) == signature and os.path.exists(working_path):
+        print("[OK] DB snapshot is current")
+        return checked
+    SNAPSHOT_SIGNATURES.pop(working_path, None)
+    copy_fdb_file(working_path)
+    SNAPSHOT_SIGNATURES[working_path] = signature
+    return checked
+
+
+def fetch_change_probe(cursor):
+    """Max IDs of the incremental tables plus a fingerprint of TERMINALS."""
+    probe = {}
+    for key, table in (("history", "MEMBERSHISTORY"), ("sessions", "SESSIONS"), ("kasahar", "KASAHAR")):
+        cursor.execute(f"SELECT MAX(ID) FROM {table}")
+        probe[key] = int(cursor.fetchone()[0] or 0)
+    cursor.execute("""
+        SELECT NAME, TERMINALSTATUS, MEMBERID, STARTDATE, STARTTIME, TIMERMINUTE, SESSIONPAUSED
+        FROM TERMINALS ORDER BY NAME
+    """)
+    probe["terminals"] = hashlib.md5(repr(cursor.fetchall()).encode()).hexdigest()
+    return probe
+
+
+def run_change_probe():
+    """
+    Refresh the probe snapshot and return fetch_change_probe(). The terminals
+    lane reads the same snapshot, so a sync right after a change does not
+    copy the database again.
     """
-    start_time = datetime.now()
     conn = None
+    with RESOURCE_LOCKS["probe_snapshot"]:
+        try:
+            refresh_snapshot(PROBE_FDB_PATH)
+            conn = connect_to_firebird(PROBE_FDB_PATH)
+            return fetch_change_probe(conn.cursor())
+        finally:
+            if conn:
+                try:
+                    conn.close()
+                except:
+                    pass
+
+
+# ==================== DATASET JOBS ====================
+# Each dataset is a job with its own cadence and dependencies, so the sync
+# service can refresh cheap hot data often and heavy rebuilds rarely.
+# run_sync_jobs() runs any subset over one database snapshot, in
+# dependency order; run_fdb_sync() runs them all.
+#
+# Jobs with a fetch step are pipelined: a fetch thread reads job N+1 from
+# FDB on its own connection while job N computes and uploads, handing
+# results over through a bounded queue (backpressure: at most
+# PIPELINE_DEPTH datasets wait in memory).
+#
+# A run has a time budget: jobs start in priority order (live terminals,
+# new history and sessions, revenue, then leaderboards and profiles), and
+# whatever does not fit is deferred to the next cycle - whole jobs that
+# would overrun, or the unfinished part of a resumable job, which leaves
+# its checkpoint so the next run continues from there.
+
+PIPELINE_DEPTH = 2
+SYNC_TIME_BUDGET = 12 * 60      # Seconds per run (below the 15-min cadence); None = unlimited
+MEMBER_BUDGET_CHUNK = 500       # Profiles built between time budget checks
+MAX_BUDGET_DEFERRALS = 2        # Runs a job may be deferred for its estimate before it runs anyway
+
+class SyncContext:
+    """State shared by the jobs of one run."""
+    
+    def __init__(self, cursor, sync_state, deadline=None, snapshot_time=None, stop=None):
+        self.cursor = cursor
+        self.sync_state = sync_state
+        self.start_time = datetime.now()
+        self.deadline = deadline      # End of the time budget (None = unlimited)
+        self.snapshot_time = snapshot_time   # When the FDB snapshot was copied
+        self.stop = stop              # threading.Event: ends the time budget early
+        self.summary = {}             # Label -> count, for the run summary line
+        self.deferred = {}            # Job name -> why (part of) it waits for the next run
+        self.postponed = set()        # Jobs deferred without running
+        self._all_members = None
+        self._members_lock = threading.Lock()
+    
+    def all_members(self, cursor=None):
+        """All MEMBERS rows, fetched once per run (leaderboards + members)."""
+        with self._members_lock:
+            if self._all_members is None:
+                self._all_members = fetch_all_members(cursor or self.cursor)
+            return self._all_members
+    
+    def time_left(self):
+        """Seconds left in the time budget, or None without one."""
+        if self.stop is not None and self.stop.is_set():
+            return 0
+        if self.deadline is None:
+            return None
+        return (self.deadline - datetime.now()).total_seconds()
+
+
+class DatasetJob:
+    """
+    One dataset sync step.
+    
+    cadence:    minutes between scheduled runs (the sync service also runs
+                it early when one of its probe_keys changes)
+    depends_on: jobs that run first when selected together; if one of
+                them fails, this job is skipped for that run
+    lane:       "fdb" (main snapshot), "terminals" (probe snapshot) or
+                "messages" (no database) - runs in one lane are serialized
+    fetch:      optional fetch(ctx, cursor) doing only FDB reads; it may run
+                ahead on the fetch stage's connection, and its result is
+                passed on as run(ctx, fetched). Without it: run(ctx).
+    priority:   lower runs first among jobs whose dependencies are met, so
+                under the time budget it is low-priority work that waits
+    resumable:  the job watches ctx.deadline itself and checkpoints what it
+                finished, so it is started even when its last duration
+                does not fit the time left
+    """
     
-    try:
-        init_firebase()
-        copy_fdb_file()
-        conn = connect_to_firebird()
-        cursor = conn.cursor()
-        
-        terminals = fetch_terminals_from_fdb(cursor)
-        process_and_upload_terminal_status(terminals)
-        
-        db.reference(f"{FB_PATHS.SYNC_META}/terminals").update({
-            "last_sync": datetime.now().isoformat(),
-            "status": "ok",
-            "terminal_count": len(terminals)
-        })
-        
-        elapsed = (datetime.now() - start_time).total_seconds()
-        print(f"[TERMINALS] {len(terminals)} PCs synced in {elapsed:.1f}s")
-        return True
-        
-    except Exception as e:
-        print(f"[ERROR] Terminals sync failed: {e}")
+    def __init__(self, name, run, cadence, depends_on=(), lane="fdb", probe_keys=(), fetch=None,
+                 priority=5, resumable=False):
+        self.name = name
+        self.run = run
+        self.fetch = fetch
+        self.priority = priority
+        self.resumable = resumable
+        self.cadence = cadence
+        self.depends_on = tuple(depends_on)
+        self.lane = lane
+        self.probe_keys = tuple(probe_keys)
+
+
+# Database snapshot (and its lock) used by each lane
+LANE_SNAPSHOTS = {
+    "fdb": (WORKING_FDB_PATH, "fdb_snapshot"),
+    "terminals": (PROBE_FDB_PATH, "probe_snapshot"),
+}
+
+
+def fetch_history_job(ctx, cursor):
+    """New MEMBERSHISTORY rows; only the target ID when the gap needs a chunked catch-up."""
+    last_id = ctx.sync_state.get("last_history_id", 0)
+    history_max_id = fetch_max_history_id(cursor)
+    if history_max_id - last_id > HISTORY_CATCHUP_THRESHOLD:
+        return {"catchup_to": history_max_id}
+    return {"records": fetch_new_history_records(cursor, last_id)}
+
+
+def sync_history_job(ctx, fetched):
+    """MEMBERSHISTORY: new rows (chunked catch-up for large gaps) + history-by-date."""
+    sync_state = ctx.sync_state
+    history_days = load_history_days_state()
+    if "catchup_to" in fetched:
+        new_max_id, history_count = run_history_catchup(ctx.cursor, sync_state, history_days,
+                                                        fetched["catchup_to"], ctx.time_left)
+        if new_max_id < fetched["catchup_to"]:
+            ctx.deferred["history"] = f"catch-up paused at ID {new_max_id:,} of {fetched['catchup_to']:,}"
+    else:
+        new_records = fetched["records"]
+        new_max_id = process_and_upload_history(new_records, sync_state, history_days)
+        history_count = len(new_records)
+    print(f"      {history_count} new records")
+    
+    # Floor Monitor reads /history-by-date — backfill recent days from FDB
+    print("      Checking history-by-date (last 2 days)...")
+    backfill_history_by_date(ctx.cursor, days=2, state=history_days)
+    
+    checkpoint_sync_state(sync_state, last_history_id=new_max_id)
+    fb_update(FB_PATHS.SYNC_META, {
+        "last_sync": datetime.now().isoformat(),
+        "last_history_id": new_max_id,
+        "records_synced": history_count
+    })
+    ctx.summary["History"] = history_count
+
+
+def fetch_sessions_job(ctx, cursor):
+    return fetch_session_changes(cursor, ctx.sync_state)
+
+
+def sync_sessions_job(ctx, fetched):
+    """SESSIONS: new rows + tracked open sessions that closed."""
+    sessions, last_session_id, open_session_ids = fetched
+    if sessions:
+        process_and_upload_sessions(sessions)
+    checkpoint_sync_state(ctx.sync_state, last_session_id=last_session_id, open_session_ids=open_session_ids)
+    ctx.summary["Sessions"] = len(sessions)
+
+
+def sync_guest_sessions_job(ctx):
+    """Guest sessions from the tail of messages.msg (no database access)."""
+    with RESOURCE_LOCKS["messages_state"]:
+        messages_state = load_messages_state()
+        guest_sessions = parse_messages_file(messages_state)
+        if guest_sessions:
+            upload_guest_sessions(guest_sessions, messages_state["date_totals"])
+        if guest_sessions is not None:
+            save_messages_state(messages_state)
+    ctx.summary["Guest sessions"] = len(guest_sessions or [])
+
+
+def fetch_leaderboards_job(ctx, cursor):
+    return ctx.all_members(cursor)
+
+
+def sync_leaderboards_job(ctx, all_members):
+    """All-time, monthly and weekly leaderboards (local FDB calculation)."""
+    # NOTE: Leaderboards are calculated entirely from FDB data - no Firebase downloads!
+    if not calculate_leaderboards_from_fdb(all_members, ctx.cursor):
         return False
-        
-    finally:
-        if conn:
+    # Profiles embed ranks: members whose rank moved are republished by the
+    # members job, which may run later - keep them in the sync state
+    shifted = set().union(*RANK_SHIFTS.values())
+    if shifted:
+        ctx.sync_state["rank_shifted"] = sorted(shifted | set(ctx.sync_state.get("rank_shifted") or []))
+        save_local_sync_state(ctx.sync_state)
+    print("      All-time, monthly, weekly updated")
+
+
+def sync_terminals_job(ctx):
+    """Real-time terminal status from TERMINALS."""
+    terminals = sync_terminal_status(ctx.cursor, ctx.snapshot_time)
+    if terminals is None:
+        print("      Skipped - newer status already published")
+        return
+    fb_update(f"{FB_PATHS.SYNC_META}/terminals", {
+        "last_sync": datetime.now().isoformat(),
+        "status": "ok",
+        "terminal_count": len(terminals)
+    })
+    print(f"      {len(terminals)} PCs")
+    ctx.summary["Terminals"] = len(terminals)
+
+
+def fetch_kasahar_job(ctx, cursor):
+    return fetch_kasahar_changes(cursor, ctx.sync_state)
+
+
+def sync_kasahar_job(ctx, fetched):
+    """KASAHAR: republish days in the window whose checksum changed."""
+    kasahar_records, kasahar_days, last_kasahar_id, kasahar_checksums = fetched
+    if kasahar_days:
+        process_and_upload_kasahar(kasahar_records, kasahar_days)
+    checkpoint_sync_state(ctx.sync_state, last_kasahar_id=last_kasahar_id,
+                          kasahar_day_checksums=kasahar_checksums)
+    print(f"      {len(kasahar_days)} day(s) republished, {len(kasahar_records)} transactions")
+
+
+def fetch_members_job(ctx, cursor):
+    """All members and the ones whose row hash changed (only this job moves the hashes)."""
+    all_members = ctx.all_members(cursor)
+    changed_members, member_hashes = detect_changed_members(all_members, ctx.sync_state.get("member_hashes") or {})
+    return all_members, changed_members, member_hashes
+
+
+def upload_member_profiles(ctx, members):
+    """
+    build_and_upload_optimized_members in MEMBER_BUDGET_CHUNK slices while
+    the time budget lasts. Returns (usernames written, members left over,
+    whether the time budget cut the upload short). Left over are members
+    whose profile was not written - cut off, skipped or failed.
+    """
+    written = set()
+    step = len(members) if ctx.time_left() is None else MEMBER_BUDGET_CHUNK
+    cut_short = False
+    for start in range(0, len(members), step or 1):
+        if ctx.time_left() is not None and ctx.time_left() <= 0:
+            cut_short = True
+            break
+        written |= build_and_upload_optimized_members(members[start:start + step], ctx.cursor,
+                                                      all_members=ctx.all_members(ctx.cursor))
+    # Members without a username have no profile to publish
+    leftover = [m for m in members if m.get("USERNAME") and m["USERNAME"].upper() not in written]
+    return written, leftover, cut_short
+
+
+def sync_members_job(ctx, fetched):
+    """Member profiles: changed rows (row hashes) + members whose rank moved."""
+    sync_state = ctx.sync_state
+    all_members, changed_members, member_hashes = fetched
+    shifted = set(sync_state.get("rank_shifted") or [])
+    if sync_state.get("member_hashes"):
+        # Incremental: only members whose MEMBER_FIELDS values changed
+        print(f"      Found {len(changed_members)} changed members (row hashes)")
+        
+        # Profiles embed ranks: republish members whose rank moved
+        rank_only = shifted - {(m.get("USERNAME") or "").upper() for m in changed_members}
+        rank_changed = [m for m in all_members if (m.get("USERNAME") or "").upper() in rank_only]
+        if rank_changed:
+            print(f"      {len(rank_changed)} more members whose rank changed")
+            changed_members += rank_changed
+        if not changed_members:
+            print("      No changes detected, skipping upload")
+    else:
+        # First run: sync all members
+        print("      First run - syncing all members...")
+        changed_members = all_members
+    
+    written, leftover, cut_short = upload_member_profiles(ctx, changed_members) if changed_members \
+        else (set(), [], False)
+    v2_count = len(written)
+    if changed_members:
+        print(f"      {v2_count} profiles uploaded")
+    # New hashes are a watermark like the history/session IDs: they only
+    # replace the saved ones once every profile write before them is acked
+    watermarks = {"last_member_sync_time": ctx.start_time.isoformat()}
+    if all_members:
+        if leftover:
+            # Not written this run: keep their old hashes (and pending rank
+            # moves) so the next run picks them up again
+            old_hashes = sync_state.get("member_hashes") or {}
+            for member in leftover:
+                member_id = str(member.get("ID"))
+                if member_id in old_hashes:
+                    member_hashes[member_id] = old_hashes[member_id]
+                else:
+                    member_hashes.pop(member_id, None)
+            ctx.deferred["members"] = (f"{len(leftover)} of {len(changed_members)} profiles "
+                                       + ("left (time budget)" if cut_short else "not written"))
+        watermarks["member_hashes"] = member_hashes
+        sync_state["rank_shifted"] = sorted(shifted & {(m.get("USERNAME") or "").upper() for m in leftover})
+    checkpoint_sync_state(sync_state, **watermarks)
+    ctx.summary["Members"] = v2_count
+
+
+SYNC_JOBS = {job.name: job for job in (
+    DatasetJob("history", sync_history_job, cadence=15, probe_keys=("history",), fetch=fetch_history_job,
+               priority=1, resumable=True),
+    DatasetJob("sessions", sync_sessions_job, cadence=15, probe_keys=("sessions",), fetch=fetch_sessions_job,
+               priority=1),
+    DatasetJob("guest_sessions", sync_guest_sessions_job, cadence=5, lane="messages", priority=1),
+    DatasetJob("leaderboards", sync_leaderboards_job, cadence=60, depends_on=("history", "sessions"),
+               probe_keys=("history",), fetch=fetch_leaderboards_job, priority=3),
+    DatasetJob("terminals", sync_terminals_job, cadence=10, lane="terminals", probe_keys=("terminals",),
+               priority=0),
+    DatasetJob("kasahar", sync_kasahar_job, cadence=15, probe_keys=("kasahar",), fetch=fetch_kasahar_job,
+               priority=2),
+    DatasetJob("members", sync_members_job, cadence=60, depends_on=("leaderboards",),
+               probe_keys=("history",), fetch=fetch_members_job, priority=3, resumable=True),
+)}
+
+
+def order_sync_jobs(names):
+    """Selected job names in dependency order (priority, then registry order among equals)."""
+    selected = set(names)
+    unknown = selected - set(SYNC_JOBS)
+    if unknown:
+        raise ValueError(f"Unknown sync job(s): {', '.join(sorted(unknown))}")
+    ordered = []
+    
+    def visit(name, trail):
+        if name in ordered or name not in selected:
+            return
+        if name in trail:
+            raise ValueError(f"Sync job dependency cycle: {' -> '.join(trail + (name,))}")
+        for dep in SYNC_JOBS[name].depends_on:
+            visit(dep, trail + (name,))
+        ordered.append(name)
+    
+    for name in sorted(SYNC_JOBS, key=lambda name: SYNC_JOBS[name].priority):
+        visit(name, ())
+    return ordered
+
+
+def budget_deferral(ctx, job, count=True):
+    """
+    Why job should wait for the next run under the time budget, or None.
+    count=False only asks, without counting a deferral (see fetch_job).
+    """
+    left = ctx.time_left()
+    if left is None:
+        return None
+    if left <= 0:
+        return "run cut short" if ctx.stop is not None and ctx.stop.is_set() else "time budget used up"
+    estimate = (ctx.sync_state.get("job_seconds") or {}).get(job.name)
+    if not estimate or estimate <= left or job.resumable:
+        return None
+    # A job that never fits (e.g. it once took longer than the whole budget)
+    # would be deferred forever: after MAX_BUDGET_DEFERRALS it runs anyway
+    if (ctx.sync_state.get("job_deferrals") or {}).get(job.name, 0) >= MAX_BUDGET_DEFERRALS:
+        return None
+    if count:
+        deferrals = ctx.sync_state.setdefault("job_deferrals", {})
+        deferrals[job.name] = deferrals.get(job.name, 0) + 1
+    return f"needs ~{estimate:.0f}s, {left:.0f}s left in time budget"
+
+
+def fetch_job(ctx, name, cursor, check_budget=True):
+    """
+    Run one job's fetch step. Returns {name, started, data, error, seconds,
+    skipped}. A job already known to be deferred (its time budget check
+    fails, or a dependency was postponed) is not fetched: time left only
+    shrinks, so it will be deferred when its turn comes too.
+    """
+    job = SYNC_JOBS[name]
+    item = {"name": name, "started": datetime.now(), "data": None, "error": None, "skipped": False}
+    if job.fetch and check_budget and (any(dep in ctx.postponed for dep in job.depends_on)
+                                       or budget_deferral(ctx, job, count=False)):
+        item["skipped"] = True
+    elif job.fetch:
+        try:
+            item["data"] = job.fetch(ctx, cursor)
+        except Exception as e:
+            item["error"] = e
+    item["seconds"] = (datetime.now() - item["started"]).total_seconds()
+    return item
+
+
+def fetch_stage(ctx, names, cursor, out, stop):
+    """Fetch thread: fetch each job in order and queue it, blocking while the queue is full."""
+    for name in names:
+        item = fetch_job(ctx, name, cursor)
+        while True:
+            if stop.is_set():
+                return
             try:
-                conn.close()
-            except:
+                out.put(item, timeout=0.5)
+                break
+            except queue.Full:
                 pass
 
 
-def run_fdb_sync():
+def pipelined_fetches(ctx, names, cursor=None):
     """
-    Full FDB database sync.
-    Includes: Members, History, Sessions, Leaderboards, Cash Register.
-    Called periodically (every 15 minutes).
+    Yield fetch results in job order. With a cursor (a second connection)
+    the fetches run ahead on a thread, at most PIPELINE_DEPTH jobs ahead
+    of the consumer; otherwise each job is fetched inline when it is due.
     """
+    if cursor is None:
+        for name in names:
+            yield fetch_job(ctx, name, ctx.cursor)
+        return
+    
+    out = queue.Queue(maxsize=PIPELINE_DEPTH)
+    stop = threading.Event()
+    thread = threading.Thread(target=fetch_stage, args=(ctx, names, cursor, out, stop),
+                              name="fdb-fetch", daemon=True)
+    thread.start()
+    try:
+        for _ in names:
+            while True:
+                try:
+                    item = out.get(timeout=1)
+                    break
+                except queue.Empty:
+                    if not thread.is_alive():
+                        raise RuntimeError("FDB fetch stage stopped unexpectedly")
+            yield item
+    finally:
+        # Closing the generator early (error) stops the fetch thread before
+        # its connection is closed
+        stop.set()
+        thread.join()
+
+
+def run_sync_jobs(names=None, backend=None, budget=SYNC_TIME_BUDGET, stop=None):
+    """
+    Run dataset jobs (default: all) in dependency order over one database
+    snapshot. FDB reads for later jobs overlap uploads of earlier ones (see
+    pipelined_fetches). Jobs fail independently; a job whose dependency
+    failed in this run is skipped.
+    
+    Error policy per stage:
+    - fetch:  a failed prefetch is retried once on the upload stage's
+              connection; if that fails too, the job fails
+    - upload: the job fails, later jobs still run (dependents are skipped)
+    
+    budget: seconds for the whole run (None = unlimited). A job is deferred
+    when its last duration does not fit what is left; resumable jobs stop
+    at the deadline instead. Jobs waiting on a deferred job are deferred too.
+    
+    stop: optional threading.Event; setting it uses up the time budget at
+    once, so the run ends after the job in progress (resumable jobs sooner).
+    
+    backend: database backend to write to (default: see use_backend, normally
+             real Firebase).
+    
+    Returns {name: {"success": bool, "started": iso, "seconds": float}}
+    (plus "failed_stage" for failed jobs and "deferred": reason for jobs
+    with work left for the next run).
+    """
+    names = order_sync_jobs(names or list(SYNC_JOBS))
+    lanes = {SYNC_JOBS[name].lane for name in names}
+    lane = "fdb" if "fdb" in lanes else "terminals" if "terminals" in lanes else None
     start_time = datetime.now()
+    write_stats = WRITE_QUEUE.stats()
+    results = {}
     conn = None
+    fetch_conn = None
+    fetches = None
+    verbose = lane == "fdb"
     
-    print("\n" + "="*60)
-    print("OceanZ FDB Sync")
-    print(f"   Started: {start_time.strftime('%Y-%m-%d %H:%M:%S')}")
-    print("="*60)
-        
+    if verbose:
+        print("\n" + "="*60)
+        print("OceanZ FDB Sync")
+        print(f"   Started: {start_time.strftime('%Y-%m-%d %H:%M:%S')}")
+        print(f"   Jobs: {', '.join(names)}")
+        print("="*60)
+    
+    snapshot_lock = RESOURCE_LOCKS[LANE_SNAPSHOTS[lane][1]] if lane else None
+    locked = False
+    backend_token = None
     try:
-        init_firebase()
-        
-        # Open single FDB connection
-        print("\n[INIT] Opening database connection...")
-        copy_fdb_file()
-        conn = connect_to_firebird()
-        cursor = conn.cursor()
-        
-        sync_state = load_local_sync_state()
-        last_member_sync = sync_state.get("last_member_sync_time")
-        
-        # ========== 1. HISTORY ==========
-        print("\n[1/5] History (incremental)...")
-        new_records = fetch_new_history_records(cursor, sync_state.get("last_history_id", 0))
-        new_max_id = process_and_upload_history(new_records, sync_state)
-        sync_state["last_history_id"] = new_max_id
-        print(f"      {len(new_records)} new records")
-        
-        # Sessions
-        print("      Processing sessions...")
-        sessions = fetch_recent_sessions(cursor, hours=2)
-        process_and_upload_sessions(sessions)
-
-        # Floor Monitor reads /history-by-date — backfill recent days from FDB
-        print("      Backfilling history-by-date (last 2 days)...")
-        backfill_history_by_date(cursor, days=2)
-        
-        # Guest sessions
-        guest_sessions = parse_messages_file()
-        if guest_sessions:
-            upload_guest_sessions(guest_sessions)
-        
-        # ========== 2. LEADERBOARDS ==========
-        print("\n[2/5] Leaderboards (local FDB calculation)...")
-        # NOTE: Leaderboards are calculated entirely from FDB data - no Firebase downloads!
-        # Fetch all members for leaderboard calculation (we need all for rankings)
-        all_members = fetch_all_members(cursor)
-        calculate_leaderboards_from_fdb(all_members, cursor)
-        print("      All-time, monthly, weekly updated")
-        
-        # ========== 3. TERMINALS ==========
-        print("\n[3/5] Terminals...")
-        terminals = fetch_terminals_from_fdb(cursor)
-        process_and_upload_terminal_status(terminals)
-        print(f"      {len(terminals)} PCs")
-        
-        # ========== 4. CASH REGISTER ==========
-        print("\n[4/5] Cash Register (7 days)...")
-        kasahar_records = fetch_kasahar_records(cursor, days=7)
-        process_and_upload_kasahar(kasahar_records)
-        print(f"      {len(kasahar_records)} transactions")
-        
-        # ========== 5. MEMBERS (incremental) ==========
-        print("\n[5/5] Members (incremental sync)...")
-        if last_member_sync:
-            # Incremental: only sync members that changed since last sync
-            last_sync_dt = datetime.fromisoformat(last_member_sync)
-            changed_members = fetch_changed_members(cursor, last_sync_dt)
-            print(f"      Found {len(changed_members)} changed members since {last_member_sync}")
-            
-            if changed_members:
-                v2_count = build_and_upload_optimized_members(changed_members, cursor)
-                print(f"      {v2_count} profiles uploaded")
+        if snapshot_lock:
+            snapshot_lock.acquire()
+            locked = True
+        # Inside the try: a failing backend (e.g. bad credentials) must not
+        # leave the lane's snapshot locked
+        backend_token = RUN_BACKEND.set(use_backend() if backend is None else queued_backend(backend))
+        replay_write_journal()
+        
+        cursor = None
+        snapshot_time = None
+        if lane:
+            # Open single FDB connection
+            if verbose:
+                print("\n[INIT] Opening database connection...")
+            working_path = LANE_SNAPSHOTS[lane][0]
+            snapshot_time = refresh_snapshot(working_path)
+            conn = connect_to_firebird(working_path)
+            cursor = conn.cursor()
+            if lane == "fdb" and len(names) > 1 and any(SYNC_JOBS[name].fetch for name in names):
+                # Second connection to the same snapshot for the fetch stage
+                try:
+                    fetch_conn = connect_to_firebird(working_path)
+                except Exception:
+                    print("[WARN] No fetch connection - fetching inline")
+        
+        deadline = start_time + timedelta(seconds=budget) if budget else None
+        ctx = SyncContext(cursor, load_local_sync_state(), deadline, snapshot_time, stop)
+        job_seconds = ctx.sync_state.setdefault("job_seconds", {})
+        fetches = pipelined_fetches(ctx, names, fetch_conn.cursor() if fetch_conn else None)
+        fetch_seconds = upload_seconds = 0
+        for step, item in enumerate(fetches, 1):
+            name = item["name"]
+            job = SYNC_JOBS[name]
+            failed_stage = None
+            run_seconds = 0
+            failed_deps = [dep for dep in job.depends_on if dep in results and not results[dep]["success"]]
+            waiting_on = [dep for dep in job.depends_on if dep in ctx.postponed]
+            deferral = f"waiting for {', '.join(waiting_on)}" if waiting_on else budget_deferral(ctx, job)
+            if failed_deps:
+                print(f"\n[SKIP] {name}: {', '.join(failed_deps)} failed")
+                failed_stage = "dependency"
+            elif deferral:
+                ctx.deferred[name] = deferral
+                ctx.postponed.add(name)
+                print(f"\n[DEFER] {name}: {ctx.deferred[name]}")
             else:
-                v2_count = 0
-                print("      No changes detected, skipping upload")
-        else:
-            # First run: sync all members
-            print("      First run - syncing all members...")
-            v2_count = build_and_upload_optimized_members(all_members, cursor)
-            print(f"      {v2_count} profiles uploaded")
-        
-        # Save state
-        sync_state["last_sync_time"] = start_time.isoformat()
-        sync_state["last_member_sync_time"] = start_time.isoformat()
-        save_local_sync_state(sync_state)
-        
-        db.reference("sync-meta").update({
-            "last_sync": datetime.now().isoformat(),
-            "last_history_id": new_max_id,
-            "records_synced": len(new_records)
-        })
+                if verbose:
+                    print(f"\n[{step}/{len(names)}] {name}...")
+                if item["error"] is not None and fetch_conn:
+                    print(f"[WARN] {name} prefetch failed ({item['error']}) - retrying inline")
+                    item = fetch_job(ctx, name, cursor, check_budget=False)
+                elif item["skipped"]:
+                    # Skipped as deferred, but the job runs after all
+                    item = fetch_job(ctx, name, cursor, check_budget=False)
+                fetch_seconds += item["seconds"]
+                if item["error"] is not None:
+                    print(f"[ERROR] {name} fetch failed: {item['error']}")
+                    failed_stage = "fetch"
+                else:
+                    started = datetime.now()
+                    try:
+                        if (job.run(ctx, item["data"]) if job.fetch else job.run(ctx)) is False:
+                            failed_stage = "upload"
+                    except Exception as e:
+                        print(f"[ERROR] {name} job failed: {e}")
+                        import traceback
+                        traceback.print_exc()
+                        failed_stage = "upload"
+                    run_seconds = (datetime.now() - started).total_seconds()
+                    upload_seconds += run_seconds
+            results[name] = {
+                "success": failed_stage is None,
+                "started": item["started"].isoformat(),
+                "seconds": round(item["seconds"] + run_seconds, 2),   # Work time, not queue wait
+            }
+            if failed_stage:
+                results[name]["failed_stage"] = failed_stage
+            elif name in ctx.deferred:
+                results[name]["deferred"] = ctx.deferred[name]
+            elif name not in ctx.postponed:
+                # Duration of a complete run, for budget estimates
+                job_seconds[name] = results[name]["seconds"]
+                ctx.sync_state.get("job_deferrals", {}).pop(name, None)
+            flush_progress()
+        
+        if "fdb" in lanes:
+            ctx.sync_state["last_sync_time"] = start_time.isoformat()
+            save_local_sync_state(ctx.sync_state)
         
-        # Summary
         elapsed = (datetime.now() - start_time).total_seconds()
-        print("\n" + "="*60)
-        print(f"[DONE] FDB sync completed in {elapsed:.1f}s")
-        print(f"   History: {len(new_records)} | Members: {v2_count} | Terminals: {len(terminals)}")
-        print("="*60 + "\n")
-        
-        db.reference(f"{FB_PATHS.SYNC_CONTROL}/last_sync").set({
-            "timestamp": datetime.now().isoformat(),
-            "duration_seconds": round(elapsed, 2),
-            "success": True
-        })
-        
-        return True
+        failed = [name for name, result in results.items() if not result["success"]]
+        summary = " | ".join(f"{label}: {count}" for label, count in ctx.summary.items())
+        deferred = "; ".join(f"{name} ({reason})" for name, reason in ctx.deferred.items())
+        if verbose:
+            print("\n" + "="*60)
+            print(f"[{'WARN' if failed else 'DONE'}] FDB sync completed in {elapsed:.1f}s"
+                  + (f" ({', '.join(failed)} failed)" if failed else ""))
+            print(f"   {summary}")
+            print(f"   Stages: fetch {fetch_seconds:.1f}s, compute+upload {upload_seconds:.1f}s"
+                  + (" (overlapped)" if fetch_conn else ""))
+            if deferred:
+                print(f"   Deferred to next run: {deferred}")
+            print(f"   Write queue: {WRITE_QUEUE.summary(write_stats)}")
+            print("="*60 + "\n")
+        else:
+            print(f"[{', '.join(names).upper()}] {summary or 'done'} in {elapsed:.1f}s"
+                  + (f" ({', '.join(failed)} failed)" if failed else "")
+                  + (f" - deferred: {deferred}" if deferred else ""))
+        return results
         
     except Exception as e:
-        print(f"\n[ERROR] FDB sync failed: {e}")
+        print(f"\n[ERROR] Sync failed: {e}")
         import traceback
         traceback.print_exc()
-        return False
+        now = datetime.now().isoformat()
+        for name in names:
+            results.setdefault(name, {"success": False, "started": now, "seconds": 0})
+        return results
         
     finally:
+        if fetches is not None:
+            fetches.close()
+        if fetch_conn:
+            try:
+                fetch_conn.close()
+            except:
+                pass
+        WRITE_JOURNAL.flush()
+        flush_progress(wait=True)
         if conn:
             try:
                 conn.close()
             except:
                 pass
+        if locked:
+            snapshot_lock.release()
+        if backend_token is not None:
+            RUN_BACKEND.reset(backend_token)
+
+
+# ==================== MAIN ====================
+
+def run_terminals_sync(backend=None):
+    """
+    Quick terminal status sync only.
+    Called frequently for real-time PC status.
+    backend: database backend to write to (default: see use_backend, normally
+             real Firebase).
+    """
+    return run_sync_jobs(["terminals"], backend=backend)["terminals"]["success"]
+
+
+def run_fdb_sync(backend=None):
+    """
+    Full FDB database sync: every dataset job.
+    Includes: Members, History, Sessions, Leaderboards, Cash Register.
+    backend: database backend to write to (default: see use_backend, normally
+             real Firebase).
+    """
+    start_time = datetime.now()
+    with using_backend(backend):
+        results = run_sync_jobs(backend=backend)
+        success = all(result["success"] for result in results.values())
+        last_sync = {
+            "timestamp": datetime.now().isoformat(),
+            "duration_seconds": round((datetime.now() - start_time).total_seconds(), 2),
+            "success": success
+        }
+        deferred = {name: result["deferred"] for name, result in results.items() if result.get("deferred")}
+        if deferred:
+            last_sync["deferred"] = deferred
+        fb_set(f"{FB_PATHS.SYNC_CONTROL}/last_sync", last_sync)
+    return success
 
 
 def main():
-    """Main entry point - runs full FDB sync."""
-    success = run_fdb_sync()
+    """
+    Main entry point - runs full FDB sync, or only the named jobs:
+        python oceanz_sync.py                    # All jobs
+        python oceanz_sync.py terminals kasahar  # Just these
+    """
+    if len(sys.argv) > 1:
+        if sys.argv[1] in ("-h", "--help"):
+            print(main.__doc__)
+            print(f"    Jobs: {', '.join(SYNC_JOBS)}")
+            return
+        results = run_sync_jobs(sys.argv[1:])
+        success = all(result["success"] for result in results.values())
+    else:
+        success = run_fdb_sync()
     if not success:
         sys.exit(1)
 
@@ -0,0 +1,182 @@
+"""
+OceanZ Gaming Cafe - Debounced Progress Log Writer
+
+Progress messages for the web UI live at /sync-control/progress as
+{push_key: {time, message, level}}. Instead of re-setting the whole list
+on every line, ProgressLog:
+- Buffers messages; append() never touches the network
+- Flushes from a background thread after a short debounce, or right away
+  at stage boundaries (flush())
+- Appends new entries under push-style keys (chronological when sorted)
+  and deletes entries beyond max_entries in the same multi-path update
+- Entries left by earlier processes are read once before the first flush,
+  so they are trimmed too
+- Backs off exponentially while sends fail (e.g. internet down)
+"""
+
+import os
+import time
+import threading
+from collections import deque
+from datetime import datetime
+
+PUSH_CHARS = "-0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ_abcdefghijklmnopqrstuvwxyz"
+MAX_RETRY_DELAY = 60    # Seconds between send attempts during an outage
+
+
+class PushKeyGenerator:
+    """Firebase-style push keys: 8 timestamp chars + 12 random chars, strictly increasing."""
+
+    def __init__(self):
+        self._last_ms = 0
+        self._last_random = [0] * 12
+        self._lock = threading.Lock()
+
+    def __call__(self):
+        with self._lock:
+            now = int(time.time() * 1000)
+            if now <= self._last_ms:
+                # Same (or earlier) millisecond: increment the random part
+                now = self._last_ms
+                for i in range(11, -1, -1):
+                    if self._last_random[i] < 63:
+                        self._last_random[i] += 1
+                        break
+                    self._last_random[i] = 0
+            else:
+                self._last_random = [b % 64 for b in os.urandom(12)]
+            self._last_ms = now
+
+            stamp = []
+            for _ in range(8):
+                stamp.append(PUSH_CHARS[now % 64])
+                now //= 64
+            return "".join(reversed(stamp)) + "".join(PUSH_CHARS[i] for i in self._last_random)
+
+
+push_key = PushKeyGenerator()
+
+
+class ProgressLog:
+    """
+    Buffered, append-only progress log.
+
+    send(updates) performs a root multi-path update (e.g.
+    backend.update("/", updates)); it is only called from the flush thread
+    or from flush(wait=True). load() returns the node as it is in the
+    database (e.g. backend.get(path)); without it, the first flush
+    replaces the node.
+    """
+
+    def __init__(self, send, path="sync-control/progress", max_entries=50, debounce=0.5, load=None):
+        self.send = send
+        self.load = load
+        self.path = path.strip("/")
+        self.max_entries = max_entries
+        self.debounce = debounce
+        self._pending = []              # [(key, entry)] not yet sent
+        self._live = deque()            # Keys believed to be in the database, oldest first
+        self._loaded = False            # _live seeded from the database
+        self._reset = load is None      # Replace the whole node on the next flush
+        self._failures = 0              # Consecutive failed sends
+        self._flush_now = False
+        self._cond = threading.Condition()
+        self._send_lock = threading.Lock()
+        self._closed = False
+        self._thread = threading.Thread(target=self._loop, name="progress-log", daemon=True)
+        self._thread.start()
+
+    def append(self, message, level="INFO"):
+        """Queue a message; returns immediately."""
+        entry = {
+            "time": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            "message": message,
+            "level": level,
+        }
+        with self._cond:
+            self._pending.append((push_key(), entry))
+            del self._pending[:-self.max_entries]
+            self._cond.notify()
+
+    def clear(self):
+        """Start a fresh log (e.g. for a manual sync): old entries go on the next flush."""
+        with self._cond:
+            self._pending = []
+            self._reset = True
+            self._loaded = True
+            self._cond.notify()
+
+    def flush(self, wait=False):
+        """Publish buffered messages now (stage boundary). wait=True sends on this thread."""
+        if wait:
+            self._send_pending()
+            return
+        with self._cond:
+            self._flush_now = True
+            self._cond.notify()
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+        self._thread.join()
+        self._send_pending()
+
+    def _loop(self):
+        while True:
+            with self._cond:
+                while not (self._pending or self._reset) and not self._closed:
+                    self._cond.wait()
+                if self._closed:
+                    return
+                # Debounce: give more lines a chance to join this update;
+                # after failed sends, wait longer (stage flushes included)
+                delay = min(MAX_RETRY_DELAY, self.debounce * 2 ** self._failures)
+                deadline = time.time() + delay
+                while not (self._flush_now and not self._failures) and not self._closed \
+                        and time.time() < deadline:
+                    self._cond.wait(deadline - time.time())
+                self._flush_now = False
+            self._send_pending()
+
+    def _build_update(self, pending, reset, live):
+        """(updates, live keys after the update) for one flush."""
+        if reset:
+            kept = pending[-self.max_entries:]
+            return {self.path: {key: entry for key, entry in kept}}, deque(key for key, _ in kept)
+
+        live = deque(live)
+        updates = {}
+        for key, entry in pending:
+            updates[f"{self.path}/{key}"] = entry
+            live.append(key)
+        while len(live) > self.max_entries:
+            old = live.popleft()
+            updates[f"{self.path}/{old}"] = None
+        return updates, live
+
+    def _send_pending(self):
+        with self._send_lock:
+            with self._cond:
+                pending, reset = self._pending, self._reset
+                self._pending, self._reset = [], False
+            if not pending and not reset:
+                return
+            try:
+                if not reset and not self._loaded:
+                    # Entries from earlier runs count towards max_entries
+                    self._live = deque(sorted(self.load() or {}))
+                    self._loaded = True
+                updates, live = self._build_update(pending, reset, self._live)
+                self.send(updates)
+                self._live = live
+                self._loaded = True
+                self._failures = 0
+            except Exception as e:
+                if not self._failures:
+                    print(f"Failed to update Firebase progress (retrying with backoff): {e}")
+                self._failures += 1
+                # Keep the messages for the next flush
+                with self._cond:
+                    self._pending = (pending + self._pending)[-self.max_entries:]
+                    self._reset = self._reset or reset
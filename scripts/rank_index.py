@@ -0,0 +1,214 @@
+"""
+OceanZ Gaming Cafe - Order-Statistics Ranking Index
+
+Keeps members ordered by score (minutes, highest first) across syncs so a
+changed score is a point update instead of a full re-sort:
+- Entries live in sorted buckets; a Fenwick tree over the bucket sizes
+  turns "which bucket holds rank r" and "how many entries precede this
+  bucket" into O(log n) lookups
+- rank(member), top(k) and slice(start, end) without sorting
+- Every update records the rank range it disturbed, so shifted() can
+  report exactly which members' ranks moved since the last call
+
+Ties are ordered by member key, so ranks are deterministic.
+"""
+
+from bisect import bisect_left, insort
+
+
+class RankIndex:
+    """Members ranked by score, highest first (rank 1 = top)."""
+
+    def __init__(self, scores=None, bucket_size=256, reported=False):
+        """
+        scores: {member: score}. With reported=True the initial ranks count
+        as already published (e.g. when restoring from saved state).
+        """
+        self.bucket_size = bucket_size
+        self._scores = {}
+        self._buckets = []     # Sorted lists of (-score, member)
+        self._maxes = []       # Last key of each bucket
+        self._tree = [0]       # Fenwick tree over bucket sizes (1-based)
+        self._dirty = []       # (first_rank, last_rank) ranges disturbed since shifted()
+        self._removed = set()
+        self._reported = {}
+        if scores:
+            keys = sorted((-score, member) for member, score in scores.items() if score)
+            self._scores = {member: -neg for neg, member in keys}
+            self._buckets = [keys[i:i + bucket_size] for i in range(0, len(keys), bucket_size)]
+            self._rebuild()
+        if reported:
+            self._reported = {member: rank for rank, (member, _) in enumerate(self.slice(1, len(self)), 1)}
+        elif self._scores:
+            self._dirty.append((1, len(self)))
+
+    # ---------- bucket bookkeeping ----------
+
+    def _rebuild(self):
+        self._maxes = [bucket[-1] for bucket in self._buckets]
+        tree = [0] * (len(self._buckets) + 1)
+        for i, bucket in enumerate(self._buckets, 1):
+            tree[i] += len(bucket)
+            parent = i + (i & -i)
+            if parent <= len(self._buckets):
+                tree[parent] += tree[i]
+        self._tree = tree
+
+    def _tree_add(self, index, delta):
+        i = index + 1
+        while i < len(self._tree):
+            self._tree[i] += delta
+            i += i & -i
+
+    def _preceding(self, index):
+        """Number of entries in buckets before bucket index."""
+        total = 0
+        i = index
+        while i > 0:
+            total += self._tree[i]
+            i -= i & -i
+        return total
+
+    def _locate(self, position):
+        """(bucket index, offset) of the 0-based position, by Fenwick descent."""
+        index = 0
+        step = 1 << (len(self._buckets).bit_length())
+        while step:
+            nxt = index + step
+            if nxt < len(self._tree) and self._tree[nxt] <= position:
+                index = nxt
+                position -= self._tree[nxt]
+            step >>= 1
+        return index, position
+
+    def _insert(self, key):
+        if not self._buckets:
+            self._buckets = [[key]]
+            self._rebuild()
+            return 1
+        i = min(bisect_left(self._maxes, key), len(self._buckets) - 1)
+        bucket = self._buckets[i]
+        insort(bucket, key)
+        rank = self._preceding(i) + bisect_left(bucket, key) + 1
+        if len(bucket) > 2 * self.bucket_size:
+            self._buckets[i:i + 1] = [bucket[:self.bucket_size], bucket[self.bucket_size:]]
+            self._rebuild()
+        else:
+            self._maxes[i] = bucket[-1]
+            self._tree_add(i, 1)
+        return rank
+
+    def _delete(self, key):
+        i = bisect_left(self._maxes, key)
+        bucket = self._buckets[i]
+        pos = bisect_left(bucket, key)
+        rank = self._preceding(i) + pos + 1
+        del bucket[pos]
+        if not bucket:
+            del self._buckets[i]
+            self._rebuild()
+        else:
+            self._maxes[i] = bucket[-1]
+            self._tree_add(i, -1)
+        return rank
+
+    # ---------- updates ----------
+
+    def update(self, member, score):
+        """Set a member's score; a falsy score removes the member."""
+        old = self._scores.get(member)
+        if old == score or (not old and not score):
+            return
+        old_rank = new_rank = None
+        if old:
+            old_rank = self._delete((-old, member))
+            del self._scores[member]
+        if score:
+            self._scores[member] = score
+            new_rank = self._insert((-score, member))
+            self._removed.discard(member)
+        else:
+            self._removed.add(member)
+
+        if old_rank and new_rank:
+            self._dirty.append((min(old_rank, new_rank), max(old_rank, new_rank)))
+        elif new_rank:
+            self._dirty.append((new_rank, len(self)))       # Everyone below moved down
+        else:
+            self._dirty.append((old_rank, len(self) + 1))   # Everyone below moved up
+
+    def sync(self, scores):
+        """Point-update to match {member: score}; members not present are removed."""
+        for member in [m for m in self._scores if not scores.get(m)]:
+            self.update(member, None)
+        for member, score in scores.items():
+            if self._scores.get(member) != score:
+                self.update(member, score)
+
+    def shifted(self):
+        """
+        {member: new rank (None if removed)} for every member whose rank
+        changed since the previous call. Only disturbed rank ranges are read.
+        """
+        changes = {}
+        ranges = sorted(self._dirty)
+        merged = []
+        for lo, hi in ranges:
+            if merged and lo <= merged[-1][1] + 1:
+                merged[-1][1] = max(merged[-1][1], hi)
+            else:
+                merged.append([lo, hi])
+        for lo, hi in merged:
+            for rank, (member, _) in enumerate(self.slice(lo, min(hi, len(self))), lo):
+                if self._reported.get(member) != rank:
+                    changes[member] = rank
+                    self._reported[member] = rank
+        for member in self._removed:
+            if self._reported.pop(member, None) is not None:
+                changes[member] = None
+        self._dirty = []
+        self._removed = set()
+        return changes
+
+    # ---------- queries ----------
+
+    def __len__(self):
+        return len(self._scores)
+
+    def __contains__(self, member):
+        return member in self._scores
+
+    def score(self, member):
+        return self._scores.get(member)
+
+    def scores(self):
+        return dict(self._scores)
+
+    def rank(self, member):
+        """1-based rank of member, or None if not ranked."""
+        score = self._scores.get(member)
+        if not score:
+            return None
+        key = (-score, member)
+        i = bisect_left(self._maxes, key)
+        return self._preceding(i) + bisect_left(self._buckets[i], key) + 1
+
+    def slice(self, start, end):
+        """[(member, score)] for ranks start..end inclusive."""
+        start = max(1, start)
+        end = min(end, len(self))
+        if start > end:
+            return []
+        result = []
+        i, offset = self._locate(start - 1)
+        remaining = end - start + 1
+        while remaining and i < len(self._buckets):
+            chunk = self._buckets[i][offset:offset + remaining]
+            result.extend((member, -neg) for neg, member in chunk)
+            remaining -= len(chunk)
+            i, offset = i + 1, 0
+        return result
+
+    def top(self, k):
+        """[(member, score)] for the top k members."""
+        return self.slice(1, k)
@@ -0,0 +1,286 @@
+#!/usr/bin/env python3
+"""
+OceanZ Gaming Cafe - Keep-alive REST Transport for Realtime Database
+
+Optional replacement for firebase_admin.db writes (enable USE_REST_TRANSPORT
+in config.py). Talks to the RTDB REST API directly:
+- Persistent HTTP/1.1 keep-alive connection pool (no reconnect per write)
+- OAuth access token cached until shortly before it expires
+- Large multi-path updates split into concurrent PATCH requests
+- print=silent so Firebase does not echo written data back
+
+Also contains LocalRtdbServer, a small in-process stand-in for the REST API
+used for local testing without credentials or network.
+
+Usage:
+    python rtdb_rest.py     # Self-check against the local stand-in server
+"""
+
+import json
+import time
+import queue
+import threading
+import http.client
+from datetime import datetime
+from urllib.parse import urlparse, quote, urlsplit, parse_qs
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from db_backend import MemoryBackend
+
+TOKEN_REFRESH_MARGIN = 300  # Refresh the OAuth token 5 minutes before expiry
+
+
+class RestTransportError(Exception):
+    """Non-2xx response from the Realtime Database REST API."""
+
+    def __init__(self, status, body):
+        super().__init__(f"HTTP {status}: {body[:200]}")
+        self.status = status
+        self.body = body
+
+
+def service_account_token_provider(cred_path):
+    """Token provider backed by the same service account file firebase_admin uses."""
+    from firebase_admin import credentials
+
+    cred = credentials.Certificate(cred_path)
+
+    def provider():
+        info = cred.get_access_token()
+        expires_in = (info.expiry - datetime.utcnow()).total_seconds() if info.expiry else 3600
+        return info.access_token, time.time() + expires_in
+
+    return provider
+
+
+class RtdbRestTransport:
+    """Realtime Database REST client with a keep-alive pool and cached token."""
+
+    def __init__(self, db_url, token_provider, pool_size=4, timeout=30, split_bytes=256 * 1024):
+        parsed = urlparse(db_url)
+        self.scheme = parsed.scheme
+        self.host = parsed.hostname
+        self.port = parsed.port
+        self.timeout = timeout
+        self.split_bytes = split_bytes  # Bigger multi-path updates become concurrent PATCHes
+        self.token_provider = token_provider
+        self._token = None
+        self._token_expires = 0
+        self._token_lock = threading.Lock()
+        self._pool = queue.LifoQueue(maxsize=pool_size)
+        self._executor = ThreadPoolExecutor(max_workers=pool_size, thread_name_prefix="rtdb-rest")
+        self.stats = {"requests": 0, "connections_opened": 0, "bytes_sent": 0}
+        self._stats_lock = threading.Lock()
+
+    # ---------- auth / connections ----------
+
+    def _access_token(self):
+        with self._token_lock:
+            if self._token is None or time.time() > self._token_expires - TOKEN_REFRESH_MARGIN:
+                self._token, self._token_expires = self.token_provider()
+            return self._token
+
+    def _new_connection(self):
+        with self._stats_lock:
+            self.stats["connections_opened"] += 1
+        if self.scheme == "https":
+            return http.client.HTTPSConnection(self.host, self.port, timeout=self.timeout)
+        return http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+
+    def _checkout(self):
+        try:
+            return self._pool.get_nowait()
+        except queue.Empty:
+            return self._new_connection()
+
+    def _checkin(self, conn):
+        try:
+            self._pool.put_nowait(conn)
+        except queue.Full:
+            conn.close()
+
+    def close(self):
+        """Close pooled connections and worker threads."""
+        self._executor.shutdown(wait=True)
+        while not self._pool.empty():
+            self._pool.get_nowait().close()
+
+    # ---------- requests ----------
+
+    def _request(self, method, path, value=None, silent=True):
+        url = f"/{quote(path.strip('/'))}.json" if path.strip("/") else "/.json"
+        if silent:
+            url += "?print=silent"
+        body = None if value is None and method in ("GET", "DELETE") else \
+            json.dumps(value, separators=(",", ":")).encode("utf-8")
+        headers = {
+            "Authorization": f"Bearer {self._access_token()}",
+            "Connection": "keep-alive",
+        }
+        if body is not None:
+            headers["Content-Type"] = "application/json"
+
+        # A pooled connection may have been closed by the server while idle:
+        # retry once on a fresh connection before giving up
+        for attempt in range(2):
+            conn = self._checkout() if attempt == 0 else self._new_connection()
+            try:
+                conn.request(method, url, body=body, headers=headers)
+                response = conn.getresponse()
+                data = response.read()
+            except (http.client.HTTPException, OSError):
+                conn.close()
+                if attempt == 1:
+                    raise
+                continue
+
+            with self._stats_lock:
+                self.stats["requests"] += 1
+                self.stats["bytes_sent"] += len(body or b"")
+            if response.will_close:
+                conn.close()
+            else:
+                self._checkin(conn)
+            if response.status >= 300:
+                raise RestTransportError(response.status, data.decode("utf-8", errors="ignore"))
+            return json.loads(data) if data else None
+
+    def get(self, path):
+        return self._request("GET", path, silent=False)
+
+    def set(self, path, value):
+        self._request("PUT", path, value)
+
+    def delete(self, path):
+        self._request("DELETE", path)
+
+    def update(self, updates, path=""):
+        """
+        Multi-path PATCH. Large payloads are split into chunks sent
+        concurrently over the pool; raises if any chunk fails.
+        """
+        if not updates:
+            return
+        chunks = []
+        current, current_bytes = {}, 0
+        for key, value in updates.items():
+            size = len(json.dumps(value, separators=(",", ":"), default=str))
+            if current and current_bytes + size > self.split_bytes:
+                chunks.append(current)
+                current, current_bytes = {}, 0
+            current[key] = value
+            current_bytes += size
+        chunks.append(current)
+
+        if len(chunks) == 1:
+            self._request("PATCH", path, chunks[0])
+            return
+        futures = [self._executor.submit(self._request, "PATCH", path, chunk) for chunk in chunks]
+        for future in futures:
+            future.result()
+
+
+# ==================== LOCAL STAND-IN SERVER ====================
+
+class LocalRtdbServer:
+    """
+    In-process stand-in for the RTDB REST API (GET/PUT/PATCH/DELETE on a
+    MemoryBackend) with HTTP/1.1 keep-alive, for testing transports locally.
+    """
+
+    def __init__(self, port=0, backend=None):
+        self.backend = backend or MemoryBackend()
+        self.requests = []        # (method, path, client_port)
+        self.lock = threading.Lock()
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def _handle(self):
+                split = urlsplit(self.path)
+                path = split.path
+                if path.endswith(".json"):
+                    path = path[:-5]
+                length = int(self.headers.get("Content-Length") or 0)
+                body = json.loads(self.rfile.read(length)) if length else None
+
+                with server.lock:
+                    server.requests.append((self.command, path, self.client_address[1]))
+                result = body
+                if self.command == "GET":
+                    result = server.backend.get(path)
+                elif self.command == "PUT":
+                    server.backend.set(path, body)
+                elif self.command == "PATCH":
+                    server.backend.update(path, body or {})
+                else:
+                    server.backend.delete(path)
+
+                silent = "silent" in parse_qs(split.query).get("print", [])
+                if silent:
+                    self.send_response(204)
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+                data = json.dumps(result).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            do_GET = do_PUT = do_PATCH = do_DELETE = _handle
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.httpd.server_address[1]}"
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+def main():
+    """Self-check the transport against the local stand-in server."""
+    server = LocalRtdbServer().start()
+    transport = RtdbRestTransport(
+        server.url,
+        token_provider=lambda: ("local-test-token", time.time() + 3600),
+        pool_size=4,
+        split_bytes=4 * 1024,
+    )
+    try:
+        started = time.time()
+        for i in range(50):
+            transport.update({f"terminal-status/PC-{i % 17}/last_updated": datetime.now().isoformat()})
+        members = {f"members/USER{i}": {"profile": {"ID": i, "NOTE": "x" * 200}} for i in range(200)}
+        transport.update(members)
+        elapsed = time.time() - started
+
+        assert transport.get("members/USER7/profile/ID") == 7
+        assert len(transport.get("terminal-status")) == 17
+        transport.delete("members/USER7")
+        assert transport.get("members/USER7") is None
+
+        client_ports = {port for _, _, port in server.requests}
+        print(f"[OK] {transport.stats['requests']} requests over {len(client_ports)} connection(s) "
+              f"in {elapsed:.2f}s ({transport.stats['bytes_sent'] // 1024} KB sent)")
+    finally:
+        transport.close()
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
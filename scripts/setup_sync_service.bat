@@ -224,8 +224,8 @@ echo  ============================================================
 echo.
 echo   The sync service is now configured to:
 echo     - Start automatically when you log in to Windows
-echo     - Sync terminal status every 2 minutes
-echo     - Sync FDB database every 15 minutes
+echo     - Sync changed data within seconds (change probe)
+echo     - Run each dataset job at least on its own cadence
 echo     - Listen for manual sync requests from Web UI
 echo.
 echo   Scripts Location: %SCRIPTS_DIR%
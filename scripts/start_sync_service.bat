@@ -4,8 +4,8 @@
 :: ============================================================
 :: This script starts the Firebase-based sync service with
 :: automatic scheduled syncs:
-::   - Terminal Status: Every 2 minutes (from FDB)
-::   - FDB + Leaderboards: Every 15 minutes
+::   - Each dataset job on its own cadence (see SYNC_JOBS)
+::   - Sooner when the change probe sees new data
 ::
 :: To auto-start on boot, run setup_sync_service.bat once
 :: (with Administrator privileges)
@@ -24,9 +24,9 @@ echo  ====================================================
 echo   OceanZ Sync Service
 echo  ====================================================
 echo   Auto-Sync Schedule:
-echo     - Terminals:   Every 2 minutes (from FDB)
-echo     - FDB Data:    Every 15 minutes
-echo     - Leaderboards: Every 15 minutes
+echo     - Datasets:    On change, within seconds
+echo     - Terminals:   At least every 10 minutes
+echo     - FDB Data:    At least every 15-60 minutes per job
 echo     - Manual:      Via Firebase request (Web UI)
 echo  ====================================================
 echo.
@@ -3,17 +3,23 @@
 OceanZ Sync Service - Firebase-controlled Background Service with Auto-Scheduling
 
 This service runs on the FDB database machine and:
-1. Monitors Firebase for manual sync requests from the web UI
-2. Automatically runs scheduled syncs:
-   - Terminals: Every 2 minutes (from FDB TERMINALS table)
-   - Complete Sync (FDB + Leaderboards): Every 15 minutes
+1. Listens (streaming) for manual sync requests from the web UI, falling
+   back to polling while the stream is down
+2. Schedules each dataset job (SYNC_JOBS in oceanz_sync.py: history,
+   sessions, guest sessions, leaderboards, terminals, cash register,
+   members) on its own cadence, and early when a cheap change probe (file
+   stat every few seconds, then max IDs + TERMINALS fingerprint) sees its
+   data move
+3. Runs the control plane (heartbeat, schedule, requests, job dispatch)
+   as asyncio tasks; blocking FDB and Firebase work runs in thread pools
+   with timeouts, so a long FDB sync holds up nothing else
 
 Firebase Paths Used:
 - /sync-control/request      - Trigger: set to timestamp to request sync
 - /sync-control/status       - Current status: idle, syncing, completed, error
-- /sync-control/progress     - Progress messages array
+- /sync-control/progress     - Progress messages {push_key: {time, message, level}}
 - /sync-control/last_sync    - Last successful sync info
-- /sync-control/schedule     - Next scheduled sync times
+- /sync-control/schedule     - Next scheduled sync times + per-job timings
 
 Usage:
     python sync_service.py           # Run with auto-scheduling (default)
@@ -25,30 +31,55 @@ import os
 import sys
 import time
 import signal
+import asyncio
+import threading
+import functools
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 from pathlib import Path
 
 # Add parent directory for imports
 sys.path.insert(0, str(Path(__file__).parent))
 
-import firebase_admin
-from firebase_admin import credentials, db
-from config import FB_PATHS, FIREBASE_CRED_PATH, FDB_FIREBASE_DB_URL
+from config import FB_PATHS
+from progress_log import ProgressLog
 
 # Import sync functions from the unified sync script
 from oceanz_sync import (
-    run_terminals_sync,  # Quick terminal status sync
-    run_fdb_sync,        # Full FDB sync (members, history, leaderboards, cash register)
+    use_backend,         # Database backend (real Firebase by default)
+    set_progress_reporter,  # Route long-running step progress into self.log
+    SYNC_JOBS,           # Dataset job registry (cadence, dependencies, lane)
+    run_sync_jobs,       # Run selected dataset jobs over one snapshot
+    source_fdb_signature,  # Change probe: stat of the live database file
+    run_change_probe,      # Change probe: max IDs + TERMINALS fingerprint
 )
 
 # ==================== CONFIG ====================
 
 POLL_INTERVAL = 5  # Seconds between checks
+STREAM_VERIFY_INTERVAL = 600   # Seconds between reads confirming the request stream is live
+STREAM_BACKOFF_MIN = 2         # Reconnect backoff (seconds), doubled per failure
+STREAM_BACKOFF_MAX = 300
+STATUS_RESET_DELAY = 10        # Seconds "completed"/"error" stays visible before "idle"
+CONTROL_TICK = 0.5             # Seconds control-plane changes are coalesced before publishing
 HEARTBEAT_INTERVAL = 30  # Seconds between heartbeat updates
+FIREBASE_CALL_TIMEOUT = 30     # Seconds before a control-plane Firebase call is abandoned
 
-# Auto-sync intervals (in minutes)
-TERMINALS_INTERVAL = 2   # Terminal status every 2 minutes (from FDB TERMINALS table)
-FDB_INTERVAL = 15        # FDB database every 15 minutes
+# Per-lane timeouts (seconds; lanes are DatasetJob.lane). A run that overruns
+# is reported as failed; its thread cannot be killed, so the lane stays busy
+# until it returns
+LANE_TIMEOUTS = {
+    "terminals": 5 * 60,
+    "messages": 5 * 60,
+    "fdb": 60 * 60,
+}
+
+# Change-triggered syncing
+PROBE_INTERVAL = 5       # Seconds between source file checks
+PROBE_TIMEOUT = 120      # Seconds allowed for copying + probing the database
+CHANGE_DEBOUNCE = 3      # Seconds the file must be quiet before probing
+CHANGE_MAX_DELAY = 30    # ...but never wait longer than this after the first change
+DEFERRED_RETRY_DELAY = 120   # Seconds after a run before work it deferred is due again
 
 # Firebase paths for sync control
 SYNC_CONTROL_PATH = "sync-control"
@@ -60,30 +91,243 @@ LAST_SYNC_PATH = f"{SYNC_CONTROL_PATH}/last_sync"
 HEARTBEAT_PATH = f"{SYNC_CONTROL_PATH}/service_heartbeat"
 SCHEDULE_PATH = f"{SYNC_CONTROL_PATH}/schedule"
 
-# ==================== FIREBASE INIT ====================
+# ==================== REQUEST LISTENER ====================
+
+class RequestListener:
+    """
+    Delivers /sync-control/request values via a streaming listener, so an
+    idle service does no request reads and "Sync now" is picked up as soon
+    as it is written.
+    
+    While the stream is down, poll() reads the path every call and
+    reconnects with exponential backoff. While it is up, poll() only does
+    a verification read every STREAM_VERIFY_INTERVAL seconds; a value the
+    stream missed means it went stale, so it is reconnected.
+    """
+    
+    def __init__(self, db, on_request):
+        self.db = db
+        self.on_request = on_request    # Called with each request value
+        self.handle = None
+        self.backoff = STREAM_BACKOFF_MIN
+        self.next_connect = 0
+        self.last_verify = time.time()
+        self.last_seen = None
+        self._lock = threading.Lock()
+    
+    @property
+    def streaming(self):
+        if self.handle is None:
+            return False
+        # firebase_admin runs each listener on its own thread, which ends
+        # when the stream fails
+        thread = getattr(self.handle, "_thread", None)
+        return thread is None or thread.is_alive()
+    
+    def start(self):
+        try:
+            self.handle = self.db.reference(REQUEST_PATH).listen(self._on_event)
+            self.backoff = STREAM_BACKOFF_MIN
+            self.last_verify = time.time()
+            return True
+        except Exception as e:
+            self.handle = None
+            self.next_connect = time.time() + self.backoff
+            print(f"[WARN] Request stream unavailable ({e}) - polling, retry in {self.backoff}s")
+            self.backoff = min(self.backoff * 2, STREAM_BACKOFF_MAX)
+            return False
+    
+    def close(self):
+        if self.handle is not None:
+            try:
+                self.handle.close()
+            except Exception:
+                pass
+            self.handle = None
+    
+    def _deliver(self, value):
+        with self._lock:
+            if value == self.last_seen:
+                return
+            self.last_seen = value
+        if value:
+            self.on_request(value)
+    
+    def _on_event(self, event):
+        value = event.data if event.path == "/" else self.db.reference(REQUEST_PATH).get()
+        self._deliver(value)
+    
+    def _read(self):
+        try:
+            return True, self.db.reference(REQUEST_PATH).get()
+        except Exception as e:
+            print(f"Error checking request: {e}")
+            return False, None
+    
+    def poll(self):
+        """Called from the service loop: poll while down, verify while up."""
+        now = time.time()
+        if self.streaming:
+            if now - self.last_verify < STREAM_VERIFY_INTERVAL:
+                return
+            self.last_verify = now
+            ok, value = self._read()
+            if ok and value != self.last_seen:
+                print("[WARN] Request stream missed an update - reconnecting")
+                self.close()
+                self._deliver(value)
+                self.start()
+            return
+        
+        if self.handle is not None:
+            print("[WARN] Request stream dropped - polling until it reconnects")
+            self.close()
+            self.next_connect = now + self.backoff
+        ok, value = self._read()
+        if ok:
+            self._deliver(value)
+        if now >= self.next_connect and self.start():
+            print("[OK] Request stream connected")
+
+
+# ==================== CONTROL PLANE STATE ====================
+
+def _flatten(value, prefix, out):
+    if isinstance(value, dict) and value:
+        for key, child in value.items():
+            _flatten(child, f"{prefix}/{key}", out)
+    elif value is not None and value != {}:
+        out[prefix] = value
+    return out
+
+
+class ControlPlaneState:
+    """
+    Desired /sync-control tree (status, current_task, heartbeat, schedule,
+    last_sync). set() only records the value; publish() sends every leaf
+    that differs from what was last published - including deletions - in
+    one multi-path update, so unchanged fields (e.g. schedule info after a
+    quiet terminal sync) cost nothing.
+    """
+    
+    def __init__(self, send, root=SYNC_CONTROL_PATH):
+        self.send = send            # send(updates): root multi-path update
+        self.root = root.strip("/")
+        self._desired = {}          # Flattened leaf path -> value
+        self._published = {}
+        self._lock = threading.Lock()
+        self._publish_lock = threading.Lock()
+    
+    def set(self, field, value):
+        """Record the desired value of a field (None deletes it). Returns True if it changed."""
+        leaves = _flatten(value, f"{self.root}/{field.strip('/')}", {})
+        prefix = f"{self.root}/{field.strip('/')}"
+        with self._lock:
+            current = {path: v for path, v in self._desired.items()
+                       if path == prefix or path.startswith(prefix + "/")}
+            if current == leaves:
+                return False
+            for path in current:
+                del self._desired[path]
+            self._desired.update(leaves)
+            return True
+    
+    def pending(self):
+        """Multi-path update taking the published tree to the desired one."""
+        with self._lock:
+            desired = dict(self._desired)
+        updates = {path: value for path, value in desired.items() if self._published.get(path) != value}
+        for path in self._published:
+            if path not in desired:
+                # Writing a value at a parent or child path already replaces this leaf
+                if any(p.startswith(path + "/") or path.startswith(p + "/") for p in updates):
+                    continue
+                updates[path] = None
+        return updates, desired
+    
+    def publish(self):
+        """Send pending changes (one request). Returns the number of fields sent."""
+        with self._publish_lock:
+            updates, desired = self.pending()
+            if not updates:
+                return 0
+            try:
+                self.send(updates)
+            except Exception as e:
+                print(f"Failed to publish sync-control: {e}")
+                return 0
+            self._published = desired
+            return len(updates)
+
+
+# ==================== JOBS ====================
+
+class AsyncJob:
+    """
+    One lane of dataset jobs. Runs are serialized; a run submitted while
+    another with the same key is waiting is coalesced into it. Shared resources
+    (snapshot files, Firebase paths) are locked by the sync functions
+    themselves (RESOURCE_LOCKS in oceanz_sync.py).
+    """
+    
+    def __init__(self, name, timeout):
+        self.name = name
+        self.timeout = timeout
+        self.lock = asyncio.Lock()
+        self.queued = set()
+        self.running = None   # Executor future of the run in flight
+        self.running_key = None
+    
+    @property
+    def idle(self):
+        return not self.queued and self.running is None
 
-def init_firebase():
-    """Initialize Firebase Admin SDK."""
-    if not firebase_admin._apps:
-        cred = credentials.Certificate(FIREBASE_CRED_PATH)
-        firebase_admin.initialize_app(cred, {
-            'databaseURL': FDB_FIREBASE_DB_URL
-        })
-    return db
 
 # ==================== SYNC SERVICE ====================
 
 class SyncService:
-    def __init__(self):
-        self.db = init_firebase()
+    def __init__(self, backend=None):
+        # Backend is injectable so the service can run against MemoryBackend
+        self.db = use_backend(backend)
+        # Status/heartbeat/schedule/last_sync, published in coalesced updates
+        self.control = ControlPlaneState(lambda updates: self.db.update("/", updates))
+        # Buffered and debounced; log() never waits on Firebase
+        self.progress = ProgressLog(lambda updates: self.db.update("/", updates), PROGRESS_PATH,
+                                    load=lambda: self.db.get(PROGRESS_PATH))
+        set_progress_reporter(self.log, self.progress.flush)
         self.running = True
-        self.syncing = False
         self.last_request_id = None
-        self.progress_messages = []
+        self.status_timer = None
+        self.request_pending = threading.Event()
+        self.cut_fdb_run = threading.Event()   # Ends a scheduled FDB run early for a manual sync
+        self.requests = RequestListener(self.db, self.on_request)
         
-        # Track last auto-sync times
-        self.last_terminals_sync = None
-        self.last_fdb_sync = None
+        # Set up by run() inside the event loop
+        self.loop = None
+        self.jobs = {}
+        self.tasks = set()
+        self.wake_requests = None
+        self.wake_schedule = None
+        self.wake_control = None
+        self.stopped = None
+        self.io_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="firebase")
+        self.job_executor = ThreadPoolExecutor(max_workers=len(LANE_TIMEOUTS), thread_name_prefix="job")
+        
+        # Per dataset job: last run start, duration and outcome
+        self.job_runs = {name: {} for name in SYNC_JOBS}
+        self.started_at = datetime.now()    # Jobs that never ran are due from here
+        self.job_runs_lock = threading.Lock()
+        
+        # Change probe
+        self.source_signature = None
+        self.last_probe = None
+        self.change_first_seen = None   # Unprobed change window (monotonic seconds)
+        self.change_last_seen = None
+        self.changed_jobs = set()
+    
+    @property
+    def syncing(self):
+        return not all(job.idle for job in self.jobs.values())
         
     def log(self, message, level="INFO", update_firebase=True):
         """Log message locally and optionally to Firebase."""
@@ -92,118 +336,141 @@ class SyncService:
         print(log_entry)
         
         if update_firebase:
-            # Add to progress messages
-            self.progress_messages.append({
-                "time": timestamp,
-                "message": message,
-                "level": level
-            })
-            
-            # Keep only last 50 messages
-            if len(self.progress_messages) > 50:
-                self.progress_messages = self.progress_messages[-50:]
-            
-            # Update Firebase progress
-            try:
-                self.db.reference(PROGRESS_PATH).set(self.progress_messages)
-            except Exception as e:
-                print(f"Failed to update Firebase progress: {e}")
+            # Queued; keeps the last 50 messages
+            self.progress.append(message, level)
+    
+    def control_changed(self):
+        """Publish on the next control tick (immediately when the loop is not running)."""
+        if self.loop is not None and self.wake_control is not None:
+            self.loop.call_soon_threadsafe(self.wake_control.set)
+        else:
+            self.control.publish()
+    
+    def update_control(self, field, value):
+        if self.control.set(field, value):
+            self.control_changed()
     
     def set_status(self, status, task=None):
         """Update sync status in Firebase."""
-        try:
-            # Ensure status is never None (Firebase doesn't accept None)
-            if status is None:
-                status = "idle"
-            self.db.reference(STATUS_PATH).set(status)
-            
-            if task:
-                self.db.reference(CURRENT_TASK_PATH).set(task)
-            elif status in ["idle", "completed", "error", "offline"]:
-                # Use delete() instead of set(None) - Firebase doesn't accept None
-                try:
-                    self.db.reference(CURRENT_TASK_PATH).delete()
-                except Exception:
-                    pass  # Ignore if path doesn't exist
-        except Exception as e:
-            print(f"Failed to update status: {e}")
+        # Ensure status is never None (Firebase doesn't accept None)
+        if status is None:
+            status = "idle"
+        changed = self.control.set("status", status)
+        if task:
+            changed |= self.control.set("current_task", task)
+        elif status in ["idle", "completed", "error", "offline"]:
+            changed |= self.control.set("current_task", None)
+        if changed:
+            self.control_changed()
+    
+    def next_run(self, name):
+        """When a dataset job is next due by cadence (service start if it never ran)."""
+        run = self.job_runs[name]
+        last = run.get("last_run")
+        if not last:
+            return self.started_at
+        if run.get("deferred"):
+            # Work left over from the time budget: due again shortly after that run ended
+            return run["finished"] + timedelta(seconds=DEFERRED_RETRY_DELAY)
+        return last + timedelta(minutes=SYNC_JOBS[name].cadence)
     
     def update_heartbeat(self):
         """Update service heartbeat to show it's alive."""
-        try:
-            next_terminals = self.last_terminals_sync + timedelta(minutes=TERMINALS_INTERVAL) if self.last_terminals_sync else datetime.now()
-            next_fdb = self.last_fdb_sync + timedelta(minutes=FDB_INTERVAL) if self.last_fdb_sync else datetime.now()
-            
-            self.db.reference(HEARTBEAT_PATH).set({
-                "timestamp": datetime.now().isoformat(),
-                "status": "syncing" if self.syncing else "idle",
-                "next_terminals": next_terminals.isoformat(),
-                "next_fdb": next_fdb.isoformat()
-            })
-        except Exception as e:
-            print(f"Failed to update heartbeat: {e}")
+        next_terminals = self.next_run("terminals")
+        next_fdb = min(self.next_run(name) for name, job in SYNC_JOBS.items() if job.lane == "fdb")
+        
+        self.update_control("service_heartbeat", {
+            "timestamp": datetime.now().isoformat(),
+            "status": "syncing" if self.syncing else "idle",
+            "next_terminals": next_terminals.isoformat(),
+            "next_fdb": next_fdb.isoformat()
+        })
     
     def update_schedule_info(self):
-        """Update schedule info in Firebase for UI display."""
+        """Update schedule info (incl. per-job timings) for UI display; sent only if it changed."""
         try:
-            next_terminals = self.last_terminals_sync + timedelta(minutes=TERMINALS_INTERVAL) if self.last_terminals_sync else datetime.now()
-            next_fdb = self.last_fdb_sync + timedelta(minutes=FDB_INTERVAL) if self.last_fdb_sync else datetime.now()
-            
+            fdb_jobs = [name for name, job in SYNC_JOBS.items() if job.lane == "fdb"]
             schedule_data = {
-                "terminals_interval_mins": TERMINALS_INTERVAL,
-                "fdb_interval_mins": FDB_INTERVAL,
-                "next_terminals": next_terminals.isoformat(),
-                "next_fdb": next_fdb.isoformat(),
+                "terminals_interval_mins": SYNC_JOBS["terminals"].cadence,
+                "fdb_interval_mins": min(SYNC_JOBS[name].cadence for name in fdb_jobs),
+                "next_terminals": self.next_run("terminals").isoformat(),
+                "next_fdb": min(self.next_run(name) for name in fdb_jobs).isoformat(),
+                "jobs": {},
             }
             
-            # Only add last sync times if they exist (Firebase doesn't accept None)
-            if self.last_terminals_sync:
-                schedule_data["last_terminals"] = self.last_terminals_sync.isoformat()
-            if self.last_fdb_sync:
-                schedule_data["last_fdb"] = self.last_fdb_sync.isoformat()
+            with self.job_runs_lock:
+                runs = {name: dict(run) for name, run in self.job_runs.items()}
+            for name, job in SYNC_JOBS.items():
+                info = {
+                    "cadence_mins": job.cadence,
+                    "lane": job.lane,
+                    "next_run": self.next_run(name).isoformat(),
+                }
+                # Only add last run fields if they exist (Firebase doesn't accept None)
+                if runs[name]:
+                    info["last_run"] = runs[name]["last_run"].isoformat()
+                    info["last_duration_seconds"] = runs[name]["seconds"]
+                    info["last_success"] = runs[name]["success"]
+                    if runs[name]["deferred"]:
+                        info["deferred"] = runs[name]["deferred"]
+                if job.depends_on:
+                    info["depends_on"] = list(job.depends_on)
+                schedule_data["jobs"][name] = info
+            
+            last_terminals = runs["terminals"].get("last_run")
+            last_fdb = max((runs[name]["last_run"] for name in fdb_jobs if runs[name]), default=None)
+            if last_terminals:
+                schedule_data["last_terminals"] = last_terminals.isoformat()
+            if last_fdb:
+                schedule_data["last_fdb"] = last_fdb.isoformat()
             
-            self.db.reference(SCHEDULE_PATH).set(schedule_data)
+            self.update_control("schedule", schedule_data)
         except Exception as e:
             print(f"Failed to update schedule: {e}")
     
+    def on_request(self, request):
+        """Request value from the listener (stream thread or poll)."""
+        if request != self.last_request_id:
+            self.last_request_id = request
+            self.request_pending.set()
+            if self.loop is not None:
+                self.loop.call_soon_threadsafe(self.wake_requests.set)
+    
     def check_for_request(self):
         """Check if there's a new sync request from web UI."""
-        try:
-            request_ref = self.db.reference(REQUEST_PATH)
-            request = request_ref.get()
-            
-            if request and request != self.last_request_id:
-                self.last_request_id = request
-                return True
-            return False
-        except Exception as e:
-            print(f"Error checking request: {e}")
-            return False
+        self.requests.poll()
+        if self.request_pending.is_set():
+            self.request_pending.clear()
+            return True
+        return False
     
-    def do_terminals_sync(self, silent=False):
-        """Quick terminal status sync."""
-        if not silent:
-            self.log("Starting: Terminal Status")
-            self.set_status("syncing", "Terminal Status")
-        
-        try:
-            success = run_terminals_sync()
-            if success and not silent:
-                self.log("Completed: Terminal Status", "SUCCESS")
-            return success
-        except Exception as e:
-            if not silent:
-                self.log(f"Terminals sync error: {e}", "ERROR")
-            return False
+    def run_jobs(self, names):
+        """Run dataset jobs (one lane's batch, or all) and record their timings."""
+        fdb = any(SYNC_JOBS[name].lane == "fdb" for name in names)
+        results = run_sync_jobs(names, backend=self.db, stop=self.cut_fdb_run if fdb else None)
+        with self.job_runs_lock:
+            for name, result in results.items():
+                self.job_runs[name] = {
+                    "last_run": datetime.fromisoformat(result["started"]),
+                    "seconds": result["seconds"],
+                    "success": result["success"],
+                    "deferred": result.get("deferred"),
+                    "finished": datetime.now(),
+                }
+        deferred = [f"{name} ({result['deferred']})" for name, result in results.items() if result.get("deferred")]
+        if deferred:
+            self.log(f"Deferred to next cycle: {'; '.join(deferred)}", "WARN")
+        self.update_schedule_info()
+        return all(result["success"] for result in results.values())
     
     def do_fdb_sync(self, silent=False):
-        """Full FDB sync (members, history, leaderboards, cash register)."""
+        """Full FDB sync: every dataset job (members, history, leaderboards, cash register...)."""
         if not silent:
             self.log("Starting: Full FDB Sync")
             self.set_status("syncing", "FDB Sync")
         
         try:
-            success = run_fdb_sync()
+            success = self.run_jobs(list(SYNC_JOBS))
             if success and not silent:
                 self.log("Completed: Full FDB Sync", "SUCCESS")
             return success
@@ -212,10 +479,22 @@ class SyncService:
                 self.log(f"FDB sync error: {e}", "ERROR")
             return False
     
+    def schedule_status_reset(self):
+        """Return status to idle after STATUS_RESET_DELAY, unless another sync starts first."""
+        self.cancel_status_reset()
+        self.status_timer = threading.Timer(STATUS_RESET_DELAY, self.set_status, args=("idle",))
+        self.status_timer.start()
+    
+    def cancel_status_reset(self):
+        if self.status_timer is not None:
+            self.status_timer.cancel()
+            self.status_timer = None
+    
     def perform_full_sync(self, triggered_by="web_ui"):
         """Execute full sync (triggered by web UI)."""
-        self.syncing = True
-        self.progress_messages = []
+        self.cancel_status_reset()
+        self.cut_fdb_run.clear()
+        self.progress.clear()
         start_time = datetime.now()
         
         self.log("=" * 50)
@@ -226,10 +505,6 @@ class SyncService:
         # Run full FDB sync (includes members, history, leaderboards, terminals, cash register)
         success = self.do_fdb_sync(silent=False)
         
-        # Update last sync times
-        self.last_fdb_sync = datetime.now()
-        self.last_terminals_sync = datetime.now()
-        
         # Calculate duration
         end_time = datetime.now()
         duration = (end_time - start_time).total_seconds()
@@ -242,120 +517,244 @@ class SyncService:
             "triggered_by": triggered_by
         }
         
-        try:
-            self.db.reference(LAST_SYNC_PATH).set(sync_info)
-        except Exception as e:
-            print(f"Failed to update last_sync: {e}")
+        self.update_control("last_sync", sync_info)
         
         self.log("=" * 50)
         if success:
             self.log(f"[OK] SYNC COMPLETED in {duration:.1f}s")
-            self.set_status("completed")
         else:
             self.log(f"[WARN] SYNC COMPLETED WITH ERRORS in {duration:.1f}s")
-            self.set_status("error")
         self.log("=" * 50)
+        # The web UI stops reading progress once status says we are done
+        self.progress.flush(wait=True)
+        self.set_status("completed" if success else "error")
         
-        self.syncing = False
-        self.update_schedule_info()
-        
-        # Reset to idle after 10 seconds
-        time.sleep(10)
-        self.set_status("idle")
+        # Reset to idle shortly after, without holding up this worker
+        self.schedule_status_reset()
         
         return success
     
-    def auto_sync_terminals(self):
-        """Quick terminal status sync (scheduled every 2 minutes)."""
-        print(f"\n[AUTO-SYNC] Terminals - {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
-        self.syncing = True
-        
-        success = self.do_terminals_sync(silent=True)
-        
-        self.last_terminals_sync = datetime.now()
-        self.syncing = False
-        self.update_schedule_info()
-        
-        return success
+    # ---------- asyncio control plane ----------
     
-    def auto_sync_fdb(self):
-        """Full FDB sync (scheduled every 15 minutes)."""
-        print(f"\n[AUTO-SYNC] FDB Sync - {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
-        self.syncing = True
-        
-        # Run full FDB sync (includes members, history, leaderboards, terminals, cash register)
-        success = self.do_fdb_sync(silent=True)
-        
-        self.last_fdb_sync = datetime.now()
-        self.last_terminals_sync = datetime.now()
-        self.syncing = False
-        self.update_schedule_info()
-        
-        return success
+    async def call(self, func, *args, timeout=FIREBASE_CALL_TIMEOUT, **kwargs):
+        """Run a blocking control-plane call off the loop; None if it times out."""
+        future = self.loop.run_in_executor(self.io_executor, functools.partial(func, *args, **kwargs))
+        try:
+            return await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            print(f"[WARN] {getattr(func, '__name__', func)} timed out after {timeout}s")
+            return None
+    
+    def submit(self, name, key, func, *args, **kwargs):
+        """Queue a job run on the loop (coalesced per key)."""
+        job = self.jobs[name]
+        if key in job.queued:
+            return False
+        job.queued.add(key)
+        task = self.loop.create_task(self.run_job(job, key, func, *args, **kwargs))
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+        return True
+    
+    async def run_job(self, job, key, func, *args, **kwargs):
+        try:
+            async with job.lock:
+                job.queued.discard(key)
+                future = self.loop.run_in_executor(self.job_executor, functools.partial(func, *args, **kwargs))
+                job.running = future
+                job.running_key = key
+                try:
+                    # shield: a timeout or shutdown stops the wait, not the thread
+                    return await asyncio.wait_for(asyncio.shield(future), job.timeout)
+                except asyncio.TimeoutError:
+                    await self.call(self.log, f"[TIMEOUT] {job.name} job exceeded {job.timeout}s", "ERROR")
+                    await asyncio.gather(future, return_exceptions=True)
+                except Exception as e:
+                    print(f"[ERROR] {job.name} job failed: {e}")
+                finally:
+                    if future.done():
+                        job.running = job.running_key = None
+        finally:
+            job.queued.discard(key)
+            self.wake_schedule.set()
+    
+    def next_due(self):
+        """Seconds until the next dataset job is due by cadence (0 = now)."""
+        now = datetime.now()
+        return max(0, min((self.next_run(name) - now).total_seconds() for name in SYNC_JOBS))
+    
+    def probe_changes(self, probe):
+        """Dataset jobs affected by the difference between probe and the previous one."""
+        previous, self.last_probe = self.last_probe, probe
+        if probe is None or previous is None:
+            return {name for name, job in SYNC_JOBS.items() if job.probe_keys}
+        moved = {key for key in probe if probe[key] != previous.get(key)}
+        return {name for name, job in SYNC_JOBS.items() if moved.intersection(job.probe_keys)}
+    
+    async def probe_loop(self):
+        while True:
+            await asyncio.sleep(PROBE_INTERVAL)
+            now = self.loop.time()
+            try:
+                signature = await self.call(source_fdb_signature)
+            except OSError as e:
+                print(f"[WARN] Change probe cannot stat the database: {e}")
+                continue
+            if signature is not None and signature != self.source_signature:
+                self.source_signature = signature
+                self.change_last_seen = now
+                if self.change_first_seen is None:
+                    self.change_first_seen = now
+            if self.change_first_seen is None:
+                continue
+            if now - self.change_last_seen < CHANGE_DEBOUNCE and now - self.change_first_seen < CHANGE_MAX_DELAY:
+                continue
+            
+            self.change_first_seen = self.change_last_seen = None
+            try:
+                probe = await self.call(run_change_probe, timeout=PROBE_TIMEOUT)
+            except Exception as e:
+                print(f"[WARN] Change probe failed: {e}")
+                probe = None
+            changed = self.probe_changes(probe)
+            if changed:
+                print(f"[CHANGE] {', '.join(sorted(changed))} changed - syncing")
+                self.changed_jobs |= changed
+                self.wake_schedule.set()
     
     def check_scheduled_syncs(self):
-        """Check if any scheduled syncs are due."""
+        """Queue due dataset jobs (changed data or cadence passed), one batch per idle lane."""
         now = datetime.now()
+        due = {}
+        for name, job in SYNC_JOBS.items():
+            if name in self.changed_jobs or self.next_run(name) <= now:
+                due.setdefault(job.lane, []).append(name)
+        
+        for lane, names in due.items():
+            # A busy lane picks its due jobs up when it finishes (wake_schedule)
+            if self.jobs[lane].idle:
+                self.submit(lane, "auto", self.run_jobs, names)
+                self.changed_jobs.difference_update(names)
+    
+    async def wait_event(self, event, timeout):
+        """Wait for event (cleared afterwards) or timeout."""
+        try:
+            await asyncio.wait_for(event.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        event.clear()
+    
+    async def control_loop(self):
+        # Changes arriving within one tick go out as a single multi-path update
+        while True:
+            await self.wake_control.wait()
+            await asyncio.sleep(CONTROL_TICK)
+            self.wake_control.clear()
+            await self.call(self.control.publish)
+    
+    async def heartbeat_loop(self):
+        # Deadlines advance by the interval, so beats do not drift
+        next_beat = self.loop.time()
+        while True:
+            self.update_heartbeat()
+            next_beat += HEARTBEAT_INTERVAL
+            await asyncio.sleep(max(0, next_beat - self.loop.time()))
+    
+    async def schedule_loop(self):
+        while True:
+            self.check_scheduled_syncs()
+            # Sleep until the next sync is due; job completions wake us early
+            await self.wait_event(self.wake_schedule, max(1, self.next_due()))
+    
+    async def request_loop(self):
+        while True:
+            # Streamed requests wake this immediately; the timeout only drives
+            # polling while the stream is down
+            await self.wait_event(self.wake_requests, POLL_INTERVAL)
+            if await self.call(self.check_for_request):
+                await self.call(self.log, "[REQUEST] Manual sync request received!")
+                fdb = self.jobs["fdb"]
+                if fdb.running is not None and fdb.running_key != "manual":
+                    # A scheduled FDB run holds the lane: end it after its current job
+                    self.cut_fdb_run.set()
+                    self.cancel_status_reset()
+                    self.set_status("syncing", "Waiting for the running sync to stop...")
+                self.submit("fdb", "manual", self.perform_full_sync, triggered_by="web_ui")
+    
+    async def main(self):
+        self.loop = asyncio.get_running_loop()
+        self.jobs = {lane: AsyncJob(lane, timeout) for lane, timeout in LANE_TIMEOUTS.items()}
+        self.wake_requests = asyncio.Event()
+        self.wake_schedule = asyncio.Event()
+        self.wake_control = asyncio.Event()
+        self.stopped = asyncio.Event()
+        
+        await self.call(self.log, "[START] OceanZ Sync Service Starting...", update_firebase=True)
+        await self.call(self.log, "[SCHEDULE] On change, and at least every: " +
+                        ", ".join(f"{name} {job.cadence}m" for name, job in SYNC_JOBS.items()))
+        self.set_status("idle")
+        if await self.call(self.requests.start):
+            print("[OK] Listening for sync requests")
+        
+        # Baseline for the change probe (the initial sync covers everything)
+        try:
+            self.source_signature = await self.call(source_fdb_signature)
+            self.last_probe = await self.call(run_change_probe, timeout=PROBE_TIMEOUT)
+        except Exception as e:
+            print(f"[WARN] Change probe unavailable: {e}")
         
-        # Check terminals (every 2 minutes) - quick terminal status only
-        if self.last_terminals_sync is None or (now - self.last_terminals_sync).total_seconds() >= TERMINALS_INTERVAL * 60:
-            self.auto_sync_terminals()
+        # No job has run yet, so the scheduler starts every lane right away
+        print("\n[STARTUP] Running initial sync of all jobs...")
         
-        # Check FDB + Leaderboards (every 15 minutes) - run complete sync
-        if self.last_fdb_sync is None or (now - self.last_fdb_sync).total_seconds() >= FDB_INTERVAL * 60:
-            self.auto_sync_fdb()  # This runs complete sync which includes leaderboards
+        loops = [self.loop.create_task(coro) for coro in
+                 (self.control_loop(), self.heartbeat_loop(), self.schedule_loop(),
+                  self.request_loop(), self.probe_loop())]
+        try:
+            await self.stopped.wait()
+        finally:
+            self.log("[STOP] Service stopping...")
+            for task in loops + list(self.tasks):
+                task.cancel()
+            await asyncio.gather(*loops, *self.tasks, return_exceptions=True)
+            # Let FDB/Firebase work already in flight finish (journal flush)
+            in_flight = [job.running for job in self.jobs.values() if job.running is not None]
+            if in_flight:
+                print(f"[STOP] Waiting for {len(in_flight)} running job(s)...")
+                await asyncio.gather(*in_flight, return_exceptions=True)
+            # From here on control changes publish immediately
+            self.loop = None
     
     def run(self):
-        """Main service loop with auto-scheduling."""
+        """Main service entry: run the asyncio control plane until stopped."""
         print(f"""
 ================================================================
            OceanZ Sync Service                             
-   Auto-Scheduling + Firebase Control                      
+   Per-Dataset Jobs + Change Probe + Firebase Control      
 ----------------------------------------------------------------
-   Terminals:  Every {TERMINALS_INTERVAL} minutes (from FDB TERMINALS table)
-   FDB Data:   Every {FDB_INTERVAL} minutes                         
+   Jobs:       {", ".join(SYNC_JOBS)}
+   Schedule:   On change, and at least every job's cadence
    Manual:     Via Firebase request                     
 ================================================================
         """)
         
-        self.log("[START] OceanZ Sync Service Starting...", update_firebase=True)
-        self.log(f"[SCHEDULE] Terminals every {TERMINALS_INTERVAL}m, FDB every {FDB_INTERVAL}m")
-        self.set_status("idle")
-        self.update_heartbeat()
-        
-        # Run initial sync (unified sync handles everything)
-        print("\n[STARTUP] Running initial unified sync...")
-        self.auto_sync_fdb()  # Unified sync includes terminals and leaderboards
-        
-        last_heartbeat = time.time()
-        
         try:
-            while self.running:
-                # Priority 1: Check for manual sync request from web UI
-                if not self.syncing and self.check_for_request():
-                    self.log("[REQUEST] Manual sync request received!")
-                    self.perform_full_sync(triggered_by="web_ui")
-                
-                # Priority 2: Check scheduled syncs (only if not currently syncing)
-                if not self.syncing:
-                    self.check_scheduled_syncs()
-                
-                # Update heartbeat periodically
-                if time.time() - last_heartbeat > HEARTBEAT_INTERVAL:
-                    self.update_heartbeat()
-                    last_heartbeat = time.time()
-                
-                time.sleep(POLL_INTERVAL)
-                
+            asyncio.run(self.main())
         except KeyboardInterrupt:
-            self.log("[STOP] Service stopping...")
+            pass  # main() already logged the stop
         finally:
+            self.requests.close()
+            self.cancel_status_reset()
+            self.job_executor.shutdown(wait=True)
+            self.io_executor.shutdown(wait=True)
             self.set_status("offline")
             self.log("[EXIT] Service stopped")
+            self.progress.close()
     
     def stop(self):
-        """Stop the service gracefully."""
+        """Stop the service gracefully (safe from signal handlers and other threads)."""
         self.running = False
+        if self.loop is not None and self.stopped is not None:
+            self.loop.call_soon_threadsafe(self.stopped.set)
 
 
 # ==================== SIGNAL HANDLERS ====================
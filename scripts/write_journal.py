@@ -0,0 +1,278 @@
+"""
+OceanZ Gaming Cafe - Write-Ahead Journal for Firebase Uploads
+
+Every Firebase write from the sync goes through this journal:
+1. The write is recorded in memory and appended to a local JSON-lines file
+   (fsync'd in batches, not per write)
+2. It is sent straight away while the connection looks healthy
+3. If sending fails, it stays pending and is replayed later in large
+   coalesced multi-path updates once connectivity returns
+
+Pending writes are compacted by path: a later write to a path supersedes any
+earlier write to the same path or below it, and a write below a pending path
+is folded into that pending value. Pending paths therefore never overlap and
+any subset of them can be sent as one multi-path update.
+
+Watermarks (e.g. last_history_id) are recorded in the journal too and only
+released once every write made before them has been acknowledged.
+"""
+
+import os
+import json
+import threading
+
+
+def _set_child(node, parts, value):
+    """Return a copy of node with value written at the relative path parts."""
+    if isinstance(node, list):
+        node = {str(i): v for i, v in enumerate(node) if v is not None}
+    node = dict(node) if isinstance(node, dict) else {}
+    key = parts[0]
+    if len(parts) == 1:
+        if value is None:
+            node.pop(key, None)
+        else:
+            node[key] = value
+    else:
+        node[key] = _set_child(node.get(key), parts[1:], value)
+    return node
+
+
+class WriteJournal:
+    """
+    Append-only, path-compacted journal of pending Firebase writes.
+
+    send(updates) must perform one multi-path update rooted at "/" and raise
+    on failure (None values delete, like Firebase update()).
+    """
+
+    def __init__(self, path, send, flush_every=200, compact_every=2000):
+        self.path = path
+        self.send = send
+        self.flush_every = flush_every      # Buffered records before an automatic fsync
+        self.compact_every = compact_every  # File records before the file is rewritten
+        self.online = True                  # False after a failed send until the next replay
+        self._lock = threading.RLock()
+        self._seq = 0
+        self._pending = {}   # path -> {"value": v, "seqs": set of write seqs}
+        self._marks = []     # [{"mark": name, "value": v, "seq": n}]
+        self._buffer = []    # Records not yet on disk
+        self._file_records = 0
+        self._load()
+
+    # ---------- persistence ----------
+
+    def _load(self):
+        """Rebuild pending writes and watermarks from the journal file."""
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        continue  # Torn last line after a crash
+                    self._file_records += 1
+                    self._seq = max(self._seq, record.get("seq", 0))
+                    if "mark" in record:
+                        self._marks.append(record)
+                    else:
+                        for path, value in record.get("updates", {}).items():
+                            self._apply(path, value, {record["seq"]})
+        except Exception as e:
+            print(f"[WARN] Could not load write journal: {e}")
+        if self._pending:
+            print(f"[JOURNAL] {len(self._pending)} pending write(s) recovered from {os.path.basename(self.path)}")
+
+    def _live_seqs(self):
+        seqs = set()
+        for entry in self._pending.values():
+            seqs |= entry["seqs"]
+        return seqs
+
+    def flush(self):
+        """Append buffered records to disk with a single fsync."""
+        with self._lock:
+            if not self._pending and not self._marks:
+                # Nothing outstanding: truncating is the cheapest compaction
+                self._buffer = []
+                if self._file_records:
+                    self._rewrite([])
+                return
+            live = self._live_seqs()
+            records = [r for r in self._buffer if "mark" in r or r["seq"] in live]
+            self._buffer = []
+            if not records:
+                return
+            try:
+                with open(self.path, "a", encoding="utf-8") as f:
+                    f.write("".join(json.dumps(r, separators=(",", ":")) + "\n" for r in records))
+                    f.flush()
+                    os.fsync(f.fileno())
+                self._file_records += len(records)
+            except Exception as e:
+                print(f"[WARN] Could not write journal: {e}")
+            if self._file_records > self.compact_every:
+                self.compact()
+
+    def compact(self):
+        """Rewrite the journal file with one record per pending path."""
+        with self._lock:
+            records = list(self._marks)
+            for path, entry in self._pending.items():
+                records.append({"seq": min(entry["seqs"]), "updates": {path: entry["value"]}})
+            self._buffer = []
+            self._rewrite(records)
+
+    def _rewrite(self, records):
+        tmp_path = self.path + ".tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                f.write("".join(json.dumps(r, separators=(",", ":")) + "\n" for r in records))
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.path)
+            self._file_records = len(records)
+        except Exception as e:
+            print(f"[WARN] Could not compact journal: {e}")
+
+    # ---------- pending set ----------
+
+    def _apply(self, path, value, seqs):
+        """Merge one write into the pending set (supersede / fold into ancestor)."""
+        path = path.strip("/")
+        prefix = path + "/"
+        for p in [p for p in self._pending if p == path or p.startswith(prefix)]:
+            seqs = seqs | self._pending.pop(p)["seqs"]
+
+        parts = path.split("/")
+        for i in range(len(parts) - 1, 0, -1):
+            ancestor = "/".join(parts[:i])
+            if ancestor in self._pending:
+                entry = self._pending[ancestor]
+                entry["value"] = _set_child(entry["value"], parts[i:], value)
+                entry["seqs"] |= seqs
+                return
+        self._pending[path] = {"value": value, "seqs": set(seqs)}
+
+    def _ack(self, paths, seq):
+        """Drop the pending entries write seq was the last write to."""
+        for path in paths:
+            path = path.strip("/")
+            entry = self._pending.get(path)
+            if entry is not None and (not entry["seqs"] or max(entry["seqs"]) == seq):
+                del self._pending[path]
+        # Entries written again while seq was in flight (or that seq was
+        # folded into) stay pending; only this write is done. An entry whose
+        # writes have now all been acked (e.g. a child write folded into it
+        # was acked last) is done too.
+        for path, entry in list(self._pending.items()):
+            entry["seqs"].discard(seq)
+            if not entry["seqs"]:
+                del self._pending[path]
+
+    @property
+    def pending_count(self):
+        return len(self._pending)
+
+    # ---------- writes ----------
+
+    def write(self, updates):
+        """
+        Journal a multi-path update and try to send it.
+
+        Returns True when Firebase acknowledged it, False when it was left
+        pending for replay.
+        """
+        if not updates:
+            return True
+        with self._lock:
+            self._seq += 1
+            seq = self._seq
+            updates = {path.strip("/"): value for path, value in updates.items()}
+            self._buffer.append({"seq": seq, "updates": updates})
+            for path, value in updates.items():
+                self._apply(path, value, {seq})
+            if len(self._buffer) >= self.flush_every:
+                self.flush()
+            if not self.online:
+                return False
+
+        try:
+            self.send(updates)
+        except Exception as e:
+            with self._lock:
+                if self.online:
+                    print(f"[WARN] Firebase write failed, journaling until connectivity returns: {str(e)[:80]}")
+                self.online = False
+            return False
+
+        with self._lock:
+            self._ack(updates.keys(), seq)
+        return True
+
+    def replay(self, batcher, max_consecutive_failures=3):
+        """
+        Send all pending writes as coalesced multi-path updates.
+
+        Returns the batcher metrics, or None when nothing was pending.
+        """
+        with self._lock:
+            self.online = True
+            if not self._pending:
+                return None
+            items = {path: entry["value"] for path, entry in self._pending.items()}
+            print(f"[JOURNAL] Replaying {len(items)} pending write(s)...")
+
+        def send_batch(batch):
+            self.send(batch)
+            with self._lock:
+                for path, value in batch.items():
+                    # Only ack if nothing newer replaced it while we were sending
+                    entry = self._pending.get(path)
+                    if entry is not None and entry["value"] is value:
+                        del self._pending[path]
+
+        metrics = batcher.upload(items, send_batch, label="journaled writes",
+                                 max_consecutive_failures=max_consecutive_failures)
+        with self._lock:
+            if metrics["aborted"]:
+                self.online = False
+            else:
+                # Connection is fine but Firebase rejected these on their own:
+                # drop them so they cannot hold back watermarks forever
+                for path in metrics["failed"]:
+                    print(f"[ERROR] Dropping rejected journaled write: {path}")
+                    self._pending.pop(path, None)
+            self.compact()
+        return metrics
+
+    # ---------- watermarks ----------
+
+    def mark_watermark(self, name, value):
+        """Record a watermark that becomes effective once earlier writes are acked."""
+        with self._lock:
+            record = {"seq": self._seq, "mark": name, "value": value}
+            self._marks.append(record)
+            self._buffer.append(record)
+
+    def release_watermarks(self):
+        """
+        Return {name: value} for watermarks whose preceding writes are all
+        acknowledged, and forget them.
+        """
+        with self._lock:
+            live = self._live_seqs()
+            oldest_pending = min(live) if live else None
+            released = {}
+            remaining = []
+            for mark in self._marks:
+                if oldest_pending is None or mark["seq"] < oldest_pending:
+                    released[mark["mark"]] = mark["value"]
+                else:
+                    remaining.append(mark)
+            if released:
+                self._marks = remaining
+                self.compact()
+            return released
@@ -0,0 +1,172 @@
+"""
+OceanZ Gaming Cafe - Priority Write Queue for Firebase
+
+Every database write from the sync script and the sync service passes
+through one PriorityWriteQueue, so live data is not stuck behind bulk
+uploads (e.g. a first-run member upload):
+- Writes belong to classes, most urgent first (control plane, live
+  terminal status, new transactions, bulk profiles/leaderboards)
+- Each class has its own concurrency limit, and all classes share a total
+  limit (the connection pool size)
+- A write does not start while a more urgent class is writing, so bulk
+  batches pause between requests while live data goes out
+- Starvation protection: a write that has waited max_wait seconds is
+  admitted next regardless of its class
+
+Writes run on the caller's thread once admitted; the queue only decides
+when. QueuedBackend wraps a db_backend backend and routes its writes
+through the queue, classifying each by the top-level nodes it touches.
+"""
+
+import time
+import itertools
+import threading
+from contextlib import contextmanager
+
+from db_backend import DatabaseBackend
+
+
+class _Waiter:
+    __slots__ = ("write_class", "since", "seq")
+
+    def __init__(self, write_class, since, seq):
+        self.write_class = write_class
+        self.since = since
+        self.seq = seq
+
+
+class PriorityWriteQueue:
+    """Admission control for concurrent writes by class priority."""
+
+    def __init__(self, classes, max_in_flight=4, max_wait=5.0):
+        """
+        classes: [(name, max concurrent writes)], most urgent first.
+        max_wait: seconds after which a waiting write jumps the queue.
+        """
+        self.rank = {name: i for i, (name, _) in enumerate(classes)}
+        self.limits = dict(classes)
+        self.max_in_flight = max_in_flight
+        self.max_wait = max_wait
+        self._cond = threading.Condition()
+        self._waiting = []
+        self._in_flight = {name: 0 for name in self.limits}
+        self._seq = itertools.count()
+        self._stats = {name: {"writes": 0, "wait_seconds": 0.0, "max_wait": 0.0, "aged": 0}
+                       for name in self.limits}
+
+    def _eligible(self, waiter, now):
+        write_class = waiter.write_class
+        if self._in_flight[write_class] >= self.limits[write_class]:
+            return False
+        if sum(self._in_flight.values()) >= self.max_in_flight:
+            return False
+        if now - waiter.since >= self.max_wait:
+            return True
+        # Yield to more urgent classes while they are writing
+        rank = self.rank[write_class]
+        return not any(count for name, count in self._in_flight.items() if self.rank[name] < rank)
+
+    def _next(self, now):
+        """Waiter to admit next: aged ones first (oldest first), then by class, FIFO within a class."""
+        best, best_key = None, None
+        for waiter in self._waiting:
+            if not self._eligible(waiter, now):
+                continue
+            aged = now - waiter.since >= self.max_wait
+            key = (0, 0, waiter.seq) if aged else (1, self.rank[waiter.write_class], waiter.seq)
+            if best_key is None or key < best_key:
+                best, best_key = waiter, key
+        return best
+
+    @contextmanager
+    def slot(self, write_class):
+        """Block until a write of write_class may start; the slot is held inside the with block."""
+        if write_class not in self.limits:
+            raise ValueError(f"Unknown write class: {write_class}")
+        waiter = _Waiter(write_class, time.monotonic(), next(self._seq))
+        with self._cond:
+            self._waiting.append(waiter)
+            while True:
+                now = time.monotonic()
+                if self._next(now) is waiter:
+                    break
+                # Wake up periodically so waiters age even without releases
+                self._cond.wait(self.max_wait / 4)
+            self._waiting.remove(waiter)
+            self._in_flight[write_class] += 1
+            waited = now - waiter.since
+            stats = self._stats[write_class]
+            stats["writes"] += 1
+            stats["wait_seconds"] += waited
+            stats["max_wait"] = max(stats["max_wait"], waited)
+            if waited >= self.max_wait:
+                stats["aged"] += 1
+            self._cond.notify_all()
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._in_flight[write_class] -= 1
+                self._cond.notify_all()
+
+    def run(self, write_class, func, *args, **kwargs):
+        """Call func(*args, **kwargs) once a write of write_class is admitted."""
+        with self.slot(write_class):
+            return func(*args, **kwargs)
+
+    def stats(self):
+        """{class: {writes, wait_seconds, max_wait, aged}} since creation."""
+        with self._cond:
+            return {name: dict(stats) for name, stats in self._stats.items()}
+
+    def summary(self, since=None):
+        """One-line report of writes and queueing per class (relative to an earlier stats())."""
+        parts = []
+        for name, stats in self.stats().items():
+            before = (since or {}).get(name, {})
+            writes = stats["writes"] - before.get("writes", 0)
+            if not writes:
+                continue
+            wait = stats["wait_seconds"] - before.get("wait_seconds", 0.0)
+            aged = stats["aged"] - before.get("aged", 0)
+            parts.append(f"{name} {writes} (avg wait {wait / writes:.2f}s"
+                         + (f", {aged} aged" if aged else "") + ")")
+        return " | ".join(parts) or "no writes"
+
+
+class QueuedBackend(DatabaseBackend):
+    """
+    Wraps another backend; set/update/delete wait for a write slot.
+
+    The class of a write is that of the most urgent top-level node it
+    touches (path_classes: {node: class}); other nodes use default_class.
+    Reads and listeners go straight to the wrapped backend.
+    """
+
+    def __init__(self, inner, write_queue, path_classes, default_class):
+        self.inner = inner
+        self.write_queue = write_queue
+        self.path_classes = dict(path_classes)
+        self.default_class = default_class
+
+    def classify(self, paths):
+        rank = self.write_queue.rank
+        classes = {self.path_classes.get(path.strip("/").split("/")[0], self.default_class) for path in paths}
+        return min(classes, key=rank.__getitem__) if classes else self.default_class
+
+    def get(self, path):
+        return self.inner.get(path)
+
+    def set(self, path, value):
+        self.write_queue.run(self.classify([path]), self.inner.set, path, value)
+
+    def update(self, path, values):
+        base = str(path or "").strip("/")
+        paths = [f"{base}/{key}" if base else key for key in values] or [base]
+        self.write_queue.run(self.classify(paths), self.inner.update, path, values)
+
+    def delete(self, path):
+        self.write_queue.run(self.classify([path]), self.inner.delete, path)
+
+    def listen(self, path, callback):
+        return self.inner.listen(path, callback)
@@ -91,7 +91,7 @@ export const FB_PATHS = {
   SYNC_CONTROL: "sync-control",               // /sync-control/
   SYNC_REQUEST: "sync-control/request",       // Write timestamp to trigger sync
   SYNC_STATUS: "sync-control/status",         // idle, syncing, completed, error
-  SYNC_PROGRESS: "sync-control/progress",     // Array of progress messages
+  SYNC_PROGRESS: "sync-control/progress",     // Progress messages keyed by push keys
   SYNC_LAST: "sync-control/last_sync",        // Last sync info
   SYNC_HEARTBEAT: "sync-control/service_heartbeat", // Service health check
   
@@ -20,8 +20,8 @@ const fdbDb = fdbApp.database();
 
 const leaderboardCache = {
   allTime: { data: null, timestamp: 0, ttl: 10 * 60 * 1000 },  // 10 min cache
-  monthly: {},  // { 'YYYY-MM': { data, timestamp, ttl } }
-  weekly: {}    // { 'YYYY-Wxx': { data, timestamp, ttl } }
+  monthly: {},  // { 'YYYY-MM': { data, timestamp, ttl } }, first-page fetches under 'YYYY-MM:top'
+  weekly: {}    // { 'YYYY-Wxx': { data, timestamp, ttl } }, first-page fetches under 'YYYY-Wxx:top'
 };
 
 function isCacheValid(cacheEntry) {
@@ -34,6 +34,52 @@ function setCache(cacheEntry, data, ttl = 5 * 60 * 1000) {
   cacheEntry.ttl = ttl;
 }
 
+// A first-page fetch cannot locate a user beyond page 0, so it is cached
+// under its own key; a valid full fetch serves both kinds of view
+function periodCacheEntry(cache, period, firstPageOnly) {
+  if (firstPageOnly && isCacheValid(cache[period])) return cache[period];
+  const key = firstPageOnly ? `${period}:top` : period;
+  if (!cache[key]) {
+    cache[key] = { data: null, timestamp: 0, ttl: 5 * 60 * 1000 };
+  }
+  return cache[key];
+}
+
+// ==================== PAGED LEADERBOARD READS ====================
+// Sync script publishes /leaderboards/{board}/meta + /leaderboards/{board}/pages/{n}
+// Legacy flat arrays are still understood so old data keeps rendering
+
+function flattenLeaderboard(val) {
+  if (!val) return [];
+  if (val.pages || val.meta) {
+    const pages = Array.isArray(val.pages) ? val.pages : Object.values(val.pages || {});
+    return pages.flatMap(p => Array.isArray(p) ? p : Object.values(p || {})).filter(x => x);
+  }
+  return Array.isArray(val) ? val.filter(x => x) : Object.values(val);
+}
+
+/**
+ * Fetch leaderboard entries (sorted by rank).
+ * firstPageOnly: only download page 0 (enough for top-10 views)
+ */
+export async function fetchLeaderboardEntries(path, { firstPageOnly = false } = {}) {
+  if (firstPageOnly) {
+    const pageSnap = await fdbDb.ref(`${path}/pages/0`).once("value");
+    if (pageSnap.exists()) return flattenLeaderboard(pageSnap.val());
+  }
+  const snap = await fdbDb.ref(path).once("value");
+  return flattenLeaderboard(snap.val());
+}
+
+/**
+ * Fetch leaderboard meta node ({ total_entries, total_minutes, top_username, ... }).
+ * Returns null if the board has not been published in paged format yet.
+ */
+export async function fetchLeaderboardMeta(path) {
+  const snap = await fdbDb.ref(`${path}/meta`).once("value");
+  return snap.exists() ? snap.val() : null;
+}
+
 // ==================== HALL OF FAME (ALL TIME) ====================
 
 export async function loadHallOfFame(containerId, highlightUsername = null) {
@@ -52,9 +98,8 @@ export async function loadHallOfFame(containerId, highlightUsername = null) {
     
     console.log("🔄 Fetching all-time leaderboard...");
     
-    // Use pre-computed all-time leaderboard from sync script
-    const leaderboardSnap = await fdbDb.ref(`${FB_PATHS.LEADERBOARDS}/all-time`).once("value");
-    const leaderboardData = leaderboardSnap.val();
+    // Use pre-computed all-time leaderboard from sync script (top page only)
+    const leaderboardData = await fetchLeaderboardEntries(`${FB_PATHS.LEADERBOARDS}/all-time`, { firstPageOnly: true });
     
     if (!leaderboardData || leaderboardData.length === 0) {
       container.innerHTML = `<p class="text-gray-400 text-center">No leaderboard data available.</p>`;
@@ -162,27 +207,27 @@ export async function loadMonthlyLeaderboard(containerId, highlightUsername = nu
   try {
     const targetMonth = monthKey || getCurrentMonthKey();
     
-    // Check cache
-    if (!leaderboardCache.monthly[targetMonth]) {
-      leaderboardCache.monthly[targetMonth] = { data: null, timestamp: 0, ttl: 5 * 60 * 1000 };
-    }
+    // Without a user to locate, the top page is all we render
+    const firstPageOnly = !highlightUsername;
+    const cacheEntry = periodCacheEntry(leaderboardCache.monthly, targetMonth, firstPageOnly);
     
-    if (isCacheValid(leaderboardCache.monthly[targetMonth])) {
+    if (isCacheValid(cacheEntry)) {
       console.log(`📦 Using cached monthly leaderboard for ${targetMonth}`);
-      renderMonthlyLeaderboard(container, leaderboardCache.monthly[targetMonth].data, highlightUsername);
+      renderMonthlyLeaderboard(container, cacheEntry.data, highlightUsername);
       return;
     }
     
     console.log(`🔄 Fetching monthly leaderboard for ${targetMonth}...`);
-    const snap = await fdbDb.ref(`${FB_PATHS.LEADERBOARDS}/monthly/${targetMonth}`).once("value");
+    const data = await fetchLeaderboardEntries(`${FB_PATHS.LEADERBOARDS}/monthly/${targetMonth}`, {
+      firstPageOnly
+    });
 
-    if (!snap.exists()) {
+    if (data.length === 0) {
       container.innerHTML = `<p class="text-gray-400 text-center">No data for ${targetMonth}</p>`;
       return;
     }
 
-    const data = snap.val();
-    setCache(leaderboardCache.monthly[targetMonth], data);
+    setCache(cacheEntry, data);
     renderMonthlyLeaderboard(container, data, highlightUsername);
     
   } catch (error) {
@@ -260,27 +305,27 @@ export async function loadWeeklyLeaderboard(containerId, highlightUsername = nul
   try {
     const targetWeek = weekKey || getCurrentWeekKey();
     
-    // Check cache
-    if (!leaderboardCache.weekly[targetWeek]) {
-      leaderboardCache.weekly[targetWeek] = { data: null, timestamp: 0, ttl: 5 * 60 * 1000 };
-    }
+    // Without a user to locate, the top page is all we render
+    const firstPageOnly = !highlightUsername;
+    const cacheEntry = periodCacheEntry(leaderboardCache.weekly, targetWeek, firstPageOnly);
     
-    if (isCacheValid(leaderboardCache.weekly[targetWeek])) {
+    if (isCacheValid(cacheEntry)) {
       console.log(`📦 Using cached weekly leaderboard for ${targetWeek}`);
-      renderWeeklyLeaderboard(container, leaderboardCache.weekly[targetWeek].data, highlightUsername);
+      renderWeeklyLeaderboard(container, cacheEntry.data, highlightUsername);
       return;
     }
     
     console.log(`🔄 Fetching weekly leaderboard for ${targetWeek}...`);
-    const snap = await fdbDb.ref(`${FB_PATHS.LEADERBOARDS}/weekly/${targetWeek}`).once("value");
+    const data = await fetchLeaderboardEntries(`${FB_PATHS.LEADERBOARDS}/weekly/${targetWeek}`, {
+      firstPageOnly
+    });
 
-    if (!snap.exists()) {
+    if (data.length === 0) {
       container.innerHTML = `<p class="text-gray-400 text-center">No data for week ${targetWeek}</p>`;
       return;
     }
 
-    const data = snap.val();
-    setCache(leaderboardCache.weekly[targetWeek], data);
+    setCache(cacheEntry, data);
     renderWeeklyLeaderboard(container, data, highlightUsername);
     
   } catch (error) {
@@ -377,9 +422,19 @@ export async function getAvailableWeeks() {
 
 export async function getLeaderboardStats() {
   try {
-    // Use pre-computed all-time leaderboard
-    const leaderboardSnap = await fdbDb.ref(`${FB_PATHS.LEADERBOARDS}/all-time`).once("value");
-    const leaderboard = leaderboardSnap.val() || [];
+    // Paged boards carry their totals in the meta node - no need to download entries
+    const meta = await fetchLeaderboardMeta(`${FB_PATHS.LEADERBOARDS}/all-time`);
+    if (meta) {
+      return {
+        activePlayers: meta.total_entries || 0,
+        totalHours: Math.round((meta.total_minutes || 0) / 60),
+        topPlayer: meta.top_username || "N/A",
+        topPlayerHours: Math.round((meta.top_minutes || 0) / 60)
+      };
+    }
+    
+    // Legacy flat array
+    const leaderboard = await fetchLeaderboardEntries(`${FB_PATHS.LEADERBOARDS}/all-time`);
     
     const activePlayers = leaderboard.length;
     const totalHours = Math.round(leaderboard.reduce((sum, m) => sum + (m.total_minutes || 0), 0) / 60);